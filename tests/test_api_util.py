@@ -0,0 +1,55 @@
+import pytest
+
+from unsub.api_util import BadResponseFormat, DefaultRoutes, set_routes
+from unsub.gmail import Email
+from unsub.replay import FakeClient
+from unsub.spam import is_spam
+from unsub.unsub_link import find_unsubscribe_link_from_code
+
+
+@pytest.fixture(autouse=True)
+def routes():
+    set_routes({**DefaultRoutes, "spam": ["cheap", "strong"], "link_code": ["cheap"]})
+    yield
+    set_routes(DefaultRoutes)
+
+
+def _scripted(*responses: str) -> tuple[FakeClient, list[str]]:
+    calls = []
+
+    def respond(instructions, input):
+        calls.append(input)
+        return responses[len(calls) - 1]
+
+    return FakeClient(respond), calls
+
+
+def _email() -> Email:
+    return Email(id="1", sender="a@b.com", subject="Sale", snippet="", raw_body="")
+
+
+@pytest.mark.parametrize("first", ["", "  \n", "Maybe?", "UNSURE"])
+def test_spam_escalates_to_next_model(first):
+    client, calls = _scripted(first, "SPAM")
+    assert is_spam(client, _email()) is True
+    assert len(calls) == 2
+
+
+def test_unsure_falls_back_on_last_model():
+    client, calls = _scripted("UNSURE", "UNSURE")
+    assert is_spam(client, _email()) is False
+    assert len(calls) == 2
+
+
+def test_bad_format_on_last_model_raises():
+    client, _ = _scripted("", "")
+    with pytest.raises(BadResponseFormat):
+        is_spam(client, _email())
+
+
+def test_empty_link_answer_is_bad_format():
+    client, _ = _scripted("")
+    with pytest.raises(BadResponseFormat):
+        find_unsubscribe_link_from_code(
+            client, '<a href="https://x.com/u">Unsubscribe</a>'
+        )
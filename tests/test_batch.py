@@ -0,0 +1,72 @@
+import json
+import os
+
+from unsub.batch import BatchState, run_batches
+from unsub.classify import classify_email
+from unsub.email_store import iter_email_paths, load_email
+from unsub.mock_openai import MockOpenAIServer, stub_respond
+from unsub.replay import FakeClient
+from unsub.synthetic import write_corpus
+
+
+def _write_unclassified(email_dir: str, count: int):
+    write_corpus(email_dir, count, seed=0)
+    for path in iter_email_paths(email_dir):
+        with open(path, "r") as f:
+            data = json.load(f)
+        with open(path, "w") as f:
+            json.dump(dict(email=data["email"]), f)
+
+
+def test_batches_search_html_like_classify_email(tmp_path):
+    email_dir = str(tmp_path / "emails")
+    state_dir = str(tmp_path / "state")
+    _write_unclassified(email_dir, 30)
+
+    with MockOpenAIServer(stub_respond) as server:
+        run_batches(
+            server.client(), email_dir, state_dir, model="mock", poll_interval=0.05
+        )
+
+    state = BatchState.load(os.path.join(state_dir, "state.json"))
+    assert [c.kind for c in state.chunks] == ["classify", "link_code"]
+    assert all(c.status == "merged" for c in state.chunks)
+
+    client = FakeClient(stub_respond)
+    for path in iter_email_paths(email_dir):
+        with open(path, "r") as f:
+            data = json.load(f)
+        assert "link_pending" not in data and "error" not in data
+        expected = classify_email(client, load_email(path))
+        link = data["unsub_link"]
+        assert (link and link["href"]) == (
+            expected.unsub_link and expected.unsub_link.href
+        )
+        assert data["spam"] == expected.spam
+
+
+def test_pending_emails_are_submitted_by_later_runs(tmp_path):
+    email_dir = str(tmp_path / "emails")
+    state_dir = str(tmp_path / "state")
+    _write_unclassified(email_dir, 10)
+
+    with MockOpenAIServer(stub_respond) as server:
+        client = server.client()
+        run_batches(client, email_dir, state_dir, model="mock", poll_interval=0.05)
+        # As if the previous run stopped before the second round.
+        for path in iter_email_paths(email_dir):
+            with open(path, "r") as f:
+                data = json.load(f)
+            data.pop("unsub_link")
+            data["link_pending"] = True
+            with open(path, "w") as f:
+                json.dump(data, f)
+        run_batches(client, email_dir, state_dir, model="mock", poll_interval=0.05)
+
+    state = BatchState.load(os.path.join(state_dir, "state.json"))
+    assert state.chunks[-1].kind == "link_code"
+    assert len(state.chunks[-1].email_paths) == 10
+    for path in iter_email_paths(email_dir):
+        with open(path, "r") as f:
+            data = json.load(f)
+        assert "link_pending" not in data and "unsub_link" in data
@@ -0,0 +1,64 @@
+import base64
+import json
+
+import pytest
+
+from unsub.api_util import BadResponseFormat, LowConfidence
+from unsub.classify import classification_input, parse_classification
+from unsub.gmail import Email
+from unsub.link import Link
+
+Links = [
+    Link(href="https://a.com/home", text="Home"),
+    Link(href="https://a.com/u", text="Unsubscribe"),
+]
+
+
+def _answer(spam: str, link) -> str:
+    return json.dumps({"reasoning": "", "spam": spam, "unsubscribe_link": link})
+
+
+def _email(raw_body: str) -> Email:
+    return Email("1", "a@b.com", "Sale", "", raw_body)
+
+
+def test_parse_classification():
+    result = parse_classification(_answer("SPAM", 2), Links)
+    assert result.spam is True
+    assert result.unsub_link == Links[1]
+    result = parse_classification(_answer("NOT SPAM", -1), Links)
+    assert result.spam is False
+    assert result.unsub_link is None
+
+
+def test_unsure_falls_back_to_not_spam():
+    with pytest.raises(LowConfidence) as info:
+        parse_classification(_answer("UNSURE", 2), Links)
+    assert info.value.fallback.spam is False
+    assert info.value.fallback.unsub_link == Links[1]
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        "",
+        "not json",
+        json.dumps({"spam": "SPAM"}),
+        _answer("SPAM", "two"),
+        _answer("SPAM", 3),
+        _answer("MAYBE", 1),
+    ],
+)
+def test_bad_classification(response):
+    with pytest.raises(BadResponseFormat):
+        parse_classification(response, Links)
+
+
+def test_classification_input_numbers_links():
+    html = "".join(f'<a href="{link.href}">{link.text}</a>' for link in Links)
+    raw_body = base64.urlsafe_b64encode(html.encode()).decode()
+    desc, links = classification_input(_email(raw_body), max_url_len=12)
+    assert links == Links
+    assert "1. 'Home' 'https://a.co...'\n2. 'Unsubscribe' 'https://a.co...'\n" in desc
+    desc, links = classification_input(_email(""))
+    assert links == [] and desc.endswith("Links:\n(none)\n")
@@ -0,0 +1,92 @@
+import base64
+import json
+import os
+import sys
+
+import pytest
+
+from unsub.cmd import convert_emails
+from unsub.email_store import (
+    StorageModes,
+    convert_email_file,
+    email_path,
+    email_record,
+    iter_email_paths,
+    load_email,
+    storage_mode,
+)
+from unsub.gmail import Email
+
+Html = '<p>Big sale!</p><a href="https://shop.com/unsub?u=1">Unsubscribe</a>'
+
+
+def _email(email_id: str = "email001") -> Email:
+    raw_body = base64.urlsafe_b64encode(Html.encode()).decode()
+    return Email(email_id, "deals@shop.com", "Sale", "Big sale", raw_body)
+
+
+def _save(root: str, email: Email, mode: str) -> str:
+    path = email_path(root, email.id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(dict(email=email_record(email, root, mode), spam=True), f)
+    return path
+
+
+@pytest.mark.parametrize("mode", StorageModes)
+def test_round_trip(tmp_path, mode):
+    email = _email()
+    path = _save(str(tmp_path), email, mode)
+    with open(path) as f:
+        assert storage_mode(json.load(f)["email"]) == mode
+    assert list(iter_email_paths(str(tmp_path))) == [path]
+
+    loaded = load_email(path)
+    assert (loaded.id, loaded.sender, loaded.subject, loaded.snippet) == (
+        email.id,
+        email.sender,
+        email.subject,
+        email.snippet,
+    )
+    assert loaded.links() == email.links() != []
+    if mode == "metadata":
+        assert loaded.raw_body == ""
+    else:
+        assert loaded.body == Html
+
+
+def test_convert_email_file(tmp_path):
+    root = str(tmp_path)
+    path = _save(root, _email(), "full")
+
+    assert convert_email_file(path, "blob")
+    with open(path) as f:
+        data = json.load(f)
+    blob = os.path.join(root, data["email"]["body_blob"])
+    assert os.path.exists(blob)
+    assert data["spam"] is True
+    assert load_email(path).body == Html
+
+    assert convert_email_file(path, "metadata")
+    assert not os.path.exists(blob)
+    assert load_email(path).links() == _email().links()
+
+    # The body is gone, so there's no going back.
+    assert not convert_email_file(path, "full")
+    assert convert_email_file(path, "metadata")
+
+
+def test_convert_emails(tmp_path, monkeypatch, capsys):
+    root = str(tmp_path)
+    full_path = _save(root, _email("email001"), "full")
+    metadata_path = _save(root, _email("email002"), "metadata")
+    monkeypatch.setattr(
+        sys, "argv", ["convert_emails", "--email_dir", root, "--storage", "blob"]
+    )
+    convert_emails.main()
+
+    out = capsys.readouterr().out
+    assert "converted 1 emails to blob storage" in out
+    assert "skipped 1 emails" in out
+    assert load_email(full_path).body == Html
+    assert load_email(metadata_path).raw_body == ""
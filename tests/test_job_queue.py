@@ -0,0 +1,98 @@
+import pytest
+
+import unsub.job_queue as job_queue
+from unsub.job_queue import JobQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(job_queue, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = JobQueue(
+        str(tmp_path / "jobs.sqlite3"),
+        max_attempts=3,
+        lease_seconds=60.0,
+        backoff_seconds=10.0,
+    )
+    queue.enqueue("a", dict(url="https://a.com"))
+    yield queue
+    queue.close()
+
+
+def test_claim_leases_job(queue, clock):
+    assert not queue.enqueue("a", dict(url="https://other.com"))
+    job = queue.claim("w1")
+    assert job is not None
+    assert (job.key, job.payload, job.attempts) == ("a", dict(url="https://a.com"), 1)
+    assert queue.claim("w2") is None
+    assert queue.next_available_at() == clock.now + 60.0
+
+    # Workers only touch jobs they hold.
+    queue.complete("a", "w2")
+    assert queue.counts()["running"] == 1
+    queue.complete("a", "w1")
+    assert queue.counts() == dict(pending=0, running=0, done=1, failed=0)
+    assert queue.next_available_at() is None
+
+
+def test_expired_lease_is_retried(queue, clock):
+    queue.claim("dead")
+    clock.now += 30.0
+    assert queue.claim("w1") is None
+    clock.now += 31.0
+    # The expired attempt counts, so the job waits out the backoff first.
+    assert queue.claim("w1") is None
+    assert queue.heartbeat("a", "dead") is False
+    clock.now += 10.0
+    job = queue.claim("w1")
+    assert job is not None and job.attempts == 2
+
+
+def test_heartbeat_extends_lease(queue, clock):
+    queue.claim("w1")
+    clock.now += 50.0
+    assert queue.heartbeat("a", "w1")
+    clock.now += 50.0
+    assert queue.claim("w2") is None
+    assert queue.counts()["running"] == 1
+
+
+def test_failures_back_off_until_out_of_attempts(queue, clock):
+    for attempt, delay in [(1, 10.0), (2, 20.0)]:
+        job = queue.claim("w1")
+        assert job is not None and job.attempts == attempt
+        queue.fail("a", "w1", "boom")
+        assert queue.next_available_at() == clock.now + delay
+        clock.now += delay - 1
+        assert queue.claim("w1") is None
+        clock.now += 1
+
+    queue.claim("w1")
+    queue.fail("a", "w1", "boom")
+    assert queue.counts()["failed"] == 1
+    assert queue.failures() == [("a", 3, "boom")]
+    assert queue.claim("w1") is None
+
+    assert queue.retry_failed() == 1
+    job = queue.claim("w1")
+    assert job is not None and job.attempts == 1
+
+
+def test_release_does_not_count_attempt(queue):
+    queue.claim("w1")
+    queue.release("a", "w1")
+    job = queue.claim("w1")
+    assert job is not None and job.attempts == 1
@@ -0,0 +1,122 @@
+import base64
+import json
+import os
+import sys
+import time
+
+import pytest
+
+import unsub.cmd.list_unsub_links as list_unsub_links
+from unsub.cmd.list_unsub_links import LinkBatcher, PendingEmail, poll_iter
+from unsub.email_store import email_path
+from unsub.gmail import Email
+from unsub.link import Link
+from unsub.mock_openai import MockOpenAIServer, stub_respond
+from unsub.replay import FakeClient
+from unsub.usage import UsageScope
+
+
+def _emails(count: int) -> list[Email]:
+    body = '<p>Big sale!</p><a href="https://shop.com/unsub">Unsubscribe</a>'
+    raw_body = base64.urlsafe_b64encode(body.encode()).decode()
+    return [
+        Email(f"email{i:03d}", "deals@shop.com", "Sale", "Big sale", raw_body)
+        for i in range(count)
+    ]
+
+
+def _run(monkeypatch, server, emails, output_dir, *args: str):
+    monkeypatch.setattr(list_unsub_links, "get_gmail_pool", lambda **_: None)
+    monkeypatch.setattr(
+        list_unsub_links, "iter_emails", lambda *_, **__: iter(emails)
+    )
+    monkeypatch.setattr(list_unsub_links, "OpenAI", server.client)
+    monkeypatch.setattr(
+        sys, "argv", ["list_unsub_links", "--output-dir", output_dir, *args]
+    )
+    list_unsub_links.main()
+
+
+def test_emails_over_budget_are_retried(monkeypatch, tmp_path):
+    output_dir = str(tmp_path)
+    emails = _emails(3)
+    with MockOpenAIServer(stub_respond) as server:
+        _run(monkeypatch, server, emails, output_dir, "--budget-per-email", "1e-9")
+        assert not any(os.path.exists(email_path(output_dir, e.id)) for e in emails)
+
+        _run(monkeypatch, server, emails, output_dir)
+    for email in emails:
+        with open(email_path(output_dir, email.id), "r") as f:
+            data = json.load(f)
+        assert "error" not in data
+        assert data["unsub_link"]["href"] == "https://shop.com/unsub"
+
+
+def test_poll_iter_yields_none_while_waiting():
+    def slow():
+        yield 1
+        time.sleep(0.2)
+        yield 2
+
+    items = list(poll_iter(slow(), timeout=0.05))
+    assert items[0] == 1 and items[-1] == 2
+    assert None in items[1:-1]
+
+
+def test_poll_iter_reraises_errors():
+    def failing():
+        yield 1
+        raise ValueError("gmail is down")
+
+    items = poll_iter(failing(), timeout=1.0)
+    assert next(items) == 1
+    with pytest.raises(ValueError, match="gmail is down"):
+        next(items)
+
+
+def _pending(email: Email, output_dir: str, num_links: int) -> PendingEmail:
+    links = [Link(f"https://shop.com/{i}", f"Link {i}") for i in range(num_links)]
+    out_path = email_path(output_dir, email.id)
+    usage = UsageScope(labels={})
+    return PendingEmail(email, out_path, dict(spam=True), usage, links)
+
+
+def test_link_batcher_is_due_after_max_links_or_max_delay(tmp_path):
+    batcher = LinkBatcher(FakeClient(stub_respond), max_links=10, max_delay=0.1)
+    assert not batcher.due()
+    email, other = _emails(2)
+    batcher.add(_pending(email, str(tmp_path), 4))
+    assert not batcher.due()
+    time.sleep(0.1)
+    assert batcher.due()
+
+    batcher = LinkBatcher(FakeClient(stub_respond), max_links=10, max_delay=60.0)
+    batcher.add(_pending(email, str(tmp_path), 4))
+    batcher.add(_pending(other, str(tmp_path), 30))
+    assert batcher.pending[1].links[0].href == "https://shop.com/20"
+    assert batcher.due()
+
+
+def test_link_batcher_flush(tmp_path):
+    def respond(instructions, input):
+        if "several emails" in instructions:
+            answers = [dict(email=1, link=2), dict(email=2, link=-1)]
+            return json.dumps(dict(answers=answers))
+        # The second email's HTML is searched instead.
+        assert "data-index" in instructions
+        return "Answer: 0"
+
+    batcher = LinkBatcher(FakeClient(respond), max_links=100, max_delay=60.0)
+    found, fallback = _emails(2)
+    batcher.add(_pending(found, str(tmp_path), 3))
+    batcher.add(_pending(fallback, str(tmp_path), 3))
+    batcher.flush()
+    assert batcher.pending == [] and not batcher.due()
+
+    hrefs = []
+    for email in (found, fallback):
+        with open(email_path(str(tmp_path), email.id), "r") as f:
+            data = json.load(f)
+        assert "error" not in data and "batch_usage" in data
+        hrefs.append(data["unsub_link"]["href"])
+    assert hrefs == ["https://shop.com/1", "https://shop.com/unsub"]
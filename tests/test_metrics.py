@@ -0,0 +1,32 @@
+import math
+
+from unsub.metrics import Gauge, Histogram
+
+
+def test_gauge_formats_special_values():
+    gauge = Gauge("test_gauge", "A gauge.")
+    gauge.set(3.0, kind="int")
+    gauge.set(0.5, kind="float")
+    gauge.set(math.inf, kind="inf")
+    gauge.set(-math.inf, kind="neg_inf")
+    gauge.set(math.nan, kind="nan")
+    assert sorted(gauge.samples()) == [
+        'test_gauge{kind="float"} 0.5',
+        'test_gauge{kind="inf"} +Inf',
+        'test_gauge{kind="int"} 3',
+        'test_gauge{kind="nan"} NaN',
+        'test_gauge{kind="neg_inf"} -Inf',
+    ]
+
+
+def test_histogram_buckets():
+    histogram = Histogram("test_seconds", "A histogram.", buckets=(1.0, 0.5))
+    histogram.observe(0.2)
+    histogram.observe(2.0)
+    assert list(histogram.samples()) == [
+        'test_seconds_bucket{le="0.5"} 1',
+        'test_seconds_bucket{le="1"} 1',
+        'test_seconds_bucket{le="+Inf"} 2',
+        "test_seconds_sum 2.2",
+        "test_seconds_count 2",
+    ]
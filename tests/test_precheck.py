@@ -0,0 +1,90 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from unsub.page_text import looks_unsubscribed
+from unsub.precheck import create_http_session, precheck_unsubscribe
+
+ConfirmPage = """<html><body>
+<h1>Are you sure?</h1>
+<p>Once you confirm, you will no longer receive marketing emails.</p>
+<form method="post" action="/confirm">
+  <input type="hidden" name="token" value="abc">
+  <button type="submit">Unsubscribe</button>
+</form>
+</body></html>"""
+
+DonePage = "<html><body><p>You have been unsubscribed.</p></body></html>"
+
+UndoPage = """<html><body>
+<p>You have been unsubscribed from our newsletter.</p>
+<p>Changed your mind? You can undo this below.</p>
+<form method="post" action="/resubscribe">
+  <input type="hidden" name="token" value="abc">
+  <button type="submit">Resubscribe</button>
+</form>
+</body></html>"""
+
+Pages = {"/unsub": ConfirmPage, "/undo": UndoPage}
+
+
+@pytest.fixture
+def server():
+    posts = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self._reply(Pages[self.path])
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            posts.append(self.rfile.read(length).decode())
+            self._reply(DonePage)
+
+        def _reply(self, body: str):
+            data = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *_):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", posts
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_confirm_page_is_submitted(server):
+    base_url, posts = server
+    result = precheck_unsubscribe(
+        create_http_session(), base_url + "/unsub", "me@example.com"
+    )
+    assert result.status == "success"
+    assert result.reason == "confirmed after form submission"
+    assert posts == ["token=abc"]
+
+
+def test_undo_form_is_not_submitted(server):
+    base_url, posts = server
+    result = precheck_unsubscribe(
+        create_http_session(), base_url + "/undo", "me@example.com"
+    )
+    assert result.status == "success"
+    assert result.reason == "confirmed on load"
+    assert posts == []
+
+
+def test_looks_unsubscribed():
+    assert looks_unsubscribed("You have been unsubscribed.")
+    assert looks_unsubscribed("You're already unsubscribed from this list.")
+    assert not looks_unsubscribed(
+        "Are you sure? Once you confirm, you will no longer receive marketing emails"
+    )
@@ -0,0 +1,98 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from unsub.redirects import RedirectCache, Resolution, resolve_redirects
+
+
+class Server:
+    def __init__(self):
+        self.base_url = ""
+        self.requests: list[str] = []
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+
+@pytest.fixture
+def server():
+    state = Server()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with state._lock:
+                state.requests.append(self.path)
+                state.active += 1
+                state.max_active = max(state.max_active, state.active)
+            time.sleep(state.delay)
+            with state._lock:
+                state.active -= 1
+            if self.path.startswith("/track/"):
+                self._reply(302, self.path.replace("/track/", "/", 1))
+            elif self.path == "/bad":
+                self._reply(302, "http://[invalid")
+            else:
+                self._reply(200)
+
+        def _reply(self, status: int, location: str | None = None):
+            self.send_response(status)
+            if location is not None:
+                self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *_):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    state.base_url = f"http://127.0.0.1:{httpd.server_port}"
+    try:
+        yield state
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_resolves_redirect_chains(server, tmp_path):
+    cache = RedirectCache(str(tmp_path / "redirects.json"))
+    url = server.base_url + "/track/track/unsub"
+    assert resolve_redirects([url, server.base_url + "/bad"], cache) == 1
+    assert cache.final_url(url) == server.base_url + "/unsub"
+    assert cache.entries[url].hops == 2
+    # Failures aren't stored, so they are retried.
+    assert server.base_url + "/bad" not in cache
+
+    cache = RedirectCache(cache.path)
+    assert url in cache
+    server.requests.clear()
+    assert resolve_redirects([url], cache) == 0
+    assert server.requests == []
+
+
+def test_stale_entries_are_refreshed(server, tmp_path):
+    cache = RedirectCache(str(tmp_path / "redirects.json"), max_age=60.0)
+    url = server.base_url + "/track/new"
+    bad_url = server.base_url + "/bad"
+    stale = Resolution("https://old.com", hops=1, resolved_at=time.time() - 61)
+    cache.entries = {url: stale, bad_url: stale}
+    assert url not in cache
+
+    assert resolve_redirects([url, bad_url], cache) == 1
+    assert url in cache
+    assert cache.final_url(url) == server.base_url + "/new"
+    # A stale entry is still better than nothing until it can be refreshed.
+    assert bad_url not in cache
+    assert cache.final_url(bad_url) == "https://old.com"
+
+
+def test_requests_are_limited_per_host(server, tmp_path):
+    server.delay = 0.1
+    cache = RedirectCache(str(tmp_path / "redirects.json"))
+    urls = [f"{server.base_url}/page{i}" for i in range(8)]
+    assert resolve_redirects(urls, cache, max_workers=8, max_per_host=2) == 0
+    assert len(server.requests) == 8
+    assert server.max_active == 2
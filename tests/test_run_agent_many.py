@@ -0,0 +1,119 @@
+import json
+import os
+import sys
+from functools import partial
+from types import SimpleNamespace
+
+import pytest
+
+import unsub.cmd.run_agent_many as run_agent_many
+from unsub.job_queue import JobQueue
+from unsub.usage import check_budgets, record_usage
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    email_dir = tmp_path / "emails"
+    os.makedirs(email_dir / "aa")
+    with open(email_dir / "aa" / "1aa.json", "w") as f:
+        json.dump(
+            dict(
+                email=dict(sender="news@vendor.com"),
+                unsub_link=dict(href="https://vendor.com/unsub", text="Unsubscribe"),
+            ),
+            f,
+        )
+    return str(email_dir), str(tmp_path / "logs")
+
+
+def _run(monkeypatch, dirs, run_agent, *args: str):
+    email_dir, log_path = dirs
+    monkeypatch.setattr(run_agent_many, "OpenAI", lambda: None)
+    monkeypatch.setattr(run_agent_many, "create_driver", lambda **_: None)
+    monkeypatch.setattr(run_agent_many, "run_agent", run_agent)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "run_agent_many",
+            "--email_dir",
+            email_dir,
+            "--user_email",
+            "me@example.com",
+            "--log_path",
+            log_path,
+            *args,
+        ],
+    )
+    run_agent_many.main()
+
+
+def _jobs(log_path: str) -> dict[str, tuple[str, int, str | None]]:
+    queue = JobQueue(os.path.join(log_path, "jobs.sqlite3"))
+    rows = queue._conn.execute("SELECT key, state, attempts, last_error FROM jobs")
+    return {key: (state, attempts, error) for key, state, attempts, error in rows}
+
+
+def test_vendor_over_budget_is_retryable(monkeypatch, dirs):
+    def over_budget(client, browser, playbooks, args, result, trace=None):
+        usage = SimpleNamespace(
+            input_tokens=1000, input_tokens_details=None, output_tokens=1000
+        )
+        record_usage("gpt-4o", usage)
+        check_budgets()
+
+    _run(
+        monkeypatch,
+        dirs,
+        over_budget,
+        "--budget_per_domain",
+        "0.001",
+        "--max_attempts",
+        "1",
+    )
+    state, attempts, error = _jobs(dirs[1])["vendor.com"]
+    assert (state, attempts) == ("failed", 1)
+    assert error is not None and "budget" in error
+
+
+def _crash_after_log(monkeypatch, dirs, log: dict):
+    """
+    Leave the vendor's job leased to a worker that wrote its log and died.
+    """
+    _, log_path = dirs
+    os.makedirs(log_path)
+    queue = JobQueue(os.path.join(log_path, "jobs.sqlite3"), lease_seconds=0.0)
+    payload = dict(url="https://vendor.com/unsub", domain="vendor.com")
+    queue.enqueue("vendor.com", payload)
+    assert queue.claim("dead") is not None
+    queue.close()
+    with open(os.path.join(log_path, "vendor.com.json"), "w") as f:
+        json.dump(log, f)
+    monkeypatch.setattr(
+        run_agent_many, "JobQueue", partial(JobQueue, backoff_seconds=0.0)
+    )
+
+
+def test_finished_log_completes_reclaimed_job(monkeypatch, dirs):
+    _crash_after_log(monkeypatch, dirs, dict(status="success"))
+
+    def run_agent(*_):
+        raise AssertionError("finished job was run again")
+
+    _run(monkeypatch, dirs, run_agent)
+    assert _jobs(dirs[1])["vendor.com"][:2] == ("done", 2)
+
+
+def test_over_budget_log_is_not_finished(monkeypatch, dirs):
+    _crash_after_log(monkeypatch, dirs, dict(budget_exceeded="over budget"))
+    runs = []
+
+    def run_agent(client, browser, playbooks, args, result, trace=None):
+        runs.append(args)
+        result["status"] = "success"
+
+    _run(monkeypatch, dirs, run_agent)
+    assert len(runs) == 1
+    assert _jobs(dirs[1])["vendor.com"][:2] == ("done", 2)
+    with open(os.path.join(dirs[1], "vendor.com.json")) as f:
+        assert json.load(f)["status"] == "success"
@@ -0,0 +1,70 @@
+import argparse
+import json
+
+import pytest
+
+from unsub.cmd import run_simulations
+from unsub.simulations import ServerSimulation, SharedSimulationServer
+from unsub.trace import TraceWriter, load_trace, parse_trace
+
+
+@pytest.fixture
+def shared_server(monkeypatch):
+    with SharedSimulationServer() as server:
+        monkeypatch.setattr(ServerSimulation, "shared", server)
+        yield server
+
+
+def test_failed_trial_ends_trace(monkeypatch, tmp_path, shared_server):
+    def unsubscribe_on_website(client, browser, url, user_email, trace, **kwargs):
+        trace.message({"role": "user", "content": "hi"})
+        raise RuntimeError("browser crashed")
+
+    monkeypatch.setattr(
+        run_simulations, "unsubscribe_on_website", unsubscribe_on_website
+    )
+    monkeypatch.setattr(
+        run_simulations, "_worker", {"openai_client": None, "browser": None}
+    )
+    args = argparse.Namespace(
+        output_dir=str(tmp_path),
+        replay_dir=None,
+        record=False,
+        trace=True,
+        trace_fsync="never",
+        user_email="a@b.com",
+        verbose=False,
+    )
+    with pytest.raises(RuntimeError):
+        run_simulations.run_trial(args, "click_to_unsub", 0)
+
+    assert shared_server.sessions == {}
+    log = load_trace(str(tmp_path / "click_to_unsub" / "trial_0.jsonl"))
+    assert "partial" not in log
+    assert log["agent_status"] == "error"
+    assert log["sim_status"] == "failure"
+    assert "browser crashed" in log["error"]
+    assert len(log["conversation"]) == 1
+
+
+def test_parse_truncated_trace(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    trace = TraceWriter(path, "never", simulation="simple_1")
+    trace.message({"role": "user", "content": "hi"})
+    trace.turn(0, {"completion": 1.0})
+    trace.message({"role": "assistant", "content": "ok"})
+    trace.close()
+    with open(path) as f:
+        lines = f.readlines()
+
+    # A crash can cut the last record off mid-line.
+    log = parse_trace(lines[:-1] + [lines[-1][:10]])
+    assert log["simulation"] == "simple_1"
+    assert log["status"] == "in_progress" and log["partial"]
+    assert log["conversation"] == [{"role": "user", "content": "hi"}]
+    assert log["timings"] == [{"completion": 1.0}]
+
+    log = parse_trace(lines + [json.dumps(dict(type="end", agent_status="success"))])
+    assert "partial" not in log
+    assert log["agent_status"] == "success"
+    assert len(log["conversation"]) == 2
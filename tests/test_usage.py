@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from unsub.api_util import completion, load_routes
+from unsub.mock_openai import MockOpenAIServer
+from unsub.usage import BudgetExceeded, model_prices, track_usage
+
+
+def test_budget_stops_calls_once_spent():
+    with MockOpenAIServer(lambda instructions, input: "x" * 4000) as server:
+        client = server.client()
+        with track_usage(budget=0.001) as scope:
+            completion(client, "Say x.", "", model="gpt-4o")
+            assert scope.usage.cost == pytest.approx(0.01, rel=0.01)
+            with pytest.raises(BudgetExceeded) as info:
+                completion(client, "Say x.", "", model="gpt-4o")
+    assert info.value.scope is scope
+    assert scope.usage.calls == 1
+
+
+def test_unpriced_model_is_reported_once(capsys):
+    assert model_prices("no-such-model") == (0.0, 0.0, 0.0)
+    model_prices("no-such-model")
+    assert capsys.readouterr().out.count("no-such-model") == 1
+
+
+def test_routes_need_priced_models(tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps({"spam": "gpt-4.1-nano"}))
+    assert load_routes(str(path))["spam"] == ["gpt-4.1-nano"]
+    path.write_text(json.dumps({"spam": ["gpt-4.1-nano", "no-such-model"]}))
+    with pytest.raises(ValueError, match="no-such-model"):
+        load_routes(str(path))
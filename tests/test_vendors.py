@@ -0,0 +1,27 @@
+from unsub.vendors import VendorEmail, group_vendors
+
+
+def _names(emails: list[VendorEmail]) -> list[list[str]]:
+    return [sorted(e.path for e in v.emails) for v in group_vendors(emails)]
+
+
+def test_unknown_tracking_host_does_not_merge_vendors():
+    emails = [
+        VendorEmail("a1", "https://links.iterable.com/u/1", "News <news@shopa.com>"),
+        VendorEmail("b1", "https://links.iterable.com/u/2", "News <news@bankb.com>"),
+        VendorEmail("c1", "https://app.mktomail.com/u/3", "Deals <deals@storec.com>"),
+        VendorEmail("d1", "https://app.mktomail.com/u/4", "Team <hi@appd.io>"),
+    ]
+    assert _names(emails) == [["a1"], ["b1"], ["c1"], ["d1"]]
+
+
+def test_target_domain_of_known_vendor_links_emails():
+    emails = [
+        VendorEmail("a1", "https://click.vendor.com/u/1", "news@vendor.com"),
+        VendorEmail("a2", "https://email.vendor.com/u/2", "offers@vendor-mail.com"),
+        VendorEmail("a3", "https://links.iterable.com/u/3", "x@vendor-mail.com"),
+        VendorEmail("b1", "https://links.iterable.com/u/4", "news@other.com"),
+    ]
+    vendors = group_vendors(emails)
+    assert _names(emails) == [["a1", "a2", "a3"], ["b1"]]
+    assert vendors[0].key == "vendor-mail.com"
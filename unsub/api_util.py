@@ -1,8 +1,12 @@
+import json
 import time
-from typing import Any, Literal, TypedDict
+from typing import Any, Callable, Literal, TypedDict, TypeVar
 
 from openai import OpenAI, RateLimitError
 
+from .metrics import counter, histogram
+from .usage import ModelPrices, check_budgets, record_usage
+
 
 class CompletionError(Exception):
     pass
@@ -12,6 +16,52 @@ class BadResponseFormat(Exception):
     pass
 
 
+class LowConfidence(Exception):
+    """
+    Raised while parsing a response which was well-formed but unsure. The
+    fallback is used if no stronger model is left to ask.
+    """
+
+    def __init__(self, message: str, fallback: Any):
+        super().__init__(message)
+        self.fallback = fallback
+
+
+CallSite = Literal[
+    "spam", "link_list", "link_code", "classify", "page_summary", "agent_turn"
+]
+
+# Models to try for each call site, from cheapest to strongest. Calls which
+# parse their response move up the list on BadResponseFormat or LowConfidence.
+DefaultRoutes: dict[CallSite, list[str]] = {
+    "spam": ["gpt-4.1-nano", "gpt-4o"],
+    "link_list": ["gpt-4.1-mini", "gpt-4o"],
+    "link_code": ["gpt-4.1-mini", "gpt-4o"],
+    "classify": ["gpt-4.1-mini", "gpt-4o"],
+    "page_summary": ["gpt-4.1-mini"],
+    "agent_turn": ["gpt-4o"],
+}
+
+_routes: dict[CallSite, list[str]] = dict(DefaultRoutes)
+
+T = TypeVar("T")
+
+CompletionSeconds = histogram(
+    "unsub_completion_seconds", "Latency of successful completion calls."
+)
+CompletionErrors = counter("unsub_completion_errors", "Failed completion calls.")
+Escalations = counter(
+    "unsub_completion_escalations",
+    "Retries of a routed call on the next model, by the reason for the retry.",
+)
+RateLimitSleeps = counter(
+    "unsub_rate_limit_sleeps", "Sleeps after the API returned a rate limit error."
+)
+RateLimitSleepSeconds = counter(
+    "unsub_rate_limit_sleep_seconds", "Time spent sleeping after rate limit errors."
+)
+
+
 class ChatMessageContentText(TypedDict):
     type: Literal["input_text", "output_text"]
     text: str
@@ -30,21 +80,112 @@ class ChatMessage(TypedDict):
     content: str | list[ChatMessageContent]
 
 
-def completion(client: OpenAI, instructions: str, input: Any) -> str:
+def completion(
+    client: OpenAI,
+    instructions: str,
+    input: Any,
+    model: str = "gpt-4o",
+    text_format: dict[str, Any] | None = None,
+    call_site: CallSite | None = None,
+) -> str:
+    """
+    Get a response's output text. If text_format is passed (e.g. a JSON
+    schema format), the output is constrained to it.
+
+    The call site only labels the call's metrics.
+    """
+    labels = dict(call_site=call_site or "other", model=model)
+    kwargs: dict[str, Any] = {}
+    if text_format is not None:
+        kwargs["text"] = {"format": text_format}
     while True:
+        check_budgets()
+        start = time.perf_counter()
         try:
             response = client.responses.create(
-                model="gpt-4o",
+                model=model,
                 instructions=instructions,
                 input=input,
+                **kwargs,
             )
         except RateLimitError:
+            RateLimitSleeps.inc(**labels)
+            RateLimitSleepSeconds.inc(30.0, **labels)
             time.sleep(30.0)
             continue
         except KeyboardInterrupt:
             raise
         except Exception as exc:
+            CompletionErrors.inc(**labels)
             raise CompletionError("API call failed") from exc
+        record_usage(model, response.usage)
         if err := response.error:
+            CompletionErrors.inc(**labels)
             raise CompletionError(f"error: {err}")
+        CompletionSeconds.observe(time.perf_counter() - start, **labels)
         return response.output_text
+
+
+def load_routes(path: str) -> dict[CallSite, list[str]]:
+    """
+    Load a JSON object mapping call sites to a model or a list of models.
+    Call sites which aren't mentioned keep their default models. Every model
+    needs prices in ModelPrices, so that budgets account for it.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+    routes = dict(DefaultRoutes)
+    for site, models in data.items():
+        if site not in DefaultRoutes:
+            raise ValueError(f"unknown call site: {site}")
+        routes[site] = [models] if isinstance(models, str) else list(models)
+        if not routes[site]:
+            raise ValueError(f"no models for call site: {site}")
+        for model in routes[site]:
+            if model not in ModelPrices:
+                raise ValueError(f"no prices for model {model} (see ModelPrices)")
+    return routes
+
+
+def set_routes(routes: dict[CallSite, list[str]]):
+    global _routes
+    _routes = dict(routes)
+
+
+def route(call_site: CallSite) -> list[str]:
+    return _routes[call_site]
+
+
+def routed_completion(
+    client: OpenAI,
+    call_site: CallSite,
+    instructions: str,
+    input: Any,
+    parse: Callable[[str], T],
+    text_format: dict[str, Any] | None = None,
+) -> T:
+    """
+    Call the cheapest model for a call site and parse its response, escalating
+    to the next model whenever parsing fails or isn't confident.
+    """
+    models = route(call_site)
+    for i, model in enumerate(models):
+        response = completion(
+            client,
+            instructions=instructions,
+            input=input,
+            model=model,
+            text_format=text_format,
+            call_site=call_site,
+        )
+        try:
+            return parse(response)
+        except (BadResponseFormat, LowConfidence) as exc:
+            if i + 1 < len(models):
+                reason = "unsure" if isinstance(exc, LowConfidence) else "bad_format"
+                Escalations.inc(call_site=call_site, model=model, reason=reason)
+                continue
+            if isinstance(exc, LowConfidence):
+                return exc.fallback
+            raise
+    raise AssertionError("unreachable")
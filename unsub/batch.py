@@ -0,0 +1,391 @@
+"""
+Classify emails offline through the batch API: write a JSONL file of
+classification requests per chunk of emails, submit it as a batch, poll it,
+and merge the results back into the email store.
+
+Like classify_email(), emails whose text links don't include an unsubscribe
+link are searched again by their HTML. These emails are marked with
+"link_pending" and go into a second round of chunks, with the same calls as
+find_unsubscribe_link_from_code(). All of an email's calls are made at once,
+and the first link found (in the same order) wins.
+
+All bookkeeping lives in a JSON state file, so an interrupted run can be
+resumed without resubmitting chunks which are already in flight.
+"""
+
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator, Literal
+
+from openai import OpenAI
+
+from .api_util import BadResponseFormat, LowConfidence, route
+from .classify import (
+    ClassificationFormat,
+    ClassificationInstructions,
+    classification_input,
+    parse_classification,
+)
+from .email_store import iter_email_paths, load_email
+from .gmail import Email
+from .unsub_link import code_link_prompts, parse_code_answer
+from .usage import Usage, usage_from_dict
+
+BatchEndpoint = "/v1/responses"
+
+# Batch requests are billed at half the interactive price.
+BatchDiscount = 0.5
+
+TerminalStatuses = ("completed", "failed", "expired", "cancelled")
+
+ChunkStatus = Literal["written", "uploaded", "submitted", "merged", "failed"]
+
+ChunkKind = Literal["classify", "link_code"]
+
+
+@dataclass
+class BatchChunk:
+    index: int
+    model: str
+    email_paths: list[str]
+    kind: ChunkKind = "classify"
+    status: ChunkStatus = "written"
+    input_file_id: str | None = None
+    batch_id: str | None = None
+    error: str | None = None
+
+
+@dataclass
+class BatchState:
+    path: str
+    chunks: list[BatchChunk] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, path: str) -> "BatchState":
+        if not os.path.exists(path):
+            return cls(path=path)
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(path=path, chunks=[BatchChunk(**c) for c in data["chunks"]])
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(dict(chunks=[asdict(c) for c in self.chunks]), f)
+        os.replace(tmp_path, self.path)
+
+    def in_flight_paths(self) -> set[str]:
+        return {
+            path
+            for chunk in self.chunks
+            if chunk.status not in ("merged", "failed")
+            for path in chunk.email_paths
+        }
+
+
+def iter_unclassified(email_dir: str) -> Iterator[str]:
+    """
+    Find email files in a list_unsub_links output directory which have not
+    been classified (or failed) yet.
+    """
+    for path in iter_email_paths(email_dir):
+        with open(path, "r") as f:
+            data = json.load(f)
+        if "email" in data and "spam" not in data and "error" not in data:
+            yield path
+
+
+def iter_link_pending(email_dir: str) -> Iterator[str]:
+    """
+    Find classified email files which still need their HTML searched.
+    """
+    for path in iter_email_paths(email_dir):
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("link_pending") and "error" not in data:
+            yield path
+
+
+def write_chunk(
+    state: BatchState,
+    paths: list[str],
+    model: str,
+    jsonl_dir: str,
+    kind: ChunkKind = "classify",
+):
+    chunk = BatchChunk(
+        index=len(state.chunks), model=model, email_paths=paths, kind=kind
+    )
+    with open(_jsonl_path(jsonl_dir, chunk), "w") as f:
+        for path in paths:
+            email = load_email(path)
+            if kind == "classify":
+                email_desc, _ = classification_input(email)
+                requests = [
+                    (
+                        email.id,
+                        ClassificationInstructions,
+                        email_desc,
+                        ClassificationFormat,
+                    )
+                ]
+            else:
+                _, prompts = code_link_prompts(email.body)
+                requests = [
+                    (f"{email.id}:{i}", instructions, input, None)
+                    for i, (instructions, input) in enumerate(prompts)
+                ]
+            for custom_id, instructions, input, text_format in requests:
+                body: dict[str, Any] = {
+                    "model": model,
+                    "instructions": instructions,
+                    "input": input,
+                }
+                if text_format is not None:
+                    body["text"] = {"format": text_format}
+                line = {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": BatchEndpoint,
+                    "body": body,
+                }
+                f.write(json.dumps(line) + "\n")
+    state.chunks.append(chunk)
+    state.save()
+
+
+def advance_chunk(
+    client: OpenAI, state: BatchState, chunk: BatchChunk, jsonl_dir: str
+) -> bool:
+    """
+    Move a chunk as far along as it can go without waiting, saving the state
+    after every step. Returns True once the chunk is finished.
+    """
+    if chunk.status == "written":
+        with open(_jsonl_path(jsonl_dir, chunk), "rb") as f:
+            chunk.input_file_id = client.files.create(file=f, purpose="batch").id
+        chunk.status = "uploaded"
+        state.save()
+    if chunk.status == "uploaded":
+        assert chunk.input_file_id is not None
+        batch = client.batches.create(
+            input_file_id=chunk.input_file_id,
+            endpoint=BatchEndpoint,
+            completion_window="24h",
+        )
+        chunk.batch_id = batch.id
+        chunk.status = "submitted"
+        state.save()
+    if chunk.status == "submitted":
+        assert chunk.batch_id is not None
+        batch = client.batches.retrieve(chunk.batch_id)
+        if batch.status not in TerminalStatuses:
+            return False
+        # Expired or cancelled batches may still have partial results. Emails
+        # without a result stay unclassified and go into a later chunk.
+        if batch.output_file_id:
+            merge_results(client, chunk, batch.output_file_id)
+            chunk.status = "merged"
+        else:
+            chunk.status = "failed"
+            chunk.error = f"batch {batch.status}: {batch.errors}"
+        state.save()
+    return True
+
+
+def merge_results(client: OpenAI, chunk: BatchChunk, output_file_id: str):
+    results: dict[str, dict[str, Any]] = {}
+    for line in client.files.content(output_file_id).text.splitlines():
+        if line.strip():
+            result = json.loads(line)
+            results[result["custom_id"]] = result
+    for path in chunk.email_paths:
+        email = load_email(path)
+        if chunk.kind == "link_code":
+            prefix = email.id + ":"
+            code_results = {
+                int(key[len(prefix) :]): result
+                for key, result in results.items()
+                if key.startswith(prefix)
+            }
+            if code_results:
+                _merge_code_results(path, email, chunk.model, code_results)
+        elif (result := results.get(email.id)) is not None:
+            _merge_result(path, email, chunk.model, result)
+
+
+def _merge_result(path: str, email: Email, model: str, result: dict[str, Any]):
+    with open(path, "r") as f:
+        output_data = json.load(f)
+    body, error = _result_body(result)
+    if error is not None:
+        output_data["error"] = error
+    else:
+        if (usage := _batch_usage(model, body)) is not None:
+            output_data["usage"] = usage.to_dict()
+        _, links = classification_input(email)
+        try:
+            classification = parse_classification(_output_text(body), links)
+        except LowConfidence as exc:
+            classification = exc.fallback
+        except BadResponseFormat as exc:
+            classification = None
+            output_data["error"] = str(exc)
+        if classification is not None:
+            output_data["spam"] = classification.spam
+            if classification.unsub_link is None and email.raw_body:
+                output_data["link_pending"] = True
+            else:
+                output_data["unsub_link"] = (
+                    asdict(classification.unsub_link)
+                    if classification.unsub_link
+                    else None
+                )
+    _write_output(path, output_data)
+
+
+def _merge_code_results(
+    path: str, email: Email, model: str, results: dict[int, dict[str, Any]]
+):
+    """
+    Merge the results of an email's code_link_prompts(). If a result that
+    might decide the link is missing (e.g. the batch expired), the email stays
+    pending.
+    """
+    with open(path, "r") as f:
+        output_data = json.load(f)
+    links, prompts = code_link_prompts(email.body)
+    usage = Usage(**output_data.get("usage", {}))
+    for result in results.values():
+        body, _ = _result_body(result)
+        if (call_usage := _batch_usage(model, body)) is not None:
+            usage.add(call_usage)
+    output_data["usage"] = usage.to_dict()
+
+    link = None
+    for i in range(len(prompts)):
+        if (result := results.get(i)) is None:
+            _write_output(path, output_data)
+            return
+        body, error = _result_body(result)
+        try:
+            if error is not None:
+                raise BadResponseFormat(error)
+            answer_idx = parse_code_answer(_output_text(body), links)
+        except BadResponseFormat as exc:
+            output_data["error"] = str(exc)
+            break
+        if answer_idx >= 0:
+            link = links[answer_idx]
+            break
+    del output_data["link_pending"]
+    if "error" not in output_data:
+        output_data["unsub_link"] = asdict(link) if link else None
+    _write_output(path, output_data)
+
+
+def _result_body(result: dict[str, Any]) -> tuple[dict[str, Any], str | None]:
+    """
+    Get the response body of a batch result, and an error if the request failed.
+    """
+    response = result.get("response") or {}
+    body = response.get("body") or {}
+    if result.get("error") or response.get("status_code") != 200:
+        return body, str(result.get("error") or body.get("error"))
+    return body, None
+
+
+def _batch_usage(model: str, body: dict[str, Any]) -> Usage | None:
+    if not body.get("usage"):
+        return None
+    usage = usage_from_dict(model, body["usage"])
+    usage.cost *= BatchDiscount
+    return usage
+
+
+def _write_output(path: str, output_data: dict[str, Any]):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(output_data, f)
+    os.replace(tmp_path, path)
+
+
+def _output_text(body: dict[str, Any]) -> str:
+    return "".join(
+        content.get("text", "")
+        for item in body.get("output", [])
+        if item.get("type") == "message"
+        for content in item.get("content", [])
+        if content.get("type") == "output_text"
+    )
+
+
+def _jsonl_path(jsonl_dir: str, chunk: BatchChunk) -> str:
+    return os.path.join(jsonl_dir, f"chunk_{chunk.index:05d}.jsonl")
+
+
+def _write_code_chunk(
+    state: BatchState, chunk: BatchChunk, model: str, jsonl_dir: str
+):
+    """
+    Write a chunk to search the HTML of a merged chunk's emails which had no
+    unsubscribe link among their text links.
+    """
+    paths = []
+    for path in chunk.email_paths:
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("link_pending") and "error" not in data:
+            paths.append(path)
+    if paths:
+        write_chunk(state, paths, model, jsonl_dir, "link_code")
+
+
+def run_batches(
+    client: OpenAI,
+    email_dir: str,
+    state_dir: str,
+    model: str,
+    code_model: str | None = None,
+    chunk_size: int = 1000,
+    poll_interval: float = 60.0,
+    wait: bool = True,
+):
+    """
+    Submit every unclassified email in email_dir, then (if wait is True) poll
+    until all chunks are merged. Emails that need their HTML searched are
+    submitted as they come up, with code_model (by default, the first model
+    routed for link_code calls).
+    """
+    code_model = code_model or route("link_code")[0]
+    os.makedirs(state_dir, exist_ok=True)
+    state = BatchState.load(os.path.join(state_dir, "state.json"))
+    in_flight = state.in_flight_paths()
+    paths = [p for p in iter_unclassified(email_dir) if p not in in_flight]
+    code_paths = [p for p in iter_link_pending(email_dir) if p not in in_flight]
+    num_chunks = len(state.chunks)
+    for i in range(0, len(paths), chunk_size):
+        write_chunk(state, paths[i : i + chunk_size], model, state_dir)
+    for i in range(0, len(code_paths), chunk_size):
+        write_chunk(
+            state, code_paths[i : i + chunk_size], code_model, state_dir, "link_code"
+        )
+    print(
+        f"wrote {len(paths) + len(code_paths)} emails into "
+        f"{len(state.chunks) - num_chunks} new chunks"
+    )
+
+    while True:
+        pending = [c for c in state.chunks if c.status not in ("merged", "failed")]
+        for chunk in pending:
+            if advance_chunk(client, state, chunk, state_dir):
+                print(f"chunk {chunk.index}: {chunk.status}")
+                if chunk.kind == "classify" and chunk.status == "merged":
+                    _write_code_chunk(state, chunk, code_model, state_dir)
+        pending = [c for c in state.chunks if c.status not in ("merged", "failed")]
+        if not pending or not wait:
+            print(f"{len(pending)} chunks still in progress")
+            return
+        time.sleep(poll_interval)
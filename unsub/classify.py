@@ -0,0 +1,112 @@
+"""
+Decide whether an email is spam and find its unsubscribe link with a single
+structured-output call, instead of separate spam and link-list calls.
+"""
+
+import json
+from dataclasses import dataclass
+
+from openai import OpenAI
+
+from .api_util import BadResponseFormat, LowConfidence, routed_completion
+from .gmail import Email
+from .link import Link
+from .spam import SpamRubric
+from .unsub_link import LinkTieBreak, find_unsubscribe_link_from_code, format_links
+
+ClassificationFormat = {
+    "type": "json_schema",
+    "name": "email_classification",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "reasoning": {"type": "string"},
+            "spam": {"type": "string", "enum": ["SPAM", "NOT SPAM", "UNSURE"]},
+            "unsubscribe_link": {"type": "integer"},
+        },
+        "required": ["reasoning", "spam", "unsubscribe_link"],
+        "additionalProperties": False,
+    },
+}
+
+
+@dataclass
+class Classification:
+    spam: bool
+    unsub_link: Link | None
+
+
+ClassificationInstructions = (
+    SpamRubric + " Answer SPAM, NOT SPAM, or UNSURE if you can't tell.\n\n"
+    "Also, out of the email's numbered links, choose the one that looks like an "
+    "unsubscribe link, or -1 if none of them do. " + LinkTieBreak
+)
+
+
+def classify_email(
+    client: OpenAI,
+    email: Email,
+    max_links: int = 100,
+    max_url_len: int = 50,
+) -> Classification:
+    """
+    Classify an email in one call. If none of the email's text links is an
+    unsubscribe link, this falls back to searching the email's HTML, like
+    find_unsubscribe_link().
+    """
+    email_desc, links = classification_input(email, max_links, max_url_len)
+    result = routed_completion(
+        client,
+        "classify",
+        instructions=ClassificationInstructions,
+        input=email_desc,
+        parse=lambda response: parse_classification(response, links),
+        text_format=ClassificationFormat,
+    )
+    if result.unsub_link is None and email.raw_body:
+        result.unsub_link = find_unsubscribe_link_from_code(client, email.body)
+    return result
+
+
+def classification_input(
+    email: Email, max_links: int = 100, max_url_len: int = 50
+) -> tuple[str, list[Link]]:
+    """
+    Describe an email for ClassificationInstructions, returning the text and
+    the links which its answers refer to.
+    """
+    links = email.links()
+    # Unsubscribe links are almost always in the footer, so keep the last links.
+    links = links[-max_links:]
+
+    email_desc = (
+        f"Sender: {email.sender}\nSubject: {email.subject}\n"
+        f"Snippet: {email.snippet}\n\nLinks:\n"
+    )
+    email_desc += format_links(links, max_url_len) if links else "(none)\n"
+    return email_desc, links
+
+
+def parse_classification(response: str, links: list[Link]) -> Classification:
+    try:
+        data = json.loads(response)
+        verdict, answer_idx = data["spam"], int(data["unsubscribe_link"])
+    except (ValueError, TypeError, KeyError) as exc:
+        raise BadResponseFormat(f"invalid classification: {response}") from exc
+    if answer_idx > len(links):
+        raise BadResponseFormat(
+            f"answer is out of range: {answer_idx} (only have {len(links)} links)"
+        )
+    link = links[answer_idx - 1] if answer_idx >= 1 else None
+    match verdict:
+        case "SPAM":
+            return Classification(spam=True, unsub_link=link)
+        case "NOT SPAM":
+            return Classification(spam=False, unsub_link=link)
+        case "UNSURE":
+            # Err on the side of caution, as in is_spam().
+            fallback = Classification(spam=False, unsub_link=link)
+            raise LowConfidence("model is unsure", fallback=fallback)
+        case _:
+            raise BadResponseFormat(f"unexpected spam verdict: {verdict}")
@@ -0,0 +1,114 @@
+"""
+Classify a backlog of emails (spam verdicts and unsubscribe links) through
+the batch API, at batch pricing and without rate limits. Results are merged
+into the same files that list_unsub_links writes.
+"""
+
+import argparse
+import json
+import os
+
+from openai import OpenAI
+
+from unsub.api_util import route
+from unsub.batch import run_batches
+from unsub.email_store import email_path, email_record
+from unsub.gmail import DefaultLabels, get_gmail_pool, iter_emails
+from unsub.mock_openai import MockOpenAIServer, stub_respond
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--email_dir", type=str, default="emails")
+    parser.add_argument("--state_dir", type=str, default="email_batches")
+    parser.add_argument(
+        "--fetch",
+        action="store_true",
+        help="first save new emails from Gmail to --email_dir, unclassified",
+    )
+    parser.add_argument("--token_path", type=str, default="token.json")
+    parser.add_argument(
+        "--query",
+        type=str,
+        default=None,
+        help='Gmail search query to filter fetched emails, e.g. "newer_than:30d"',
+    )
+    parser.add_argument(
+        "--labels",
+        type=str,
+        nargs="*",
+        default=list(DefaultLabels),
+        help="only fetch emails with all of these label IDs",
+    )
+    parser.add_argument(
+        "--gmail_workers",
+        type=int,
+        default=8,
+        help="threads (each with its own connection) for fetching emails",
+    )
+    parser.add_argument(
+        "--storage",
+        choices=("full", "blob"),
+        default="full",
+        help="how to store fetched emails (their bodies are needed to classify them)",
+    )
+    parser.add_argument("--model", type=str, default=route("classify")[0])
+    parser.add_argument(
+        "--code_model",
+        type=str,
+        default=route("link_code")[0],
+        help="model for searching the HTML of emails with no link among their links",
+    )
+    parser.add_argument("--chunk_size", type=int, default=1000)
+    parser.add_argument("--poll_interval", type=float, default=60.0)
+    parser.add_argument(
+        "--no_wait",
+        action="store_true",
+        help="submit (and merge finished chunks), then exit instead of polling",
+    )
+    parser.add_argument(
+        "--mock",
+        action="store_true",
+        help="run against a local stand-in for the API with a heuristic model",
+    )
+    args = parser.parse_args()
+
+    if args.fetch:
+        svc = get_gmail_pool(credentials_path=args.token_path, size=args.gmail_workers)
+        for email in iter_emails(svc, query=args.query, label_ids=args.labels):
+            out_path = email_path(args.email_dir, email.id)
+            if os.path.exists(out_path):
+                continue
+            record = email_record(email, args.email_dir, args.storage)
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            with open(out_path, "w") as f:
+                json.dump(dict(email=record), f)
+
+    if args.mock:
+        with MockOpenAIServer(stub_respond, batch_delay=1.0) as server:
+            run_batches(
+                server.client(),
+                args.email_dir,
+                args.state_dir,
+                model=args.model,
+                code_model=args.code_model,
+                chunk_size=args.chunk_size,
+                poll_interval=min(args.poll_interval, 1.0),
+                wait=True,
+            )
+        return
+
+    run_batches(
+        OpenAI(),
+        args.email_dir,
+        args.state_dir,
+        model=args.model,
+        code_model=args.code_model,
+        chunk_size=args.chunk_size,
+        poll_interval=args.poll_interval,
+        wait=not args.no_wait,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark the non-LLM overhead of the agent harness (driver calls, screenshots,
+diffing, logging and waits) on every simulation, using a local mock of the
+OpenAI API which replies with known-good code.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from unsub.cmd.timing_report import percentile
+from unsub.mock_openai import MockOpenAIServer, scripted_agent
+from unsub.simulations import (
+    ServerSimulation,
+    SharedSimulationServer,
+    Simulations,
+    select_simulations,
+)
+from unsub.simulations.solutions import Solutions
+from unsub.unsub_agent import create_driver, unsubscribe_on_website
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--simulation",
+        type=str,
+        default=None,
+        help="name or glob pattern, e.g. 'generated_*' (default: hand-written ones)",
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--wait_between_turns", type=float, default=2.0)
+    parser.add_argument("--user_email", type=str, default="annabelle.lee@gmail.com")
+    parser.add_argument("--output-dir", type=str, default=None)
+    parser.add_argument("--headless", action="store_true")
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix="bench_harness_")
+    names = [name for name in select_simulations(args.simulation) if name in Solutions]
+
+    browser = create_driver(headless=args.headless)
+    server = MockOpenAIServer(scripted_agent([])).start()
+    ServerSimulation.shared = SharedSimulationServer().start()
+    client = server.client()
+
+    all_turns = []
+    all_trials = []
+    print(
+        f"{'simulation':<16}{'ok':>5}{'turns':>7}{'turn p50':>10}{'turn p95':>10}"
+        f"{'trial p50':>11}{'api p50':>9}{'log p50':>9}"
+    )
+    try:
+        for name in names:
+            server.respond = scripted_agent(Solutions[name])
+            turn_times = []
+            trial_times = []
+            api_times = []
+            log_times = []
+            num_ok = 0
+            for trial_idx in range(args.runs):
+                sim = Simulations[name]()
+                url = sim.start()
+                timings: list[dict[str, float]] = []
+                start = time.perf_counter()
+                status, conversation = unsubscribe_on_website(
+                    client,
+                    browser,
+                    url,
+                    args.user_email,
+                    wait_between_turns=args.wait_between_turns,
+                    timings=timings,
+                )
+                elapsed = time.perf_counter() - start
+                actual_status = sim.finish()
+                num_ok += int(status == actual_status == "success")
+
+                start = time.perf_counter()
+                with open(os.path.join(output_dir, f"{name}_{trial_idx}.json"), "w") as f:
+                    json.dump(dict(conversation=conversation, timings=timings), f)
+                log_times.append(time.perf_counter() - start)
+
+                # Harness time is everything except the (mocked) API round trips.
+                api_time = sum(
+                    t.get("completion", 0.0) + t.get("html_summary", 0.0)
+                    for t in timings
+                )
+                api_times.append(api_time)
+                trial_times.append(elapsed - api_time + log_times[-1])
+                for t in timings:
+                    turn_times.append(
+                        sum(
+                            v
+                            for k, v in t.items()
+                            if k not in ("completion", "html_summary")
+                        )
+                    )
+            all_turns.extend(turn_times)
+            all_trials.extend(trial_times)
+            print(
+                f"{name:<16}{f'{num_ok}/{args.runs}':>5}{len(turn_times):>7}"
+                f"{_seconds(turn_times, 50):>10}{_seconds(turn_times, 95):>10}"
+                f"{_seconds(trial_times, 50):>11}{_seconds(api_times, 50):>9}"
+                f"{_seconds(log_times, 50):>9}"
+            )
+    finally:
+        server.stop()
+        ServerSimulation.shared.stop()
+        browser.quit()
+
+    print(
+        f"overall: {len(all_trials)} trials, {len(all_turns)} turns, "
+        f"turn p50={_seconds(all_turns, 50)} p95={_seconds(all_turns, 95)}, "
+        f"trial p50={_seconds(all_trials, 50)} p95={_seconds(all_trials, 95)}"
+    )
+
+
+def _seconds(values: list[float], q: float) -> str:
+    # No samples if nothing was selected, --runs is 0, or every trial failed
+    # before its first turn.
+    return f"{percentile(values, q):.3f}s" if values else "n/a"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark unsubscribe link extraction on a corpus of emails (optionally
+generated synthetically), using a stubbed model so that results only reflect
+parsing cost, memory and the number of completion calls.
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+import tracemalloc
+from typing import Any
+
+from unsub.cmd.timing_report import percentile
+from unsub.classify import classify_email
+from unsub.email_store import load_email
+from unsub.mock_openai import stub_respond
+from unsub.replay import FakeClient
+from unsub.synthetic import write_corpus
+from unsub.unsub_link import find_unsubscribe_link
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--email_dir", type=str, required=True)
+    parser.add_argument(
+        "--generate",
+        type=int,
+        default=0,
+        help="first write this many synthetic emails into --email_dir",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--memory", action="store_true", help="trace peak memory")
+    parser.add_argument(
+        "--combined",
+        action="store_true",
+        help="use classify_email() (spam and link in one call) instead",
+    )
+    args = parser.parse_args()
+
+    if args.generate:
+        write_corpus(args.email_dir, args.generate, seed=args.seed)
+
+    num_calls = 0
+
+    def respond(instructions: str, input: Any) -> str:
+        nonlocal num_calls
+        num_calls += 1
+        return stub_respond(instructions, input)
+
+    client = FakeClient(respond)
+
+    parse_times = []
+    find_times = []
+    calls = []
+    peaks = []
+    correct = 0
+    labeled = 0
+    paths = glob.glob(os.path.join(args.email_dir, "*", "*.json"))
+    for path in paths:
+        with open(path, "r") as f:
+            data = json.load(f)
+        email = load_email(path, data)
+        expected = (data.get("unsub_link") or {}).get("href")
+
+        start = time.perf_counter()
+        email.links()
+        parse_times.append(time.perf_counter() - start)
+
+        if args.memory:
+            tracemalloc.start()
+        calls_before = num_calls
+        start = time.perf_counter()
+        if args.combined:
+            link = classify_email(client, email).unsub_link  # type: ignore
+        else:
+            link = find_unsubscribe_link(client, email)  # type: ignore
+        find_times.append(time.perf_counter() - start)
+        calls.append(num_calls - calls_before)
+        if args.memory:
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        if "synthetic" in data:
+            labeled += 1
+            correct += int((link.href if link else None) == expected)
+
+    if not paths:
+        print("no emails found")
+        return
+
+    print(f"{len(paths)} emails")
+    print(
+        f"links() parse time: p50={percentile(parse_times, 50) * 1000:.2f}ms "
+        f"p95={percentile(parse_times, 95) * 1000:.2f}ms"
+    )
+    print(
+        f"find_unsubscribe_link time: p50={percentile(find_times, 50) * 1000:.2f}ms "
+        f"p95={percentile(find_times, 95) * 1000:.2f}ms"
+    )
+    print(
+        f"completion calls per email: mean={sum(calls) / len(calls):.2f} "
+        f"p95={percentile(calls, 95)} max={max(calls)}"
+    )
+    if peaks:
+        print(
+            f"peak memory: p50={percentile(peaks, 50) / 1e6:.2f}MB "
+            f"max={max(peaks) / 1e6:.2f}MB"
+        )
+    if labeled:
+        print(f"accuracy on synthetic emails: {correct}/{labeled}")
+
+
+if __name__ == "__main__":
+    main()
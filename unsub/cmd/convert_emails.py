@@ -0,0 +1,50 @@
+"""
+Convert an existing list_unsub_links output directory to another storage
+mode (see unsub.email_store), e.g. to move email bodies into compressed blobs.
+"""
+
+import argparse
+import os
+
+from unsub.email_store import (
+    BlobDir,
+    StorageModes,
+    convert_email_file,
+    iter_email_paths,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--email_dir", type=str, default="emails")
+    parser.add_argument("--storage", choices=StorageModes, required=True)
+    args = parser.parse_args()
+
+    size_before = dir_size(args.email_dir)
+    num_converted = 0
+    num_skipped = 0
+    for path in iter_email_paths(args.email_dir):
+        if convert_email_file(path, args.storage):
+            num_converted += 1
+        else:
+            num_skipped += 1
+    size_after = dir_size(args.email_dir)
+
+    print(f"converted {num_converted} emails to {args.storage} storage")
+    if num_skipped:
+        print(f"skipped {num_skipped} emails whose bodies were already dropped")
+    print(f"size: {size_before / 1e6:.1f}MB -> {size_after / 1e6:.1f}MB")
+
+
+def dir_size(root: str) -> int:
+    total = 0
+    for path in iter_email_paths(root):
+        total += os.path.getsize(path)
+    blob_root = os.path.join(root, BlobDir)
+    for dir_path, _, names in os.walk(blob_root):
+        total += sum(os.path.getsize(os.path.join(dir_path, name)) for name in names)
+    return total
+
+
+if __name__ == "__main__":
+    main()
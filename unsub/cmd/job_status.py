@@ -0,0 +1,38 @@
+"""
+Show (or reset) the state of a run_agent_many.py job queue.
+"""
+
+import argparse
+
+from unsub.job_queue import JobQueue
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queue_path", type=str, required=True)
+    parser.add_argument("--show_failures", action="store_true")
+    parser.add_argument(
+        "--retry_failed",
+        action="store_true",
+        help="move failed jobs back to pending with a fresh attempt budget",
+    )
+    args = parser.parse_args()
+
+    queue = JobQueue(args.queue_path)
+    if args.retry_failed:
+        print(f"re-queued {queue.retry_failed()} failed jobs")
+
+    counts = queue.counts()
+    total = sum(counts.values())
+    for state, count in counts.items():
+        print(f"{state:>8}: {count}")
+    print(f"{'total':>8}: {total}")
+
+    if args.show_failures:
+        for key, attempts, error in queue.failures():
+            last_line = (error or "").strip().splitlines()[-1:] or [""]
+            print(f" * {key} (attempts={attempts}): {last_line[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""
+Build per-domain playbooks from the successful logs of run_agent_many.py.
+"""
+
+import argparse
+
+from unsub.playbook import PlaybookStore
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log_path", type=str, required=True)
+    parser.add_argument("--playbook_dir", type=str, required=True)
+    args = parser.parse_args()
+
+    store = PlaybookStore(args.playbook_dir)
+    count = store.learn_from_logs(args.log_path)
+    print(f"learned {count} playbooks")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,338 @@
 import argparse
 import json
 import os
+import queue
+import threading
+import time
 import traceback
-from dataclasses import asdict
-from typing import Any
+from dataclasses import asdict, dataclass
+from typing import Any, Iterable, Iterator, TypeVar
 
 from openai import OpenAI
 
-from unsub.gmail import get_gmail_service, iter_emails
+from unsub.api_util import load_routes, set_routes
+from unsub.classify import classify_email
+from unsub.email_store import StorageModes, email_path, email_record
+from unsub.gmail import DefaultLabels, Email, get_gmail_pool, iter_emails
+from unsub.link import Link
+from unsub.metrics import MetricsExporter, counter, gauge
 from unsub.spam import is_spam
-from unsub.unsub_link import find_unsubscribe_link
+from unsub.unsub_link import (
+    find_unsubscribe_link,
+    find_unsubscribe_link_from_code,
+    find_unsubscribe_links_from_lists,
+)
+from unsub.usage import BudgetExceeded, UsageScope, resume_usage, track_usage
+
+EmailsProcessed = counter(
+    "unsub_emails_processed", "Emails handled by list_unsub_links, by result."
+)
+LinkBatchPending = gauge(
+    "unsub_link_batch_pending_emails", "Emails waiting for a batched link call."
+)
+
+T = TypeVar("T")
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--token-path", type=str, default="token.json")
     parser.add_argument("--output-dir", type=str, default="emails")
+    parser.add_argument(
+        "--query",
+        type=str,
+        default=None,
+        help='Gmail search query to filter emails, e.g. "newer_than:30d"',
+    )
+    parser.add_argument(
+        "--labels",
+        type=str,
+        nargs="*",
+        default=list(DefaultLabels),
+        help="only list emails with all of these label IDs",
+    )
+    parser.add_argument(
+        "--gmail-workers",
+        type=int,
+        default=8,
+        help="threads (each with its own connection) for fetching emails",
+    )
+    parser.add_argument(
+        "--budget-per-email", type=float, default=None, help="max USD per email"
+    )
+    parser.add_argument(
+        "--budget-per-run", type=float, default=None, help="max USD for this run"
+    )
+    parser.add_argument(
+        "--routes",
+        type=str,
+        default=None,
+        help="JSON file of models per call site (see unsub.api_util.DefaultRoutes)",
+    )
+    parser.add_argument(
+        "--combined",
+        action="store_true",
+        help="classify spam and pick the link in one structured-output call",
+    )
+    parser.add_argument(
+        "--batch-links",
+        type=int,
+        default=0,
+        help="pick links for many emails per call, with up to this many links",
+    )
+    parser.add_argument(
+        "--batch-delay",
+        type=float,
+        default=30.0,
+        help="max seconds an email waits for a link batch to fill up",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=str,
+        default=None,
+        help="periodically write OpenMetrics text to this file",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="serve OpenMetrics text at http://127.0.0.1:PORT/metrics",
+    )
+    parser.add_argument(
+        "--storage",
+        choices=StorageModes,
+        default="full",
+        help="keep email bodies inline, compressed in blobs, or not at all",
+    )
     args = parser.parse_args()
 
+    if args.routes:
+        set_routes(load_routes(args.routes))
+
     os.makedirs(args.output_dir, exist_ok=True)
 
     openai_client = OpenAI()
+    batcher = (
+        LinkBatcher(openai_client, args.batch_links, args.batch_delay)
+        if args.batch_links and not args.combined
+        else None
+    )
 
-    svc = get_gmail_service(credentials_path=args.token_path)
-    for email in iter_emails(svc):
-        out_path = os.path.join(args.output_dir, f"{email.id[-2:]}", email.id + ".json")
-        if os.path.exists(out_path):
-            continue
-        output_data: dict[str, Any] = dict(email=asdict(email))
+    svc = get_gmail_pool(credentials_path=args.token_path, size=args.gmail_workers)
+    emails: Iterator[Email | None] = iter_emails(
+        svc, query=args.query, label_ids=args.labels
+    )
+    if batcher is not None:
+        # Wake up while Gmail is slow, so batches are flushed on time.
+        emails = poll_iter(emails, timeout=min(1.0, args.batch_delay))
+    with MetricsExporter(args.metrics_file, args.metrics_port), track_usage(
+        budget=args.budget_per_run
+    ) as run_usage:
         try:
-            spam = is_spam(openai_client, email)
-            output_data["spam"] = spam
-            link = find_unsubscribe_link(openai_client, email)
-            output_data["unsub_link"] = asdict(link) if link else None
-            if spam or link:
-                print(
-                    f"found email with spam={spam} and link={link}: {email.sender} {email.subject}"
+            for email in emails:
+                if email is None:
+                    if batcher is not None and batcher.due():
+                        batcher.flush()
+                    continue
+                out_path = email_path(args.output_dir, email.id)
+                if os.path.exists(out_path):
+                    EmailsProcessed.inc(result="already_done")
+                    continue
+                output_data: dict[str, Any] = dict(
+                    email=email_record(email, args.output_dir, args.storage)
                 )
-            else:
-                print(f"clean email from {email.sender}: {email.subject}")
-        except Exception as exc:
-            traceback.print_exc()
-            output_data["error"] = str(exc)
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        with open(out_path, "w") as f:
-            json.dump(output_data, f)
+                deferred = skipped = False
+                with track_usage(
+                    budget=args.budget_per_email, email_id=email.id
+                ) as email_usage:
+                    try:
+                        if args.combined:
+                            result = classify_email(openai_client, email)
+                            spam, link = result.spam, result.unsub_link
+                        else:
+                            spam = is_spam(openai_client, email)
+                            links = []
+                            if batcher is not None and email.raw_body:
+                                links = email.links()
+                            if links:
+                                link = None
+                            else:
+                                link = find_unsubscribe_link(openai_client, email)
+                        output_data["spam"] = spam
+                        if batcher is not None and links:
+                            batcher.add(
+                                PendingEmail(
+                                    email, out_path, output_data, email_usage, links
+                                )
+                            )
+                            deferred = True
+                        else:
+                            output_data["unsub_link"] = asdict(link) if link else None
+                            report(email, spam, link)
+                    except BudgetExceeded as exc:
+                        if exc.scope is run_usage:
+                            raise
+                        # No output is written, so the email is retried next run.
+                        print(f"skipping email: {exc}")
+                        EmailsProcessed.inc(result="budget_exceeded")
+                        skipped = True
+                    except Exception as exc:
+                        traceback.print_exc()
+                        output_data["error"] = str(exc)
+                if not deferred and not skipped:
+                    write_output(out_path, output_data, email_usage)
+                if batcher is not None and batcher.due():
+                    batcher.flush()
+            if batcher is not None:
+                batcher.flush()
+        except BudgetExceeded as exc:
+            if exc.scope is not run_usage:
+                raise
+            # Emails still waiting for a link batch are retried on the next run.
+            print(f"stopping: {exc}")
+
+    print(f"total usage: {run_usage.usage}")
+
+
+def poll_iter(items: Iterable[T], timeout: float) -> Iterator[T | None]:
+    """
+    Iterate in a background thread, yielding None whenever no item arrives
+    within timeout seconds. Errors raised by the iterator are re-raised here.
+    """
+    results: queue.Queue[tuple[bool, Any]] = queue.Queue(maxsize=64)
+
+    def produce():
+        try:
+            for item in items:
+                results.put((False, item))
+        except BaseException as exc:
+            results.put((True, exc))
+        else:
+            results.put((True, None))
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        try:
+            done, value = results.get(timeout=timeout)
+        except queue.Empty:
+            yield None
+            continue
+        if done:
+            if value is not None:
+                raise value
+            return
+        yield value
+
+
+@dataclass
+class PendingEmail:
+    email: Email
+    out_path: str
+    output_data: dict[str, Any]
+    usage: UsageScope
+    links: list[Link]
+
+
+class LinkBatcher:
+    """
+    Collect emails whose link lists still need checking, and check many of
+    them per call once enough links have piled up or the oldest email has
+    waited for max_delay seconds.
+    """
+
+    def __init__(self, client: OpenAI, max_links: int, max_delay: float):
+        self.client = client
+        self.max_links = max_links
+        self.max_delay = max_delay
+        self.pending: list[PendingEmail] = []
+        self.oldest: float | None = None
+
+    def add(self, item: PendingEmail):
+        # Unsubscribe links are almost always in the footer, so keep the last links.
+        item.links = item.links[-self.max_links :]
+        self.pending.append(item)
+        LinkBatchPending.set(len(self.pending))
+        if self.oldest is None:
+            self.oldest = time.time()
+
+    def due(self) -> bool:
+        if not self.pending:
+            return False
+        assert self.oldest is not None
+        num_links = sum(len(item.links) for item in self.pending)
+        waited = time.time() - self.oldest
+        return num_links >= self.max_links or waited >= self.max_delay
+
+    def flush(self):
+        """
+        Pick links for all pending emails, falling back to each email's HTML
+        where none of its links matched, and write their outputs.
+        """
+        items, self.pending, self.oldest = self.pending, [], None
+        LinkBatchPending.set(0)
+        if not items:
+            return
+        error = None
+        with track_usage(batch_size=str(len(items))) as batch_usage:
+            try:
+                links = find_unsubscribe_links_from_lists(
+                    self.client, [item.links for item in items]
+                )
+            except BudgetExceeded:
+                raise
+            except Exception as exc:
+                traceback.print_exc()
+                error = str(exc)
+                links = [None] * len(items)
+        for item, link in zip(items, links):
+            with resume_usage(item.usage):
+                try:
+                    if error is not None:
+                        item.output_data["error"] = error
+                    else:
+                        if link is None:
+                            link = find_unsubscribe_link_from_code(
+                                self.client, item.email.body
+                            )
+                        item.output_data["unsub_link"] = asdict(link) if link else None
+                        report(item.email, item.output_data["spam"], link)
+                except BudgetExceeded as exc:
+                    if exc.scope is not item.usage:
+                        raise
+                    # As in main(), the email is retried by the next run.
+                    print(f"skipping email: {exc}")
+                    EmailsProcessed.inc(result="budget_exceeded")
+                    continue
+                except Exception as exc:
+                    traceback.print_exc()
+                    item.output_data["error"] = str(exc)
+            # The batched call is shared by all of its emails, so it's recorded
+            # separately from each email's own usage.
+            item.output_data["batch_usage"] = batch_usage.usage.to_dict()
+            write_output(item.out_path, item.output_data, item.usage)
+
+
+def report(email: Email, spam: bool, link: Link | None):
+    if spam or link:
+        print(
+            f"found email with spam={spam} and link={link}: {email.sender} {email.subject}"
+        )
+    else:
+        print(f"clean email from {email.sender}: {email.subject}")
+
+
+def write_output(
+    out_path: str, output_data: dict[str, Any], usage: UsageScope | None = None
+):
+    if usage is not None:
+        output_data["usage"] = usage.usage.to_dict()
+    if "error" in output_data:
+        EmailsProcessed.inc(result="error")
+    else:
+        EmailsProcessed.inc(result="spam" if output_data.get("spam") else "clean")
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(output_data, f)
 
 
 if __name__ == "__main__":
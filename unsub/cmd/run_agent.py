@@ -9,7 +9,11 @@ import traceback
 
 from openai import OpenAI
 
+from unsub.api_util import load_routes, set_routes
+from unsub.replay import RecordingClient, ReplayClient
+from unsub.trace import FsyncPolicies, TraceWriter
 from unsub.unsub_agent import create_driver, unsubscribe_on_website
+from unsub.usage import track_usage
 
 
 def main():
@@ -17,27 +21,69 @@ def main():
     parser.add_argument("--url", type=str, required=True)
     parser.add_argument("--user_email", type=str, required=True)
     parser.add_argument("--log_path", type=str, default=None)
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="stream the log to --log_path as JSONL while the agent runs",
+    )
+    parser.add_argument("--trace_fsync", choices=FsyncPolicies, default="turn")
     parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--record_path", type=str, default=None)
+    parser.add_argument("--replay_path", type=str, default=None)
+    parser.add_argument(
+        "--use_digest",
+        action="store_true",
+        help="describe interactive elements as text and skip unchanged screenshots",
+    )
+    parser.add_argument(
+        "--routes",
+        type=str,
+        default=None,
+        help="JSON file of models per call site (see unsub.api_util.DefaultRoutes)",
+    )
     args = parser.parse_args()
 
-    openai_client = OpenAI()
+    if args.routes:
+        set_routes(load_routes(args.routes))
+
+    if args.replay_path:
+        openai_client = ReplayClient.load(args.replay_path)
+    elif args.record_path:
+        openai_client = RecordingClient(OpenAI())
+    else:
+        openai_client = OpenAI()
     browser = create_driver()
 
     result = dict(url=args.url, user_email=args.user_email)
-    try:
-        status, conversation = unsubscribe_on_website(
-            openai_client,
-            browser,
-            args.url,
-            args.user_email,
-            verbose=args.verbose,
-        )
-        result["status"] = status
-        result["conversation"] = conversation
-    except:
-        result["error"] = traceback.format_exc()
-
-    if args.log_path:
+    trace = None
+    if args.trace and args.log_path:
+        trace = TraceWriter(args.log_path, args.trace_fsync, **result)
+    timings: list[dict[str, float]] = []
+    with track_usage() as usage:
+        try:
+            status, conversation = unsubscribe_on_website(
+                openai_client,  # type: ignore
+                browser,
+                args.url,
+                args.user_email,
+                verbose=args.verbose,
+                timings=timings,
+                use_digest=args.use_digest,
+                trace=trace,
+            )
+            result["status"] = status
+            result["conversation"] = conversation
+            result["timings"] = timings
+        except:
+            result["error"] = traceback.format_exc()
+    result["usage"] = usage.usage.to_dict()
+
+    if isinstance(openai_client, RecordingClient):
+        openai_client.save(args.record_path)
+
+    if trace is not None:
+        trace.end(**result)
+    elif args.log_path:
         with open(args.log_path, "w") as f:
             json.dump(result, f)
 
@@ -3,14 +3,32 @@ Run an unsubscribe agent on a real URL.
 """
 
 import argparse
-import glob
 import json
 import os
+import time
 import traceback
+from dataclasses import asdict
+from typing import Any
 
 from openai import OpenAI
+from selenium.webdriver.chrome.webdriver import WebDriver
 
+from unsub.api_util import load_routes, set_routes
+from unsub.job_queue import JobQueue, default_worker_id
+from unsub.metrics import MetricsExporter, counter, gauge, histogram
+from unsub.playbook import PlaybookStore, unsubscribe_with_playbooks
+from unsub.precheck import create_http_session, precheck_unsubscribe
+from unsub.redirects import RedirectCache, resolve_redirects
+from unsub.trace import FsyncPolicies, TraceSuffix, TraceWriter, load_log
 from unsub.unsub_agent import create_driver, unsubscribe_on_website
+from unsub.usage import BudgetExceeded, track_usage
+from unsub.vendors import group_vendors, load_vendor_emails, url_domain
+
+Jobs = gauge("unsub_jobs", "Jobs in the queue, by state.")
+JobSeconds = histogram("unsub_job_seconds", "Time spent on each finished job.")
+VendorOutcomes = counter(
+    "unsub_vendor_outcomes", "Finished jobs by vendor and status (or error)."
+)
 
 
 def main():
@@ -20,50 +38,289 @@ def main():
     parser.add_argument("--log_path", type=str, required=True)
     parser.add_argument("--verbose", action="store_true")
     parser.add_argument("--headless", action="store_true")
+    parser.add_argument(
+        "--playbook_dir",
+        type=str,
+        default=None,
+        help="replay (and learn) per-domain action sequences before running the full agent",
+    )
+    parser.add_argument(
+        "--use_digest",
+        action="store_true",
+        help="describe interactive elements as text and skip unchanged screenshots",
+    )
+    parser.add_argument(
+        "--http_precheck",
+        action="store_true",
+        help="try plain HTTP requests before launching the browser agent",
+    )
+    parser.add_argument(
+        "--resolve_redirects",
+        action="store_true",
+        help="follow tracking redirects in links before grouping and running agents",
+    )
+    parser.add_argument(
+        "--redirect_cache",
+        type=str,
+        default=None,
+        help="JSON cache of resolved links (default: <log_path>/redirects.json)",
+    )
+    parser.add_argument(
+        "--redirect_max_age",
+        type=float,
+        default=30.0,
+        help="days after which cached links are followed again",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="stream each log to <log_path>/<vendor>.jsonl while the agent runs",
+    )
+    parser.add_argument("--trace_fsync", choices=FsyncPolicies, default="turn")
+    parser.add_argument(
+        "--queue_path",
+        type=str,
+        default=None,
+        help="SQLite job queue shared by workers (default: <log_path>/jobs.sqlite3)",
+    )
+    parser.add_argument(
+        "--metrics_file",
+        type=str,
+        default=None,
+        help="periodically write OpenMetrics text to this file",
+    )
+    parser.add_argument(
+        "--metrics_port",
+        type=int,
+        default=None,
+        help="serve OpenMetrics text at http://127.0.0.1:PORT/metrics",
+    )
+    parser.add_argument("--max_attempts", type=int, default=3)
+    parser.add_argument("--lease_seconds", type=float, default=600.0)
+    parser.add_argument(
+        "--budget_per_domain", type=float, default=None, help="max USD per domain"
+    )
+    parser.add_argument(
+        "--budget_per_run", type=float, default=None, help="max USD for this run"
+    )
+    parser.add_argument(
+        "--routes",
+        type=str,
+        default=None,
+        help="JSON file of models per call site (see unsub.api_util.DefaultRoutes)",
+    )
     args = parser.parse_args()
 
+    if args.routes:
+        set_routes(load_routes(args.routes))
+
     os.makedirs(args.log_path, exist_ok=True)
 
     openai_client = OpenAI()
-    browser = create_driver(headless=args.headless)
-
-    for path in glob.glob(os.path.join(args.email_dir, "*", "*.json")):
-        with open(path, "r") as f:
-            url = (json.load(f).get("unsub_link") or {}).get("href")
-        if not url:
-            continue
-        try:
-            domain = url.split("://")[1].split("/")[0]
-        except KeyboardInterrupt:
-            raise
-        except:
-            continue
-        out_path = os.path.join(args.log_path, domain + ".json")
-        if os.path.exists(out_path):
-            print("skipping url for domain:", domain)
-            continue
-        print("working on url:", url)
-
-        result = dict(url=url, domain=domain, user_email=args.user_email)
-        try:
-            status, conversation = unsubscribe_on_website(
-                openai_client,
-                browser,
-                url,
-                args.user_email,
-                verbose=args.verbose,
+    # The browser is only started once a URL actually needs it.
+    browser = None
+    http_session = create_http_session() if args.http_precheck else None
+    playbooks = PlaybookStore(args.playbook_dir) if args.playbook_dir else None
+
+    queue = JobQueue(
+        args.queue_path or os.path.join(args.log_path, "jobs.sqlite3"),
+        max_attempts=args.max_attempts,
+        lease_seconds=args.lease_seconds,
+    )
+    worker_id = default_worker_id()
+
+    vendor_emails = load_vendor_emails(args.email_dir)
+    resolve = None
+    if args.resolve_redirects:
+        cache = RedirectCache(
+            args.redirect_cache or os.path.join(args.log_path, "redirects.json"),
+            max_age=args.redirect_max_age * 24 * 60 * 60,
+        )
+        failures = resolve_redirects((e.url for e in vendor_emails), cache)
+        print(f"resolved redirects ({failures} links failed)")
+        resolve = cache.final_url
+    vendors = group_vendors(vendor_emails, resolve=resolve)
+    print(f"grouped {len(vendor_emails)} emails into {len(vendors)} vendors")
+    for vendor in vendors:
+        url = vendor.freshest.url
+        if resolve is not None:
+            url = resolve(url)
+        domain = url_domain(url)
+        # Logs from runs before the queue (or vendor grouping) existed count as
+        # finished work.
+        done = any(
+            finished_log(args.log_path, name) is not None
+            for name in (vendor.key, domain)
+        )
+        queue.enqueue(
+            vendor.key,
+            dict(url=url, domain=domain, vendor=vendor.key, emails=len(vendor.emails)),
+            done=done,
+        )
+
+    print("queued jobs:", queue.counts())
+    update_job_gauges(queue)
+
+    with MetricsExporter(args.metrics_file, args.metrics_port), track_usage(
+        budget=args.budget_per_run
+    ) as run_usage:
+        while True:
+            job = queue.claim(worker_id)
+            if job is None:
+                if (next_time := queue.next_available_at()) is None:
+                    break
+                time.sleep(min(max(next_time - time.time(), 1.0), 30.0))
+                continue
+
+            url, domain = job.payload["url"], job.payload["domain"]
+            vendor = job.payload.get("vendor", domain)
+            out_path = os.path.join(args.log_path, vendor + ".json")
+            # The log is written before the queue is updated, so a crash in
+            # between leaves a finished job claimable again.
+            log = finished_log(args.log_path, vendor)
+            if log is not None and retry_reason(log) is None:
+                print(f"already finished {vendor} with status:", log.get("status"))
+                queue.complete(job.key, worker_id)
+                update_job_gauges(queue)
+                continue
+            print(f"working on {vendor} (attempt {job.attempts}):", url)
+            job_start = time.time()
+
+            result = dict(
+                url=url, domain=domain, vendor=vendor, user_email=args.user_email
             )
-            result["status"] = status
-            result["conversation"] = conversation
-        except KeyboardInterrupt:
-            raise
-        except:
-            result["error"] = traceback.format_exc()
+            trace = None
+            if args.trace:
+                trace = TraceWriter(
+                    os.path.join(args.log_path, vendor + TraceSuffix),
+                    args.trace_fsync,
+                    attempt=job.attempts,
+                    **result,
+                )
+            with queue.keep_alive(job.key, worker_id):
+                if http_session is not None:
+                    precheck = precheck_unsubscribe(http_session, url, args.user_email)
+                    result["precheck"] = asdict(precheck)
+                    if precheck.status == "success":
+                        result["status"] = "success"
+                        result["conversation"] = []
+                        print(" - done over plain HTTP:", precheck.reason)
+
+                if "status" not in result:
+                    if browser is None:
+                        browser = create_driver(headless=args.headless)
+                    with track_usage(
+                        budget=args.budget_per_domain, domain=domain
+                    ) as domain_usage:
+                        try:
+                            run_agent(
+                                openai_client, browser, playbooks, args, result, trace
+                            )
+                        except BudgetExceeded as exc:
+                            if exc.scope is run_usage:
+                                print(f"stopping: {exc}")
+                                queue.release(job.key, worker_id)
+                                if trace is not None:
+                                    trace.close()
+                                break
+                            result["budget_exceeded"] = str(exc)
+                        except KeyboardInterrupt:
+                            raise
+                        except:
+                            result["error"] = traceback.format_exc()
+                    result["usage"] = domain_usage.usage.to_dict()
+
+                    print(" - done with status:", result.get("status"))
+
+            if trace is not None:
+                trace.end(**result)
+            else:
+                # Write atomically so that an interrupted write is never mistaken
+                # for a finished log.
+                with open(out_path + ".tmp", "w") as f:
+                    json.dump(result, f)
+                os.replace(out_path + ".tmp", out_path)
+
+            if (reason := retry_reason(result)) is not None:
+                queue.fail(job.key, worker_id, reason)
+            else:
+                queue.complete(job.key, worker_id)
+            JobSeconds.observe(time.time() - job_start)
+            status = str(result.get("status"))
+            if "error" in result:
+                status = "error"
+            elif "budget_exceeded" in result:
+                status = "budget_exceeded"
+            VendorOutcomes.inc(vendor=vendor, status=status)
+            update_job_gauges(queue)
+
+    print("final job states:", queue.counts())
+    print(f"total usage: {run_usage.usage}")
+
+
+def retry_reason(result: dict[str, Any]) -> str | None:
+    """
+    Get the reason to retry a job, if its run errored or went over budget.
+    """
+    return result.get("error") or result.get("budget_exceeded")
+
+
+def finished_log(log_path: str, name: str) -> dict[str, Any] | None:
+    """
+    Load the log of a finished run, either a JSON log or a trace that ended.
+    """
+    for path in (
+        os.path.join(log_path, name + ".json"),
+        os.path.join(log_path, name + TraceSuffix),
+    ):
+        if os.path.exists(path) and not (log := load_log(path)).get("partial"):
+            return log
+    return None
+
+
+def update_job_gauges(queue: JobQueue):
+    for state, count in queue.counts().items():
+        Jobs.set(count, state=state)
 
-        print(" - done with status:", result.get("status"))
 
-        with open(out_path, "w") as f:
-            json.dump(result, f)
+def run_agent(
+    openai_client: OpenAI,
+    browser: WebDriver,
+    playbooks: PlaybookStore | None,
+    args: argparse.Namespace,
+    result: dict[str, Any],
+    trace: TraceWriter | None = None,
+):
+    url, domain = result["url"], result["domain"]
+    timings: list[dict[str, float]] = []
+    if playbooks is not None:
+        status, conversation, used_playbook = unsubscribe_with_playbooks(
+            openai_client,
+            browser,
+            url,
+            args.user_email,
+            domain,
+            playbooks,
+            verbose=args.verbose,
+            timings=timings,
+            use_digest=args.use_digest,
+            trace=trace,
+        )
+        result["used_playbook"] = used_playbook
+    else:
+        status, conversation = unsubscribe_on_website(
+            openai_client,
+            browser,
+            url,
+            args.user_email,
+            verbose=args.verbose,
+            timings=timings,
+            use_digest=args.use_digest,
+            trace=trace,
+        )
+    result["status"] = status
+    result["conversation"] = conversation
+    result["timings"] = timings
 
 
 if __name__ == "__main__":
@@ -4,18 +4,45 @@ Run unsubscribe agent simulation(s).
 
 import argparse
 import json
+import multiprocessing
+import multiprocessing.util
 import os
 import time
+import traceback
+from collections import Counter
+from dataclasses import asdict
+from typing import Any
 
 from openai import OpenAI
 
-from unsub.simulations import Simulations
+from unsub.evaluation import (
+    AgentConfig,
+    CellStats,
+    TrialResult,
+    format_table,
+    load_matrix,
+    run_adaptive,
+)
+from unsub.replay import RecordingClient, ReplayClient
+from unsub.simulations import (
+    ServerSimulation,
+    SharedSimulationServer,
+    Simulations,
+    select_simulations,
+)
+from unsub.trace import FsyncPolicies, TraceSuffix, TraceWriter
 from unsub.unsub_agent import create_driver, unsubscribe_on_website
+from unsub.usage import track_usage
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--simulation", type=str, default=None)
+    parser.add_argument(
+        "--simulation",
+        type=str,
+        default=None,
+        help="name or glob pattern, e.g. 'generated_*' (default: hand-written ones)",
+    )
     parser.add_argument(
         "--output-dir", type=str, default=f"simulations/{int(time.time())}"
     )
@@ -23,67 +50,265 @@ def main():
     parser.add_argument("--runs", type=int, default=4)
     parser.add_argument("--verbose", action="store_true")
     parser.add_argument("--headless", action="store_true")
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="save each trial's completion calls next to its log",
+    )
+    parser.add_argument(
+        "--replay_dir",
+        type=str,
+        default=None,
+        help="output dir of a previous --record run to replay instead of calling the API",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        help="number of worker processes (each with its own browser) to run trials in",
+    )
+    parser.add_argument(
+        "--per_trial_servers",
+        action="store_true",
+        help="give every trial its own HTTP server instead of one shared server",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="stream each trial's log to trial_<idx>.jsonl while it runs",
+    )
+    parser.add_argument("--trace_fsync", choices=FsyncPolicies, default="turn")
+    parser.add_argument(
+        "--matrix",
+        type=str,
+        default=None,
+        help="JSON file of agent configs to compare with adaptively-sized trials",
+    )
+    parser.add_argument("--min_trials", type=int, default=3)
+    parser.add_argument("--max_trials", type=int, default=20)
+    parser.add_argument(
+        "--max_ci_width",
+        type=float,
+        default=0.3,
+        help="stop a simulation once its 95%% success-rate interval is this narrow",
+    )
     args = parser.parse_args()
 
     os.makedirs(args.output_dir, exist_ok=True)
 
-    openai_client = OpenAI()
+    simulations = select_simulations(args.simulation)
 
-    simulations = (
-        Simulations
-        if args.simulation is None
-        else {args.simulation: Simulations[args.simulation]}
-    )
+    if args.matrix:
+        run_matrix(args, simulations)
+        return
 
-    browser = create_driver(headless=args.headless)
+    if args.parallel > 1:
+        run_parallel(args, simulations)
+        return
 
-    for name, sim_fn in simulations.items():
+    init_worker(args)
+    for name in simulations:
         print(f"working on simulation: {name}")
-        true_positives = 0
-        true_negatives = 0
-        false_positives = 0
-        false_negatives = 0
+        counts = Counter()
         for trial_idx in range(args.runs):
-            sim = sim_fn()
-            url = sim.start()
+            result = run_trial(args, name, trial_idx)
+            print(
+                f" * trial {trial_idx}: agent_status={result.agent_status} "
+                f"simulation_status={result.sim_status} "
+                f"with {result.num_messages} messages"
+            )
+            counts[outcome(result.agent_status, result.sim_status)] += 1
+        print_summary(counts, args.runs)
+
+
+def run_matrix(args: argparse.Namespace, names: list[str]):
+    """
+    Compare agent configs, running each simulation until its success rate is
+    known precisely enough (or max_trials is reached).
+    """
+    cells = []
+    for config in load_matrix(args.matrix):
+        print(f"working on config: {config.name}")
+        init_worker(args, config)
+        for name in names:
+            stats = run_adaptive(
+                lambda trial_idx: run_trial(args, name, trial_idx, config),
+                CellStats(config=config.name, simulation=name),
+                min_trials=args.min_trials,
+                max_trials=args.max_trials,
+                max_ci_width=args.max_ci_width,
+            )
+            low, high = stats.interval
+            print(
+                f" * {name}: {stats.successes}/{len(stats.results)} "
+                f"(95% CI [{low:.2f}, {high:.2f}])"
+            )
+            cells.append(stats)
+        close_worker()
+
+    table = format_table(cells)
+    print(table)
+    with open(os.path.join(args.output_dir, "comparison.txt"), "w") as f:
+        f.write(table + "\n")
+    with open(os.path.join(args.output_dir, "comparison.json"), "w") as f:
+        json.dump([asdict(cell) for cell in cells], f)
+
+
+def run_parallel(args: argparse.Namespace, names: list[str]):
+    """
+    Spread all trials over worker processes, each with its own browser.
+    """
+    tasks = [(name, trial_idx) for name in names for trial_idx in range(args.runs)]
+    counts = {name: Counter() for name in names}
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.parallel, initializer=init_worker, initargs=(args,)) as pool:
+        results = pool.imap_unordered(_run_trial_task, [(args, *t) for t in tasks])
+        for name, trial_idx, result in results:
+            print(
+                f" * {name} trial {trial_idx}: agent_status={result.agent_status} "
+                f"simulation_status={result.sim_status} "
+                f"with {result.num_messages} messages"
+            )
+            counts[name][outcome(result.agent_status, result.sim_status)] += 1
+        # Let the workers exit normally so their browsers are closed.
+        pool.close()
+        pool.join()
+    for name in names:
+        print(f"simulation: {name}")
+        print_summary(counts[name], args.runs)
+
+
+# Per-process state, so that each worker reuses one browser.
+_worker: dict[str, Any] = {}
+
+
+def init_worker(args: argparse.Namespace, config: AgentConfig = AgentConfig()):
+    # Replaying never touches the API, so it shouldn't need a key.
+    _worker["openai_client"] = None if args.replay_dir else OpenAI()
+    browser = create_driver(headless=args.headless, window_size=config.window_size)
+    _worker["browser"] = browser
+    _worker["finalizers"] = [
+        multiprocessing.util.Finalize(None, browser.quit, exitpriority=10)
+    ]
+    if not args.per_trial_servers:
+        server = SharedSimulationServer().start()
+        ServerSimulation.shared = server
+        _worker["finalizers"].append(
+            multiprocessing.util.Finalize(None, server.stop, exitpriority=10)
+        )
+
+
+def close_worker():
+    for finalizer in _worker.pop("finalizers", []):
+        finalizer()
+    ServerSimulation.shared = None
+
+
+def _run_trial_task(
+    task: tuple[argparse.Namespace, str, int],
+) -> tuple[str, int, TrialResult]:
+    args, name, trial_idx = task
+    return name, trial_idx, run_trial(args, name, trial_idx)
+
+
+def run_trial(
+    args: argparse.Namespace,
+    name: str,
+    trial_idx: int,
+    config: AgentConfig | None = None,
+) -> TrialResult:
+    """
+    Run one trial of a simulation and write its log.
+    """
+    openai_client = _worker["openai_client"]
+    browser = _worker["browser"]
+
+    trial_dir = os.path.join(args.output_dir, name)
+    if config is not None:
+        trial_dir = os.path.join(args.output_dir, config.name, name)
+    os.makedirs(trial_dir, exist_ok=True)
+    client = openai_client
+    if args.replay_dir:
+        client = ReplayClient.load(
+            os.path.join(args.replay_dir, name, f"trial_{trial_idx}.recording.json")
+        )
+    elif args.record:
+        client = RecordingClient(openai_client)
+
+    sim = Simulations[name]()
+    url = sim.start()
+    trace = None
+    try:
+        if args.trace:
+            trace = TraceWriter(
+                os.path.join(trial_dir, f"trial_{trial_idx}{TraceSuffix}"),
+                args.trace_fsync,
+                simulation=name,
+                trial=trial_idx,
+                url=url,
+            )
+        timings: list[dict[str, float]] = []
+        start_time = time.time()
+        with track_usage(simulation=name, trial=str(trial_idx)) as trial_usage:
             status, conversation = unsubscribe_on_website(
-                openai_client,
+                client,
                 browser,
                 url,
                 args.user_email,
                 verbose=args.verbose,
+                timings=timings,
+                trace=trace,
+                **(config.agent_kwargs() if config is not None else {}),
             )
-            actual_status = sim.finish()
-            print(
-                f" * trial {trial_idx}: agent_status={status} simulation_status={actual_status} "
-                f"with {len(conversation)} messages"
+        latency = time.time() - start_time
+    except BaseException:
+        # Unregister the simulation from the shared server, and end the trace
+        # so that it isn't mistaken for a run that is still in progress.
+        actual_status = sim.finish()
+        if trace is not None:
+            trace.end(
+                agent_status="error",
+                sim_status=actual_status,
+                error=traceback.format_exc(),
             )
-            if status == "success":
-                if actual_status == "success":
-                    true_positives += 1
-                else:
-                    false_positives += 1
-            else:
-                if actual_status == "success":
-                    false_negatives += 1
-                else:
-                    true_negatives += 1
-            os.makedirs(os.path.join(args.output_dir, name), exist_ok=True)
-            with open(
-                os.path.join(args.output_dir, name, f"trial_{trial_idx}.json"), "w"
-            ) as f:
-                json.dump(
-                    dict(
-                        agent_status=status,
-                        sim_status=actual_status,
-                        conversation=conversation,
-                    ),
-                    f,
-                )
-        print(
-            f" SUMMARY: success_rate={true_positives}/{args.runs} (tn={true_negatives} "
-            f"fp={false_positives} fn={false_negatives})"
-        )
+        raise
+    actual_status = sim.finish()
+
+    if isinstance(client, RecordingClient):
+        client.save(os.path.join(trial_dir, f"trial_{trial_idx}.recording.json"))
+    log = dict(
+        agent_status=status,
+        sim_status=actual_status,
+        conversation=conversation,
+        timings=timings,
+        usage=trial_usage.usage.to_dict(),
+    )
+    if trace is not None:
+        trace.end(**log)
+    else:
+        with open(os.path.join(trial_dir, f"trial_{trial_idx}.json"), "w") as f:
+            json.dump(log, f)
+    return TrialResult(
+        agent_status=status,
+        sim_status=actual_status,
+        num_messages=len(conversation),
+        turns=len(timings),
+        latency=latency,
+        cost=trial_usage.usage.cost,
+    )
+
+
+def outcome(status: str, actual_status: str) -> str:
+    if status == "success":
+        return "tp" if actual_status == "success" else "fp"
+    return "fn" if actual_status == "success" else "tn"
+
+
+def print_summary(counts: Counter, runs: int):
+    print(
+        f" SUMMARY: success_rate={counts['tp']}/{runs} (tn={counts['tn']} "
+        f"fp={counts['fp']} fn={counts['fn']})"
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+"""
+Aggregate per-turn stage timings across a directory of agent logs, from
+run_agent*.py or run_simulations.py.
+"""
+
+import argparse
+import json
+import os
+
+from unsub.timing import Stages
+from unsub.trace import is_log_file, load_log
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("log_dir", type=str)
+    args = parser.parse_args()
+
+    per_stage: dict[str, list[float]] = {}
+    turn_totals = []
+    num_runs = 0
+    for root, _, files in os.walk(args.log_dir):
+        for name in files:
+            if not is_log_file(name):
+                continue
+            try:
+                timings = load_log(os.path.join(root, name)).get("timings")
+            except (json.JSONDecodeError, AttributeError):
+                continue
+            if not timings:
+                continue
+            num_runs += 1
+            for turn in timings:
+                for stage, duration in turn.items():
+                    per_stage.setdefault(stage, []).append(duration)
+                turn_totals.append(sum(turn.values()))
+
+    if not turn_totals:
+        print("no timings found")
+        return
+
+    total_time = sum(turn_totals)
+    stages = [s for s in Stages if s in per_stage]
+    stages += sorted(s for s in per_stage if s not in Stages)
+    print(f"{num_runs} runs, {len(turn_totals)} turns, {total_time:.1f}s total")
+    print(f"{'stage':<14}{'count':>7}{'p50':>9}{'p95':>9}{'mean':>9}{'share':>8}")
+    rows = [(stage, per_stage[stage]) for stage in stages]
+    rows.append(("turn", turn_totals))
+    for stage, values in rows:
+        share = sum(values) / total_time * 100
+        print(
+            f"{stage:<14}{len(values):>7}{percentile(values, 50):>8.3f}s"
+            f"{percentile(values, 95):>8.3f}s{sum(values) / len(values):>8.3f}s"
+            f"{share:>7.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,24 @@
 """
-Render a chat transcript JSON file from run_simulations.py or run_agent*.py.
+Render a chat transcript JSON file from run_simulations.py or run_agent*.py,
+or a (possibly unfinished) JSONL trace from their --trace option.
 
 Wrote mostly by GPT-5 with a few fixes from myself.
 """
 
+import argparse
 import html
 import json
 import os
 import re
 import sys
 import tempfile
+import time
 import webbrowser
 from pathlib import Path
 from typing import Any, Dict, List
 
+from unsub.trace import TraceSuffix, parse_trace
+
 # --- Minimal "markdown-ish" formatter for code fences and newlines ---
 _CODE_FENCE_RE = re.compile(r"```([a-zA-Z0-9_\-]*)\n(.*?)```", re.DOTALL)
 
@@ -91,7 +96,7 @@ def render_message(msg: Dict[str, Any]) -> str:
     """
 
 
-def render_page(data: Dict[str, Any]) -> str:
+def render_page(data: Dict[str, Any], refresh: float | None = None) -> str:
     with open(os.path.join(AssetDir, "style.css"), "r") as f:
         CSS = f.read()
     with open(os.path.join(AssetDir, "script.js"), "r") as f:
@@ -116,6 +121,13 @@ def render_page(data: Dict[str, Any]) -> str:
     if email:
         top_line.append(f'<span class="badge">user: {html.escape(email)}</span>')
     top_line.append(status_badge)
+    if data.get("partial"):
+        top_line.append(
+            f'<span class="badge">partial trace: {len(conv)} messages so far</span>'
+        )
+    refresh_tag = ""
+    if refresh is not None:
+        refresh_tag = f'<meta http-equiv="refresh" content="{max(1, round(refresh))}">'
 
     messages_html = "\n".join(render_message(m) for m in conv)
 
@@ -127,6 +139,7 @@ def render_page(data: Dict[str, Any]) -> str:
 <meta charset="utf-8">
 <title>Chat Render</title>
 <meta name="viewport" content="width=device-width, initial-scale=1">
+{refresh_tag}
 <style>{CSS}</style>
 <script>{JS}</script>
 </head>
@@ -167,25 +180,42 @@ def render_page(data: Dict[str, Any]) -> str:
 """
 
 
-def main():
+def load_data(path: str) -> Dict[str, Any]:
     # Read JSON from a file path arg or stdin
-    if len(sys.argv) > 1 and sys.argv[1] != "-":
-        src = Path(sys.argv[1]).read_text(encoding="utf-8")
+    if path != "-":
+        src = Path(path).read_text(encoding="utf-8")
     else:
         src = sys.stdin.read()
 
+    if path.endswith(TraceSuffix) or src.startswith('{"type": "start"'):
+        return parse_trace(src.splitlines())
     try:
-        data = json.loads(src)
+        return json.loads(src)
     except json.JSONDecodeError as e:
         print(f"Invalid JSON: {e}", file=sys.stderr)
         sys.exit(1)
 
-    html_doc = render_page(data)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=str, nargs="?", default="-")
+    parser.add_argument(
+        "--follow",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="re-render an unfinished trace every SECONDS until the run ends",
+    )
+    args = parser.parse_args()
+
+    data = load_data(args.path)
+    follow = args.follow if args.path != "-" and data.get("partial") else None
+    html_doc = render_page(data, refresh=follow)
 
     # Write to a temp file next to the JSON (if path provided) or system temp
     base_dir = None
-    if len(sys.argv) > 1 and sys.argv[1] != "-":
-        base_dir = str(Path(sys.argv[1]).resolve().parent)
+    if args.path != "-":
+        base_dir = str(Path(args.path).resolve().parent)
     tmp = tempfile.NamedTemporaryFile(
         prefix="chat_render_", suffix=".html", delete=False, dir=base_dir
     )
@@ -196,6 +226,17 @@ def main():
     webbrowser.open("file://" + tmp.name)
     print(f"Wrote {tmp.name}")
 
+    # The page reloads itself, so keep rewriting it until the trace ends.
+    while follow is not None:
+        time.sleep(follow)
+        data = load_data(args.path)
+        if not data.get("partial"):
+            follow = None
+        with open(tmp.name + ".tmp", "w", encoding="utf-8") as f:
+            f.write(render_page(data, refresh=follow))
+        os.replace(tmp.name + ".tmp", tmp.name)
+        print(f"Updated {tmp.name} ({len(data.get('conversation', []))} messages)")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,126 @@
+"""
+Storage of emails in list_unsub_links output directories.
+
+Each email is a JSON file at <root>/<last two id characters>/<id>.json, whose
+"email" key holds the email in one of these modes:
+
+ - full: the Email as-is, including its base64 raw_body.
+ - metadata: only the headers and snippet, plus the email's link candidates.
+   The body is dropped, so the HTML can't be searched later.
+ - blob: the headers and snippet, with the body zstd-compressed in a separate
+   file under <root>/blobs/, which is only read when the body is needed.
+"""
+
+import base64
+import json
+import os
+from dataclasses import asdict, fields
+from typing import Any, Iterator, Literal
+
+import zstandard
+
+from .gmail import Email
+from .link import Link
+
+StorageMode = Literal["full", "metadata", "blob"]
+StorageModes: tuple[StorageMode, ...] = ("full", "metadata", "blob")
+
+BlobDir = "blobs"
+
+_EMAIL_FIELDS = {f.name for f in fields(Email)}
+
+
+def email_path(root: str, email_id: str) -> str:
+    return os.path.join(root, email_id[-2:], email_id + ".json")
+
+
+def iter_email_paths(root: str) -> Iterator[str]:
+    for sub_dir in sorted(os.listdir(root)):
+        full_dir = os.path.join(root, sub_dir)
+        if sub_dir == BlobDir or not os.path.isdir(full_dir):
+            continue
+        for name in sorted(os.listdir(full_dir)):
+            if name.endswith(".json"):
+                yield os.path.join(full_dir, name)
+
+
+def storage_mode(record: dict[str, Any]) -> StorageMode:
+    if "body_blob" in record:
+        return "blob"
+    elif "raw_body" in record:
+        return "full"
+    return "metadata"
+
+
+def email_record(
+    email: Email, root: str, mode: StorageMode = "full"
+) -> dict[str, Any]:
+    """
+    Serialize an email for the "email" key of its JSON file, writing its body
+    blob if needed.
+    """
+    record = asdict(email)
+    del record["stored_links"]
+    if mode == "full":
+        return record
+    del record["raw_body"]
+    if mode == "metadata":
+        record["links"] = [asdict(link) for link in email.links()]
+        return record
+    rel_path = os.path.join(BlobDir, email.id[-2:], email.id + ".html.zst")
+    blob_path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    body = base64.urlsafe_b64decode(email.raw_body)
+    tmp_path = blob_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(zstandard.ZstdCompressor(level=10).compress(body))
+    os.replace(tmp_path, blob_path)
+    record["body_blob"] = rel_path
+    return record
+
+
+def load_email(path: str, data: dict[str, Any] | None = None) -> Email:
+    """
+    Load the Email from a JSON file (or its already-parsed data), reading the
+    body blob if there is one. Emails stored as metadata have an empty body,
+    and their links() are the stored links.
+    """
+    if data is None:
+        with open(path, "r") as f:
+            data = json.load(f)
+    record = data["email"]
+    kwargs = {k: v for k, v in record.items() if k in _EMAIL_FIELDS}
+    if "links" in record:
+        kwargs["stored_links"] = [Link(**link) for link in record["links"]]
+    if "raw_body" not in kwargs:
+        kwargs["raw_body"] = ""
+        if blob := record.get("body_blob"):
+            root = os.path.dirname(os.path.dirname(os.path.abspath(path)))
+            with open(os.path.join(root, blob), "rb") as f:
+                body = zstandard.ZstdDecompressor().decompress(f.read())
+            kwargs["raw_body"] = base64.urlsafe_b64encode(body).decode("ascii")
+    return Email(**kwargs)
+
+
+def convert_email_file(path: str, mode: StorageMode) -> bool:
+    """
+    Rewrite an email's JSON file in another storage mode. Returns False if
+    this isn't possible, i.e. the body was already dropped.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+    old_mode = storage_mode(data["email"])
+    if old_mode == mode:
+        return True
+    if old_mode == "metadata":
+        return False
+    root = os.path.dirname(os.path.dirname(os.path.abspath(path)))
+    old_blob = data["email"].get("body_blob")
+    data["email"] = email_record(load_email(path, data), root, mode)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+    if old_blob:
+        os.remove(os.path.join(root, old_blob))
+    return True
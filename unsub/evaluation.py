@@ -0,0 +1,134 @@
+import itertools
+import json
+import math
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from .unsub_agent import WaitStrategy
+
+
+@dataclass
+class AgentConfig:
+    name: str = "default"
+    model: str = "gpt-4o"
+    window_size: tuple[int, int] = (1000, 1000)
+    max_steps: int = 10
+    wait_strategy: WaitStrategy = "fixed"
+    wait_between_turns: float = 2.0
+    use_digest: bool = False
+
+    def agent_kwargs(self) -> dict[str, Any]:
+        return dict(
+            model=self.model,
+            max_steps=self.max_steps,
+            wait_strategy=self.wait_strategy,
+            wait_between_turns=self.wait_between_turns,
+            use_digest=self.use_digest,
+        )
+
+
+def load_matrix(path: str) -> list[AgentConfig]:
+    """
+    Load agent configs from a JSON file. This is either a list of configs, or
+    a dict mapping each AgentConfig field to a list of values to take the
+    product of, e.g. {"model": ["gpt-4o", "gpt-4o-mini"], "max_steps": [5, 10]}.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        keys = sorted(data)
+        data = [
+            dict(zip(keys, values))
+            for values in itertools.product(*(data[k] for k in keys))
+        ]
+    configs = []
+    for i, item in enumerate(data):
+        item = dict(item)
+        if "window_size" in item:
+            item["window_size"] = tuple(item["window_size"])
+        if "name" not in item:
+            item["name"] = f"config_{i}_" + "_".join(
+                f"{k}={'x'.join(map(str, v)) if isinstance(v, (list, tuple)) else v}"
+                for k, v in sorted(item.items())
+            )
+        configs.append(AgentConfig(**item))
+    return configs
+
+
+def wilson_interval(
+    successes: int, trials: int, z: float = 1.96
+) -> tuple[float, float]:
+    if not trials:
+        return 0.0, 1.0
+    p = successes / trials
+    denom = 1 + z**2 / trials
+    center = (p + z**2 / (2 * trials)) / denom
+    margin = z * math.sqrt(p * (1 - p) / trials + z**2 / (4 * trials**2)) / denom
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+@dataclass
+class TrialResult:
+    agent_status: str
+    sim_status: str
+    num_messages: int
+    turns: int
+    latency: float
+    cost: float
+
+    @property
+    def success(self) -> bool:
+        return self.agent_status == "success" and self.sim_status == "success"
+
+
+@dataclass
+class CellStats:
+    config: str
+    simulation: str
+    results: list[TrialResult] = field(default_factory=list)
+
+    @property
+    def successes(self) -> int:
+        return sum(r.success for r in self.results)
+
+    @property
+    def interval(self) -> tuple[float, float]:
+        return wilson_interval(self.successes, len(self.results))
+
+    def mean(self, attr: str) -> float:
+        return sum(getattr(r, attr) for r in self.results) / max(1, len(self.results))
+
+
+def run_adaptive(
+    run_trial: Callable[[int], TrialResult],
+    stats: CellStats,
+    min_trials: int = 3,
+    max_trials: int = 20,
+    max_ci_width: float = 0.3,
+) -> CellStats:
+    """
+    Run trials until the success rate's confidence interval is narrower than
+    max_ci_width, or until max_trials have been run.
+    """
+    while len(stats.results) < max_trials:
+        stats.results.append(run_trial(len(stats.results)))
+        low, high = stats.interval
+        if len(stats.results) >= min_trials and high - low <= max_ci_width:
+            break
+    return stats
+
+
+def format_table(cells: list[CellStats]) -> str:
+    lines = [
+        f"{'config':<32}{'simulation':<16}{'n':>4}{'success':>9}{'95% CI':>15}"
+        f"{'turns':>7}{'latency':>9}{'cost':>9}"
+    ]
+    for cell in cells:
+        low, high = cell.interval
+        lines.append(
+            f"{cell.config[:31]:<32}{cell.simulation[:15]:<16}{len(cell.results):>4}"
+            f"{cell.successes / max(1, len(cell.results)):>9.2f}"
+            f"{f'[{low:.2f}, {high:.2f}]':>15}{cell.mean('turns'):>7.1f}"
+            f"{cell.mean('latency'):>8.1f}s{cell.mean('cost'):>8.4f}$"
+        )
+    return "\n".join(lines)
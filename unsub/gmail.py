@@ -2,16 +2,21 @@ import base64
 import html
 import os
 import re
-from dataclasses import dataclass
-from typing import Any, Iterator
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Sequence
 
+import httplib2
 from bs4 import BeautifulSoup
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 
 from .link import Link
+from .metrics import counter, histogram, timed
 
 # ----- CONFIG -----
 SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
@@ -22,6 +27,9 @@ CLIENT_SECRET: str | None = os.getenv("GOOGLE_CLIENT_SECRET", None)
 PROJECT_ID: str | None = os.getenv("GOOGLE_PROJECT_ID", None)
 REDIRECT_URI_PORT = 1337
 
+GmailSeconds = histogram("unsub_gmail_request_seconds", "Latency of Gmail API calls.")
+EmailsFetched = counter("unsub_emails_fetched", "Emails fetched from Gmail.")
+
 
 def load_creds(path: str) -> Credentials | None:
     if os.path.exists(path):
@@ -57,6 +65,10 @@ def build_flow() -> InstalledAppFlow:
 
 
 def get_gmail_service(credentials_path: str = "token.json") -> Any:
+    return build("gmail", "v1", credentials=get_gmail_credentials(credentials_path))
+
+
+def get_gmail_credentials(credentials_path: str = "token.json") -> Credentials:
     creds = load_creds(credentials_path)
     if not creds or not creds.valid:
         flow = build_flow()
@@ -69,7 +81,45 @@ def get_gmail_service(credentials_path: str = "token.json") -> Any:
             open_browser=True,
         )
         save_creds(credentials_path, creds)
-    return build("gmail", "v1", credentials=creds)
+    return creds
+
+
+class GmailServicePool:
+    """
+    Gmail services for use from many threads at once.
+
+    A service's httplib2 transport isn't thread-safe, so each thread gets its
+    own service (and keep-alive connection), while all of them share one set
+    of credentials, which is refreshed under a lock.
+    """
+
+    def __init__(self, creds: Credentials, size: int = 8, timeout: float = 60.0):
+        self.creds = creds
+        self.size = size
+        self.timeout = timeout
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
+
+    def service(self) -> Any:
+        self._refresh_if_needed()
+        if (service := getattr(self._local, "service", None)) is None:
+            http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=self.timeout))
+            service = build("gmail", "v1", http=http, cache_discovery=False)
+            self._local.service = service
+        return service
+
+    def _refresh_if_needed(self):
+        if self.creds.valid:
+            return
+        with self._refresh_lock:
+            if not self.creds.valid and self.creds.refresh_token:
+                self.creds.refresh(Request())
+
+
+def get_gmail_pool(
+    credentials_path: str = "token.json", size: int = 8
+) -> GmailServicePool:
+    return GmailServicePool(get_gmail_credentials(credentials_path), size=size)
 
 
 @dataclass
@@ -79,12 +129,18 @@ class Email:
     subject: str
     snippet: str
     raw_body: str
+    list_id: str = ""
+    date: int = 0  # milliseconds since the epoch, as reported by Gmail
+    # Links kept in place of a dropped body, e.g. by the "metadata" storage mode.
+    stored_links: list[Link] | None = field(default=None, repr=False)
 
     @property
     def body(self) -> str:
         return base64.urlsafe_b64decode(self.raw_body).decode("utf-8", errors="replace")
 
     def links(self, max_text_len: int = 100) -> list[Link]:
+        if not self.raw_body and self.stored_links is not None:
+            return [l for l in self.stored_links if len(l.text) <= max_text_len]
         html_content = self.body
         soup = BeautifulSoup(html_content, "html.parser")
 
@@ -114,49 +170,96 @@ def _clean_text(s: str) -> str:
     return s
 
 
-def iter_emails(service: Any, page_size: int = 100) -> Iterator[Email]:
-    next_page_token = None
+DefaultLabels = ("INBOX", "CATEGORY_PROMOTIONS")
+
+
+def iter_emails(
+    service: Any,
+    page_size: int = 100,
+    query: str | None = None,
+    label_ids: Sequence[str] = DefaultLabels,
+) -> Iterator[Email]:
+    """
+    Iterate over emails with all of the given labels (by default, promotional
+    emails in the inbox) which match a Gmail search query, like
+    "newer_than:30d -from:example.com".
+
+    The service may be a GmailServicePool, in which case the messages on each
+    page are fetched by one thread per service in the pool, and the next page
+    is listed in the background while the current one is consumed.
+    """
+    pool = service if isinstance(service, GmailServicePool) else None
+    executor = ThreadPoolExecutor(max_workers=pool.size) if pool else None
+    lister = ThreadPoolExecutor(max_workers=1) if pool else None
+
+    def list_page(page_token: str | None) -> dict[str, Any]:
+        list_service = pool.service() if pool else service
+        with timed(GmailSeconds, method="list"):
+            return (
+                list_service.users()
+                .messages()
+                .list(
+                    userId="me",
+                    labelIds=list(label_ids) or None,
+                    q=query,
+                    maxResults=page_size,
+                    pageToken=page_token,
+                )
+                .execute()
+            )
 
-    while True:
-        resp = (
+    page_token = None
+    next_page = lister.submit(list_page, None) if lister else None
+    try:
+        while True:
+            resp = next_page.result() if next_page else list_page(page_token)
+            page_token = resp.get("nextPageToken")
+            if lister and page_token:
+                # List the next page while this one is fetched and consumed.
+                next_page = lister.submit(list_page, page_token)
+
+            messages = resp.get("messages", [])
+            if pool and executor:
+                yield from executor.map(
+                    lambda m: _fetch_email(pool.service(), m["id"]), messages
+                )
+            else:
+                for m in messages:
+                    yield _fetch_email(service, m["id"])
+
+            if not page_token:
+                break
+    finally:
+        for ex in (executor, lister):
+            if ex:
+                ex.shutdown(cancel_futures=True)
+
+
+def _fetch_email(service: Any, message_id: str) -> Email:
+    with timed(GmailSeconds, method="get"):
+        full = (
             service.users()
             .messages()
-            .list(
-                userId="me",
-                labelIds=["INBOX", "CATEGORY_PROMOTIONS"],
-                maxResults=page_size,
-                pageToken=next_page_token,
-            )
+            .get(userId="me", id=message_id, format="full")
             .execute()
         )
-
-        if not (messages := resp.get("messages", [])):
-            break
-
-        for m in messages:
-            full = (
-                service.users()
-                .messages()
-                .get(userId="me", id=m["id"], format="full")
-                .execute()
-            )
-
-            payload = full.get("payload", {})
-            headers = payload.get("headers", [])
-
-            body = payload.get("body", {}).get("data", "")
-            if not body:
-                for part in payload.get("parts", []):
-                    if part["mimeType"] == "text/html":
-                        body = body or part.get("body", {}).get("data", "")
-
-            yield Email(
-                id=full["id"],
-                sender=_header(headers, "From", "(unknown)"),
-                subject=_header(headers, "Subject", "(no subject)"),
-                snippet=_clean_text(full.get("snippet", "").strip()),
-                raw_body=body,
-            )
-
-        if not (next_page_token := resp.get("nextPageToken")):
-            break
+    EmailsFetched.inc()
+
+    payload = full.get("payload", {})
+    headers = payload.get("headers", [])
+
+    body = payload.get("body", {}).get("data", "")
+    if not body:
+        for part in payload.get("parts", []):
+            if part["mimeType"] == "text/html":
+                body = body or part.get("body", {}).get("data", "")
+
+    return Email(
+        id=full["id"],
+        sender=_header(headers, "From", "(unknown)"),
+        subject=_header(headers, "Subject", "(no subject)"),
+        snippet=_clean_text(full.get("snippet", "").strip()),
+        raw_body=body,
+        list_id=_header(headers, "List-Id"),
+        date=int(full.get("internalDate", 0)),
+    )
@@ -0,0 +1,244 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator, Literal
+
+JobState = Literal["pending", "running", "done", "failed"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, available_at);
+"""
+
+
+@dataclass
+class Job:
+    key: str
+    payload: dict[str, Any]
+    attempts: int
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobQueue:
+    """
+    A durable job queue in a SQLite file, which several worker processes (or
+    machines sharing the file) can pull from.
+
+    Claimed jobs are leased to a worker. If the worker dies, the lease expires
+    and the job is retried. Failed jobs are retried with exponential backoff
+    until they run out of attempts.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_attempts: int = 3,
+        lease_seconds: float = 600.0,
+        backoff_seconds: float = 30.0,
+        max_backoff_seconds: float = 3600.0,
+    ):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=60.0, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue(self, key: str, payload: dict[str, Any], done: bool = False) -> bool:
+        """
+        Add a job unless one with the same key exists. Returns True if added.
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (key, payload, state, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(payload), "done" if done else "pending", time.time()),
+            )
+            return cursor.rowcount > 0
+
+    def claim(self, worker_id: str) -> Job | None:
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                "SELECT key, payload, attempts FROM jobs "
+                "WHERE state = 'pending' AND available_at <= ? "
+                "ORDER BY available_at, rowid LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            key, payload, attempts = row
+            conn.execute(
+                "UPDATE jobs SET state = 'running', attempts = ?, lease_owner = ?, "
+                "lease_expires = ?, updated_at = ? WHERE key = ?",
+                (attempts + 1, worker_id, now + self.lease_seconds, now, key),
+            )
+        return Job(key=key, payload=json.loads(payload), attempts=attempts + 1)
+
+    def _expire_leases(self, conn: sqlite3.Connection, now: float):
+        expired = conn.execute(
+            "SELECT key, attempts FROM jobs WHERE state = 'running' AND lease_expires < ?",
+            (now,),
+        ).fetchall()
+        for key, attempts in expired:
+            self._retry_or_fail(conn, key, attempts, "lease expired", now)
+
+    def _retry_or_fail(
+        self, conn: sqlite3.Connection, key: str, attempts: int, error: str, now: float
+    ):
+        if attempts >= self.max_attempts:
+            conn.execute(
+                "UPDATE jobs SET state = 'failed', lease_owner = NULL, "
+                "last_error = ?, updated_at = ? WHERE key = ?",
+                (error, now, key),
+            )
+        else:
+            delay = min(
+                self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempts - 1)
+            )
+            conn.execute(
+                "UPDATE jobs SET state = 'pending', lease_owner = NULL, "
+                "available_at = ?, last_error = ?, updated_at = ? WHERE key = ?",
+                (now + delay, error, now, key),
+            )
+
+    def heartbeat(self, key: str, worker_id: str) -> bool:
+        """
+        Extend a lease. Returns False if the worker no longer holds the job.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE key = ? AND state = 'running' AND lease_owner = ?",
+                (now + self.lease_seconds, now, key, worker_id),
+            )
+            return cursor.rowcount > 0
+
+    @contextmanager
+    def keep_alive(self, key: str, worker_id: str) -> Iterator[None]:
+        """
+        Heartbeat a job from a background thread while it is being worked on,
+        so that only crashed workers lose their leases.
+        """
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(self.lease_seconds / 3):
+                if not self.heartbeat(key, worker_id):
+                    break
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, key: str, worker_id: str):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'done', lease_owner = NULL, "
+                "last_error = NULL, updated_at = ? "
+                "WHERE key = ? AND lease_owner = ?",
+                (time.time(), key, worker_id),
+            )
+
+    def fail(self, key: str, worker_id: str, error: str):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM jobs WHERE key = ? AND lease_owner = ?",
+                (key, worker_id),
+            ).fetchone()
+            if row is not None:
+                self._retry_or_fail(conn, key, row[0], error, now)
+
+    def release(self, key: str, worker_id: str):
+        """
+        Give up a claimed job without counting it as an attempt.
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = MAX(attempts - 1, 0), "
+                "lease_owner = NULL, updated_at = ? WHERE key = ? AND lease_owner = ?",
+                (time.time(), key, worker_id),
+            )
+
+    def retry_failed(self) -> int:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0, available_at = 0, "
+                "updated_at = ? WHERE state = 'failed'",
+                (time.time(),),
+            )
+            return cursor.rowcount
+
+    def counts(self) -> dict[JobState, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+            ).fetchall()
+        result: dict[JobState, int] = dict(pending=0, running=0, done=0, failed=0)
+        result.update(dict(rows))
+        return result
+
+    def failures(self) -> list[tuple[str, int, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT key, attempts, last_error FROM jobs WHERE state = 'failed' "
+                "ORDER BY updated_at"
+            ).fetchall()
+
+    def next_available_at(self) -> float | None:
+        """
+        The earliest time that a pending or leased job could be claimed, or
+        None if no work remains.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(CASE state WHEN 'pending' THEN available_at "
+                "ELSE lease_expires END) FROM jobs "
+                "WHERE state IN ('pending', 'running')"
+            ).fetchone()
+        return row[0]
@@ -0,0 +1,305 @@
+"""
+A local stand-in for the OpenAI API, which answers requests with scripted
+responses. It lets the harness run end-to-end through the real OpenAI client
+(HTTP, JSON parsing and all) without network access.
+"""
+
+import email.parser
+import email.policy
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+from openai import OpenAI
+
+from .page_text import mentions_unsubscribe
+
+# Maps (instructions, input) to the output text of a response.
+Responder = Callable[[str, Any], str]
+
+
+def response_body(model: str, instructions: str, text: str) -> dict[str, Any]:
+    # Rough token estimates, so that usage accounting has something to count.
+    input_tokens = max(1, len(instructions) // 4)
+    output_tokens = max(1, len(text) // 4)
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "error": None,
+        "incomplete_details": None,
+        "instructions": instructions,
+        "metadata": {},
+        "model": model,
+        "output": [
+            {
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex}",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+class MockOpenAIServer:
+    """
+    Serve an OpenAI-compatible /v1/responses endpoint on localhost, along with
+    the /v1/files and /v1/batches endpoints needed to run batches of response
+    requests. Batches complete batch_delay seconds after they are created.
+
+    The responder can be swapped at any time (e.g. between trials).
+    """
+
+    def __init__(
+        self, respond: Responder, latency: float = 0.0, batch_delay: float = 0.0
+    ):
+        self.respond = respond
+        self.latency = latency
+        self.batch_delay = batch_delay
+        self.num_requests = 0
+        self.files: dict[str, tuple[dict[str, Any], bytes]] = {}
+        self.batches: dict[str, dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self.httpd: ThreadingHTTPServer | None = None
+        self.thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        assert self.httpd is not None
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def client(self) -> OpenAI:
+        return OpenAI(base_url=self.base_url, api_key="mock", max_retries=0)
+
+    def start(self) -> "MockOpenAIServer":
+        parent = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                data = self.rfile.read(length)
+                path = self.path.split("?", 1)[0]
+                if path.endswith("/responses"):
+                    self._send(200, parent.handle_response(json.loads(data or b"{}")))
+                elif path.endswith("/files"):
+                    content_type = self.headers.get("Content-Type", "")
+                    self._send(200, parent.handle_upload(content_type, data))
+                elif path.endswith("/batches"):
+                    self._send(200, parent.handle_batch(json.loads(data or b"{}")))
+                else:
+                    self._not_found(path)
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                parts = path.rstrip("/").split("/")
+                if len(parts) >= 3 and parts[-3] == "files" and parts[-1] == "content":
+                    if (file := parent.files.get(parts[-2])) is None:
+                        return self._not_found(path)
+                    self._send(200, file[1], content_type="application/octet-stream")
+                elif len(parts) >= 2 and parts[-2] == "files":
+                    if (file := parent.files.get(parts[-1])) is None:
+                        return self._not_found(path)
+                    self._send(200, file[0])
+                elif len(parts) >= 2 and parts[-2] == "batches":
+                    if (batch := parent.retrieve_batch(parts[-1])) is None:
+                        return self._not_found(path)
+                    self._send(200, batch)
+                else:
+                    self._not_found(path)
+
+            def _not_found(self, path: str):
+                self._send(404, {"error": {"message": f"unknown path {path}"}})
+
+            def _send(
+                self,
+                status: int,
+                body: dict[str, Any] | bytes,
+                content_type: str = "application/json",
+            ):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def handle_response(self, request: dict[str, Any]) -> dict[str, Any]:
+        self.num_requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        instructions = request.get("instructions") or ""
+        text = self.respond(instructions, request.get("input"))
+        return response_body(request.get("model", "mock"), instructions, text)
+
+    def add_file(self, filename: str, purpose: str, data: bytes) -> dict[str, Any]:
+        file_obj = {
+            "id": f"file-{uuid.uuid4().hex}",
+            "object": "file",
+            "bytes": len(data),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self._lock:
+            self.files[file_obj["id"]] = (file_obj, data)
+        return file_obj
+
+    def handle_upload(self, content_type: str, data: bytes) -> dict[str, Any]:
+        message = email.parser.BytesParser(policy=email.policy.default).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + data
+        )
+        fields: dict[str, tuple[str | None, bytes]] = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            fields[str(name)] = (part.get_filename(), part.get_payload(decode=True))
+        filename, file_data = fields["file"]
+        purpose = fields.get("purpose", (None, b"batch"))[1].decode()
+        return self.add_file(filename or "upload.jsonl", purpose, file_data)
+
+    def handle_batch(self, request: dict[str, Any]) -> dict[str, Any]:
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex}",
+            "object": "batch",
+            "endpoint": request.get("endpoint", "/v1/responses"),
+            "completion_window": request.get("completion_window", "24h"),
+            "input_file_id": request["input_file_id"],
+            "created_at": int(time.time()),
+            "status": "in_progress",
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": request.get("metadata"),
+        }
+        with self._lock:
+            self.batches[batch["id"]] = batch
+        return batch
+
+    def retrieve_batch(self, batch_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            if (batch := self.batches.get(batch_id)) is None:
+                return None
+            due = time.time() >= batch["created_at"] + self.batch_delay
+            if batch["status"] == "in_progress" and due:
+                self._run_batch(batch)
+            return batch
+
+    def _run_batch(self, batch: dict[str, Any]):
+        _, data = self.files[batch["input_file_id"]]
+        lines = []
+        for line in data.decode().splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            lines.append(
+                json.dumps(
+                    {
+                        "id": f"batch_req_{uuid.uuid4().hex}",
+                        "custom_id": request["custom_id"],
+                        "response": {
+                            "status_code": 200,
+                            "request_id": uuid.uuid4().hex,
+                            "body": self.handle_response(request["body"]),
+                        },
+                        "error": None,
+                    }
+                )
+            )
+        output = self.add_file(
+            "batch_output.jsonl", "batch_output", "\n".join(lines).encode()
+        )
+        batch["status"] = "completed"
+        batch["output_file_id"] = output["id"]
+        batch["completed_at"] = int(time.time())
+        batch["request_counts"] = {
+            "total": len(lines),
+            "completed": len(lines),
+            "failed": 0,
+        }
+
+    def stop(self):
+        if self.httpd:
+            assert self.thread is not None
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.thread.join(timeout=1)
+
+    def __enter__(self) -> "MockOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def scripted_agent(steps: list[str], summary: str = "A webpage.") -> Responder:
+    """
+    Create a responder which runs the given code blocks on successive agent
+    turns (and calls failure() once they run out). Other calls, such as page
+    summaries, get a fixed summary.
+    """
+
+    def respond(instructions: str, input: Any) -> str:
+        if not isinstance(input, list):
+            return summary
+        turn = sum(1 for msg in input if msg.get("role") == "assistant")
+        code = steps[turn] if turn < len(steps) else "failure();"
+        return f"Running the next step.\n\n```javascript\n{code}\n```"
+
+    return respond
+
+
+_ANCHOR_RE = re.compile(r'<a\b[^>]*\bdata-index="(\d+)"[^>]*>(.*?)</a>', re.DOTALL)
+
+
+def stub_respond(instructions: str, input: Any) -> str:
+    """
+    Answer link-finding prompts with a keyword heuristic, in the same format
+    that the model is asked to use.
+    """
+    if "data-index" in instructions:
+        for match in _ANCHOR_RE.finditer(input):
+            context = input[max(0, match.start() - 200) : match.end()]
+            if mentions_unsubscribe(re.sub(r"<[^>]+>", " ", context)):
+                return f"Answer: {match.group(1)}"
+        return "Answer: -1"
+    if "numbered links" in instructions:
+        answer = -1
+        for line in input.splitlines():
+            if (m := re.match(r"(\d+)\. ", line)) and mentions_unsubscribe(line):
+                answer = int(m.group(1))
+                break
+        return json.dumps(dict(reasoning="", spam="SPAM", unsubscribe_link=answer))
+    if "Out of these links" in instructions:
+        for line in input.splitlines():
+            if (m := re.match(r"(\d+)\. ", line)) and mentions_unsubscribe(line):
+                return f"Answer: {m.group(1)}"
+        return "Answer: -1"
+    return "SPAM"
@@ -0,0 +1,62 @@
+import re
+
+# Phrases that unsubscribe pages use to confirm that the request went through.
+UNSUBSCRIBED_PATTERNS = [
+    r"\byou(?:'ve| have)?(?: successfully| now)? (?:been |are )?(?:successfully |now )?unsubscribed\b",
+    r"\byou(?:'re| are) (?:now |already )?unsubscribed\b",
+    r"\b(?:successfully|now) unsubscribed\b",
+    r"\bunsubscribe(?:d)? (?:was |has been )?(?:successful|confirmed|complete)\b",
+    r"\byou(?:'ve| have) (?:already )?been removed\b",
+    r"\b(?:removed|deleted) from (?:our|the|this) (?:mailing |email )?list\b",
+]
+
+_UNSUBSCRIBED_RE = re.compile("|".join(UNSUBSCRIBED_PATTERNS), re.IGNORECASE)
+
+
+def looks_unsubscribed(text: str) -> bool:
+    """
+    Check if the visible text of a page confirms an unsubscription.
+    """
+    text = re.sub(r"\s+", " ", text.replace("’", "'"))
+    return _UNSUBSCRIBED_RE.search(text) is not None
+
+
+# Words that mark an unsubscribe link or its surrounding text, in the
+# languages that marketing emails commonly use.
+UNSUBSCRIBE_TERMS = [
+    "unsubscribe",
+    "opt out",
+    "opt-out",
+    "remove me",
+    "manage preferences",
+    "email preferences",
+    "manage your subscription",
+    "update your preferences",
+    "darse de baja",
+    "cancelar suscripción",
+    "désabonner",
+    "désinscrire",
+    "se désinscrire",
+    "abmelden",
+    "abbestellen",
+    "disiscriviti",
+    "annulla iscrizione",
+    "descadastrar",
+    "cancelar inscrição",
+    "uitschrijven",
+    "afmelden",
+    "avregistrera",
+    "配信停止",
+    "退订",
+]
+
+_UNSUBSCRIBE_TERMS_RE = re.compile(
+    "|".join(re.escape(term) for term in UNSUBSCRIBE_TERMS), re.IGNORECASE
+)
+
+
+def mentions_unsubscribe(text: str) -> bool:
+    """
+    Check if text (such as a link label, URL, or footer) is about unsubscribing.
+    """
+    return _UNSUBSCRIBE_TERMS_RE.search(text) is not None
@@ -0,0 +1,220 @@
+import json
+import os
+import time
+from base64 import b64encode
+from dataclasses import asdict, dataclass, field
+from typing import Any, Literal
+
+from openai import OpenAI
+from selenium.webdriver.chrome.webdriver import WebDriver
+
+from .api_util import ChatMessage, completion
+from .page_text import looks_unsubscribed
+from .trace import is_log_file, load_log
+from .unsub_agent import extract_code_blocks, install_helpers, unsubscribe_on_website
+
+
+@dataclass
+class Playbook:
+    domain: str
+    url: str
+    steps: list[str]
+    successes: int = 0
+    failures: int = 0
+
+    @property
+    def trusted(self) -> bool:
+        return self.failures <= self.successes
+
+
+@dataclass
+class PlaybookStore:
+    """
+    A directory of learned playbooks, one JSON file per domain.
+    """
+
+    path: str
+    _cache: dict[str, Playbook | None] = field(default_factory=dict)
+
+    def __post_init__(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, domain: str) -> str:
+        return os.path.join(self.path, domain + ".json")
+
+    def get(self, domain: str) -> Playbook | None:
+        if domain not in self._cache:
+            playbook = None
+            if os.path.exists(path := self._file(domain)):
+                with open(path, "r") as f:
+                    playbook = Playbook(**json.load(f))
+            self._cache[domain] = playbook
+        return self._cache[domain]
+
+    def put(self, playbook: Playbook):
+        self._cache[playbook.domain] = playbook
+        tmp_path = self._file(playbook.domain) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(playbook), f)
+        os.replace(tmp_path, self._file(playbook.domain))
+
+    def learn(self, domain: str, url: str, conversation: list[ChatMessage]) -> bool:
+        """
+        Store the code from a successful conversation, keeping the failure
+        count of any playbook it replaces. Returns False if the conversation had
+        no replayable steps.
+        """
+        if not (steps := extract_playbook_steps(conversation)):
+            return False
+        failures = existing.failures if (existing := self.get(domain)) else 0
+        self.put(
+            Playbook(
+                domain=domain, url=url, steps=steps, successes=1, failures=failures
+            )
+        )
+        return True
+
+    def learn_from_logs(self, log_path: str) -> int:
+        """
+        Import playbooks from the successful logs of run_agent_many.
+        """
+        count = 0
+        for name in sorted(os.listdir(log_path)):
+            if not is_log_file(name):
+                continue
+            result = load_log(os.path.join(log_path, name))
+            if result.get("status") != "success" or "domain" not in result:
+                continue
+            if self.learn(result["domain"], result["url"], result["conversation"]):
+                count += 1
+        return count
+
+
+def _message_text(msg: ChatMessage) -> str:
+    if isinstance(msg["content"], str):
+        return msg["content"]
+    return "\n".join(
+        chunk["text"] for chunk in msg["content"] if chunk["type"] != "input_image"
+    )
+
+
+def extract_playbook_steps(conversation: list[ChatMessage]) -> list[str]:
+    """
+    Collect the code blocks the agent ran, skipping responses which did not
+    run (or raised an error) and the trailing success() call.
+    """
+    steps = []
+    for i, msg in enumerate(conversation):
+        if msg["role"] != "assistant":
+            continue
+        blocks = extract_code_blocks(_message_text(msg))
+        if len(blocks) != 1:
+            continue
+        if i + 1 < len(conversation):
+            feedback = _message_text(conversation[i + 1])
+            if "ERROR while executing script" in feedback:
+                continue
+        code = blocks[0].strip()
+        if code.rstrip(";").strip() in ("success()", "failure()"):
+            continue
+        steps.append(code)
+    return steps
+
+
+def run_playbook(
+    client: OpenAI,
+    driver: WebDriver,
+    url: str,
+    playbook: Playbook,
+    wait_between_steps: float = 2.0,
+) -> tuple[Literal["success", "failure"], list[ChatMessage]]:
+    """
+    Replay a playbook's steps on the page and check if it worked, first by
+    looking for confirmation text, then with a single confirmation call.
+    """
+    driver.get(url)
+    for step in playbook.steps:
+        install_helpers(driver)
+        try:
+            driver.execute_script(step)
+        except KeyboardInterrupt:
+            raise
+        except Exception:
+            return "failure", []
+        if driver.execute_script("return window.unspamStatus") == "failure":
+            return "failure", []
+        time.sleep(wait_between_steps)
+        driver.switch_to.window(driver.window_handles[-1])
+
+    page_text = driver.execute_script("return document.body.innerText")
+    if looks_unsubscribed(page_text):
+        return "success", []
+
+    b64_data = b64encode(driver.get_screenshot_as_png()).decode("ascii")
+    conversation: list[ChatMessage] = [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "input_text",
+                    "text": "Below is a screenshot of an email unsubscribe page after "
+                    "some actions were taken on it.",
+                },
+                {"type": "input_image", "image_url": f"data:image/png;base64,{b64_data}"},
+            ],
+        }
+    ]
+    response = completion(
+        client,
+        instructions=(
+            "Decide if the page confirms that the user has been unsubscribed from "
+            "all emails. You may think out loud, but end your response with a new "
+            "line that says either SUCCESS or FAILURE."
+        ),
+        input=conversation,
+    )
+    conversation.append(
+        {"role": "assistant", "content": [{"type": "output_text", "text": response}]}
+    )
+    last_line = response.strip().splitlines()[-1] if response.strip() else ""
+    return ("success" if last_line == "SUCCESS" else "failure"), conversation
+
+
+def unsubscribe_with_playbooks(
+    client: OpenAI,
+    driver: WebDriver,
+    url: str,
+    user_email: str,
+    domain: str,
+    store: PlaybookStore,
+    **kwargs: Any,
+) -> tuple[Literal["success", "failure", "timeout"], list[ChatMessage], bool]:
+    """
+    Try the domain's playbook before falling back to the full agent loop.
+
+    Returns the status, the conversation, and whether the playbook was used.
+    """
+    if (playbook := store.get(domain)) and playbook.trusted:
+        status, conversation = run_playbook(
+            client,
+            driver,
+            url,
+            playbook,
+            wait_between_steps=kwargs.get("wait_between_turns", 2.0),
+        )
+        if status == "success":
+            playbook.successes += 1
+            store.put(playbook)
+            if (trace := kwargs.get("trace")) is not None:
+                for message in conversation:
+                    trace.message(message)
+            return status, conversation, True
+        playbook.failures += 1
+        store.put(playbook)
+
+    status, conversation = unsubscribe_on_website(
+        client, driver, url, user_email, **kwargs
+    )
+    if status == "success":
+        store.learn(domain, url, conversation)
+    return status, conversation, False
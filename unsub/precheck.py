@@ -0,0 +1,181 @@
+import re
+from dataclasses import dataclass
+from typing import Literal
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup, Tag
+from requests.adapters import HTTPAdapter
+
+from .page_text import looks_unsubscribed, mentions_unsubscribe
+
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+
+@dataclass
+class PrecheckResult:
+    status: Literal["success", "browser"]
+    reason: str
+    final_url: str | None = None
+
+
+def create_http_session(pool_size: int = 16) -> requests.Session:
+    """
+    Create a session which reuses connections across pre-checks.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def precheck_unsubscribe(
+    session: requests.Session,
+    url: str,
+    user_email: str,
+    timeout: float = 15.0,
+) -> PrecheckResult:
+    """
+    Try to unsubscribe with plain HTTP requests.
+
+    Succeeds if the page (after redirects) already confirms the unsubscription,
+    or if it has a single trivial confirmation form which we can submit and
+    which leads to a confirmation. Anything else needs the browser agent.
+    """
+    try:
+        resp = session.get(url, timeout=timeout, allow_redirects=True)
+    except requests.RequestException as exc:
+        return PrecheckResult("browser", f"request failed: {exc}")
+    if resp.status_code >= 400:
+        return PrecheckResult("browser", f"status {resp.status_code}", resp.url)
+    if "html" not in resp.headers.get("Content-Type", "html"):
+        return PrecheckResult("browser", "response is not HTML", resp.url)
+
+    soup = BeautifulSoup(resp.text, "html.parser")
+    if looks_unsubscribed(_visible_text(soup)):
+        # Confirmation pages often offer to undo the unsubscription, which is
+        # the one form we must never submit. Anything else is left to the agent.
+        if _has_choices(soup) or _has_submit(soup):
+            return PrecheckResult("browser", "confirmed with controls left", resp.url)
+        return PrecheckResult("success", "confirmed on load", resp.url)
+
+    if (form := _simple_form(soup)) is None:
+        return PrecheckResult("browser", "no simple confirmation form", resp.url)
+
+    method, action, data = _form_submission(form, resp.url, user_email)
+    try:
+        if method == "post":
+            resp = session.post(action, data=data, timeout=timeout)
+        else:
+            resp = session.get(action, params=data, timeout=timeout)
+    except requests.RequestException as exc:
+        return PrecheckResult("browser", f"form submission failed: {exc}", action)
+    if resp.status_code < 400 and looks_unsubscribed(
+        _visible_text(BeautifulSoup(resp.text, "html.parser"))
+    ):
+        return PrecheckResult("success", "confirmed after form submission", resp.url)
+    return PrecheckResult("browser", "form submission was not confirmed", resp.url)
+
+
+def _visible_text(soup: BeautifulSoup) -> str:
+    for tag in soup(["script", "style", "noscript", "template"]):
+        tag.decompose()
+    return soup.get_text(" ", strip=True)
+
+
+def _has_choices(soup: BeautifulSoup | Tag) -> bool:
+    """
+    Check for controls whose state matters (e.g. a list of subscriptions).
+    """
+    if soup.find(["select", "textarea"]):
+        return True
+    return any(
+        inp.get("type", "").lower() in ("checkbox", "radio")
+        for inp in soup.find_all("input")
+    )
+
+
+_UNDO_RE = re.compile(
+    r"re-?subscribe|subscribe again|\bundo\b|\bkeep\b|opt(?:-| )?(?:back )?in\b",
+    re.IGNORECASE,
+)
+
+
+def _is_undo_form(form: Tag) -> bool:
+    """
+    Check for a form which would re-subscribe the user or keep them subscribed.
+    """
+    labels = [str(form.get("action", ""))]
+    for button in _submit_buttons(form):
+        labels.append(button.get_text(" ", strip=True))
+        labels.append(str(button.get("value", "")))
+    return any(_UNDO_RE.search(label) for label in labels)
+
+
+def _has_submit(soup: BeautifulSoup) -> bool:
+    """
+    Check for anything left to submit, besides forms that undo the request.
+    """
+    if any(not _is_undo_form(form) for form in soup.find_all("form")):
+        return True
+    return any(button.find_parent("form") is None for button in _submit_buttons(soup))
+
+
+def _submit_buttons(form: BeautifulSoup | Tag) -> list[Tag]:
+    buttons = []
+    for el in form.find_all(["button", "input"]):
+        kind = str(el.get("type", "submit" if el.name == "button" else "text"))
+        if kind.lower() in ("submit", "image"):
+            buttons.append(el)
+    return buttons
+
+
+def _is_email_input(inp: Tag) -> bool:
+    kind = str(inp.get("type", "text")).lower()
+    name = str(inp.get("name", "")).lower()
+    return kind == "email" or (kind == "text" and "email" in name)
+
+
+def _simple_form(soup: BeautifulSoup) -> Tag | None:
+    """
+    Find the page's only form, if it is a single-button confirmation with no
+    choices to make besides (optionally) the user's email address.
+    """
+    if not mentions_unsubscribe(soup.get_text(" ", strip=True)):
+        return None
+    forms = soup.find_all("form")
+    if len(forms) != 1 or _has_choices(forms[0]) or _is_undo_form(forms[0]):
+        return None
+    form = forms[0]
+    if len(_submit_buttons(form)) != 1:
+        return None
+    for inp in form.find_all("input"):
+        kind = str(inp.get("type", "text")).lower()
+        if kind in ("hidden", "submit", "image") or _is_email_input(inp):
+            continue
+        return None
+    return form
+
+
+def _form_submission(
+    form: Tag, page_url: str, user_email: str
+) -> tuple[str, str, dict[str, str]]:
+    data = {}
+    for inp in form.find_all("input"):
+        if not (name := inp.get("name")):
+            continue
+        kind = str(inp.get("type", "text")).lower()
+        if kind in ("submit", "image"):
+            continue
+        data[str(name)] = user_email if _is_email_input(inp) else str(inp.get("value", ""))
+    button = _submit_buttons(form)[0]
+    if name := button.get("name"):
+        data[str(name)] = str(button.get("value", ""))
+    method = str(form.get("method", "get")).lower()
+    action = urljoin(page_url, str(form.get("action", "")))
+    return method, action, data
@@ -0,0 +1,142 @@
+"""
+Resolve click-tracking redirects in unsubscribe links ahead of time, so that
+the browser doesn't have to follow them on every run and vendors are grouped
+by the pages their links actually lead to.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from typing import Iterable
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+from .precheck import create_http_session
+
+
+@dataclass
+class Resolution:
+    final_url: str
+    hops: int
+    resolved_at: float
+
+
+class RedirectCache:
+    """
+    A JSON file mapping original URLs to where they redirect. Only successful
+    resolutions are stored, so failed ones are retried on the next run.
+
+    Entries older than max_age seconds aren't considered resolved, so they are
+    followed again, but they are still used until a new resolution succeeds.
+    """
+
+    def __init__(self, path: str, max_age: float | None = 30 * 24 * 60 * 60):
+        self.path = path
+        self.max_age = max_age
+        self.entries: dict[str, Resolution] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = {k: Resolution(**v) for k, v in json.load(f).items()}
+
+    def __contains__(self, url: str) -> bool:
+        if (entry := self.entries.get(url)) is None:
+            return False
+        return self.max_age is None or time.time() - entry.resolved_at < self.max_age
+
+    def final_url(self, url: str) -> str:
+        """
+        Get the resolved URL, or the URL itself if it hasn't been resolved.
+        """
+        if (entry := self.entries.get(url)) is not None:
+            return entry.final_url
+        return url
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({k: asdict(v) for k, v in self.entries.items()}, f)
+        os.replace(tmp_path, self.path)
+
+
+class HostLimiter:
+    """
+    Limit the number of concurrent requests to each host.
+    """
+
+    def __init__(self, max_per_host: int):
+        self.max_per_host = max_per_host
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.Semaphore] = {}
+
+    def __call__(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).hostname or ""
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.Semaphore(self.max_per_host)
+            return self._semaphores[host]
+
+
+def follow_redirects(
+    session: requests.Session,
+    url: str,
+    limiter: HostLimiter,
+    timeout: float = 10.0,
+    max_hops: int = 10,
+) -> Resolution:
+    """
+    Follow a chain of HTTP redirects one hop at a time, without downloading
+    any response bodies.
+    """
+    for hop in range(max_hops + 1):
+        with limiter(url):
+            resp = session.get(url, timeout=timeout, allow_redirects=False, stream=True)
+            resp.close()
+        location = resp.headers.get("Location")
+        if not resp.is_redirect or not location:
+            return Resolution(final_url=url, hops=hop, resolved_at=time.time())
+        url = urljoin(url, location)
+    raise requests.TooManyRedirects(f"more than {max_hops} redirects")
+
+
+def resolve_redirects(
+    urls: Iterable[str],
+    cache: RedirectCache,
+    session: requests.Session | None = None,
+    max_workers: int = 16,
+    max_per_host: int = 4,
+    timeout: float = 10.0,
+    save_every: int = 50,
+) -> int:
+    """
+    Resolve every URL which isn't cached yet, concurrently, and store the
+    results in the cache. Returns the number of URLs that couldn't be resolved.
+    """
+    pending = sorted({url for url in urls if url not in cache})
+    if not pending:
+        return 0
+    session = session or create_http_session(pool_size=max_workers)
+    limiter = HostLimiter(max_per_host)
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(follow_redirects, session, url, limiter, timeout): url
+            for url in pending
+        }
+        for i, future in enumerate(as_completed(futures)):
+            try:
+                cache.entries[futures[future]] = future.result()
+            except KeyboardInterrupt:
+                raise
+            except Exception:
+                # Besides request errors, malformed URLs (including Location
+                # headers) raise urllib3 and ValueError exceptions.
+                failures += 1
+            if (i + 1) % save_every == 0:
+                cache.save()
+    cache.save()
+    return failures
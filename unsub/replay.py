@@ -0,0 +1,140 @@
+"""
+Record and replay the completion calls made by an agent run.
+
+A RecordingClient wraps a real OpenAI client and captures every request and
+response made through `client.responses.create`. A ReplayClient then feeds
+those responses back in the same order, so the rest of the harness (driver,
+screenshots, waits) can be exercised deterministically and offline.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from openai import OpenAI
+
+
+class ReplayMismatch(Exception):
+    pass
+
+
+@dataclass
+class FakeResponse:
+    output_text: str
+    error: Any = None
+    usage: Any = None
+
+
+class _FakeResponses:
+    def __init__(self, create_fn: Callable[..., FakeResponse]):
+        self.create = create_fn
+
+
+class FakeClient:
+    """
+    A stand-in for OpenAI() which answers `responses.create` with a Python
+    function that maps (instructions, input) to the output text.
+    """
+
+    def __init__(self, respond: Callable[[str, Any], str]):
+        self._respond = respond
+        self.responses = _FakeResponses(self._create)
+
+    def _create(self, *, instructions: str, input: Any, **kwargs) -> FakeResponse:
+        return FakeResponse(output_text=self._respond(instructions, input))
+
+
+def _turn_index(input: Any) -> int | None:
+    """
+    Agent turns send the whole conversation, so the number of assistant
+    messages so far identifies the turn. Summary calls send a raw string.
+    """
+    if not isinstance(input, list):
+        return None
+    return sum(1 for msg in input if msg.get("role") == "assistant")
+
+
+def _strip_images(input: Any) -> Any:
+    """
+    Replace base64 screenshots with a digest to keep recordings small.
+    """
+    if not isinstance(input, list):
+        return input
+    result = []
+    for msg in input:
+        content = msg.get("content")
+        if isinstance(content, list):
+            new_content = []
+            for chunk in content:
+                if chunk.get("type") == "input_image":
+                    digest = hashlib.sha256(chunk["image_url"].encode()).hexdigest()
+                    chunk = dict(type="input_image", image_url=f"sha256:{digest}")
+                new_content.append(chunk)
+            msg = dict(msg, content=new_content)
+        result.append(msg)
+    return result
+
+
+class RecordingClient:
+    """
+    Wrap an OpenAI client and record each `responses.create` call.
+    """
+
+    def __init__(self, client: OpenAI, keep_images: bool = False):
+        self.client = client
+        self.keep_images = keep_images
+        self.calls: list[dict[str, Any]] = []
+        self.responses = _FakeResponses(self._create)
+
+    def _create(self, **kwargs) -> Any:
+        response = self.client.responses.create(**kwargs)
+        input = kwargs.get("input")
+        self.calls.append(
+            dict(
+                index=len(self.calls),
+                turn=_turn_index(input),
+                instructions=kwargs.get("instructions"),
+                input=input if self.keep_images else _strip_images(input),
+                output_text=response.output_text,
+            )
+        )
+        return response
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(dict(calls=self.calls), f)
+
+
+class ReplayClient:
+    """
+    Answer `responses.create` calls with the outputs from a recording.
+
+    Calls are matched in order. If strict, the turn index of each call must
+    match the recording, so divergences in the harness are caught early.
+    """
+
+    def __init__(self, calls: list[dict[str, Any]], strict: bool = True):
+        self.calls = calls
+        self.strict = strict
+        self.position = 0
+        self.responses = _FakeResponses(self._create)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "ReplayClient":
+        with open(path, "r") as f:
+            return cls(json.load(f)["calls"], **kwargs)
+
+    def _create(self, *, input: Any, **kwargs) -> FakeResponse:
+        if self.position >= len(self.calls):
+            raise ReplayMismatch(
+                f"recording exhausted after {len(self.calls)} calls"
+            )
+        call = self.calls[self.position]
+        self.position += 1
+        if self.strict and call["turn"] != _turn_index(input):
+            raise ReplayMismatch(
+                f"call {call['index']} was recorded at turn {call['turn']} "
+                f"but replayed at turn {_turn_index(input)}"
+            )
+        return FakeResponse(output_text=call["output_text"])
@@ -1,7 +1,14 @@
+import fnmatch
 from typing import Callable
 
-from .base import Simulation
+from .base import AssetSimulation, ServerSimulation, SharedSimulationServer, Simulation
 from .fandango import FandangoSimulation
+from .generated import (
+    GeneratedPrefix,
+    GeneratedSimulation,
+    NumGenerated,
+    generated_name,
+)
 from .goldbelly import GoldbellySimulation
 from .honeywell import HoneywellSimulation
 from .peco import PecoSimulation
@@ -18,5 +25,32 @@ Simulations: dict[str, Callable[[], Simulation]] = {
     "peco": lambda: PecoSimulation(),
     "fandango": lambda: FandangoSimulation(),
 }
+Simulations.update(
+    {
+        generated_name(seed): (lambda seed=seed: GeneratedSimulation(seed))
+        for seed in range(NumGenerated)
+    }
+)
 
-__all__ = ["Simulation", "Simulations"]
+__all__ = [
+    "AssetSimulation",
+    "GeneratedSimulation",
+    "ServerSimulation",
+    "SharedSimulationServer",
+    "Simulation",
+    "Simulations",
+    "select_simulations",
+]
+
+
+def select_simulations(pattern: str | None) -> list[str]:
+    """
+    Find simulations matching a glob pattern. By default, the generated
+    simulations are left out, since there are hundreds of them.
+    """
+    if pattern is None:
+        return [name for name in Simulations if not name.startswith(GeneratedPrefix)]
+    names = fnmatch.filter(Simulations, pattern)
+    if not names:
+        raise KeyError(f"no simulations match: {pattern}")
+    return names
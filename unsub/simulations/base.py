@@ -1,13 +1,20 @@
+import mimetypes
 import os
-import socket
 import threading
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-from typing import Literal, Protocol
-from urllib.parse import parse_qs
+import uuid
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from typing import ClassVar, Literal, Protocol
+from urllib.parse import parse_qs, urlsplit
 
 UnsubStatus = Literal["success", "failure"]
 AssetDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
 
+SessionPrefix = "/s/"
+SessionCookie = "sim_session"
+
 
 class Simulation(Protocol):
     def start(self) -> str:
@@ -15,59 +22,235 @@ class Simulation(Protocol):
         ...
 
     def finish(self) -> UnsubStatus:
-        """Start the simulation and return a URL."""
+        """Stop the simulation and return whether the user was unsubscribed."""
         ...
 
 
-class BaseHandler(SimpleHTTPRequestHandler):
+@lru_cache(maxsize=None)
+def read_asset(path: str) -> bytes:
+    """
+    Read an asset file once and serve it from memory afterwards.
+    """
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def asset_path(root: str, rel_path: str) -> str:
+    """
+    Resolve a request path inside an asset directory, or 404.html if the path
+    escapes the directory.
+    """
+    asset_root = os.path.abspath(AssetDir)
+    safe_path = os.path.normpath(os.path.join(root, rel_path.lstrip("/")))
+    if not safe_path.startswith(asset_root + os.sep):
+        return os.path.join(asset_root, "404.html")
+    return safe_path
+
+
+class ServerSimulation(ABC):
+    """
+    A simulation served over HTTP. Subclasses generate responses in serve(),
+    and record the unsubscribe status as requests come in.
+
+    By default each simulation gets its own server. If `shared` is set, the
+    simulation is instead hosted as a session of that server.
+    """
+
+    shared: ClassVar["SharedSimulationServer | None"] = None
+
+    def __init__(self):
+        self.httpd: HTTPServer | None = None
+        self.thread: threading.Thread | None = None
+        self.session_id: str | None = None
+
+    @abstractmethod
+    def serve(self, path: str, query: dict[str, list[str]]) -> tuple[int, str, bytes]:
+        """Return the status code, content type and body for a request."""
+
+    def start_server(self) -> str:
+        if (shared := ServerSimulation.shared) is not None:
+            return shared.add_session(self)
+
+        parent = self
+
+        class Handler(_SimulationHandler):
+            def do_GET(self):
+                path, query = parse_path_and_query(self.path)
+                self.send_page(parent, path, query)
+
+        # Binding to port 0 lets the OS pick a free port without racing.
+        self.httpd = HTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+
+    def stop_server(self):
+        if self.session_id is not None:
+            assert ServerSimulation.shared is not None
+            ServerSimulation.shared.remove_session(self.session_id)
+            self.session_id = None
+        if self.httpd:
+            assert self.thread is not None
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.thread.join(timeout=1)
+            self.httpd = None
+
+
+class AssetSimulation(ServerSimulation):
+    """
+    A simulation whose pages are asset files. Subclasses map request paths to
+    assets in resolve().
+    """
+
+    @abstractmethod
+    def resolve(self, path: str, query: dict[str, list[str]]) -> str:
+        """Map a request to the path of an asset file."""
+
+    def serve(self, path: str, query: dict[str, list[str]]) -> tuple[int, str, bytes]:
+        file_path = self.resolve(path, query)
+        content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        try:
+            return 200, content_type, read_asset(file_path)
+        except OSError:
+            return 404, "text/html", read_asset(os.path.join(AssetDir, "404.html"))
+
+
+class _SimulationHandler(BaseHTTPRequestHandler):
+    # Standalone servers close every connection, so that shutdown() and
+    # server_close() don't hang on idle sockets.
+    keep_alive = False
+
     def log_message(self, format, *args):
         # Silence logs
         pass
 
-    def end_headers(self):
-        # Prevent shutdown / server_close from hanging.
-        self.send_header("Connection", "close")
-        super().end_headers()
-
     def setup(self):
         super().setup()
         try:
-            self.request.settimeout(2)  # avoid open sockets preventing shutdown
+            self.request.settimeout(2 if not self.keep_alive else 30)
         except Exception:
             pass
 
+    def send_page(
+        self,
+        sim: ServerSimulation,
+        path: str,
+        query: dict[str, list[str]],
+        headers: dict[str, str] | None = None,
+    ):
+        status, content_type, body = sim.serve(path, query)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if not self.keep_alive:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SharedSimulationServer:
+    """
+    One threaded, keep-alive server which hosts many simulation sessions,
+    each under its own /s/<session_id>/ URL prefix.
+
+    Simulation pages use absolute paths (e.g. form actions like /unsubscribe),
+    so requests without a prefix are attributed to a session via their Referer
+    (or a session cookie) and redirected under that session's prefix.
+    """
 
-class ServerSimulation:
     def __init__(self):
-        self.httpd: HTTPServer | None = None
+        self.sessions: dict[str, ServerSimulation] = {}
+        self._lock = threading.Lock()
+        self.httpd: ThreadingHTTPServer | None = None
         self.thread: threading.Thread | None = None
 
-    def compute_port(self) -> int:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.bind(("", 0))
-        port = sock.getsockname()[1]
-        sock.close()
-        return port
+    @property
+    def base_url(self) -> str:
+        assert self.httpd is not None
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
 
-    def start_server(self, handler: type[SimpleHTTPRequestHandler]) -> str:
-        port = self.compute_port()
-        self.httpd = HTTPServer(("127.0.0.1", port), handler)  # type: ignore
+    def start(self) -> "SharedSimulationServer":
+        parent = self
 
-        def run_server():
-            assert self.httpd is not None
-            self.httpd.serve_forever()
+        class Handler(_SimulationHandler):
+            protocol_version = "HTTP/1.1"
+            keep_alive = True
 
-        self.thread = threading.Thread(target=run_server, daemon=True)
-        self.thread.start()
+            def do_GET(self):
+                parent.handle(self)
 
-        return f"http://127.0.0.1:{port}/"
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
 
-    def stop_server(self):
+    def stop(self):
         if self.httpd:
             assert self.thread is not None
             self.httpd.shutdown()
             self.httpd.server_close()
             self.thread.join(timeout=1)
+            self.httpd = None
+
+    def __enter__(self) -> "SharedSimulationServer":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def add_session(self, sim: ServerSimulation) -> str:
+        session_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self.sessions[session_id] = sim
+        sim.session_id = session_id
+        return f"{self.base_url}{SessionPrefix}{session_id}/"
+
+    def remove_session(self, session_id: str):
+        with self._lock:
+            self.sessions.pop(session_id, None)
+
+    def handle(self, handler: _SimulationHandler):
+        path, query = parse_path_and_query(handler.path)
+        if path.startswith(SessionPrefix):
+            session_id, _, rest = path[len(SessionPrefix) :].partition("/")
+            with self._lock:
+                sim = self.sessions.get(session_id)
+            if sim is None:
+                handler.send_error(404, "unknown simulation session")
+                return
+            handler.send_page(
+                sim,
+                "/" + rest,
+                query,
+                headers={
+                    "Set-Cookie": f"{SessionCookie}={session_id}; Path=/",
+                    "Cache-Control": "no-store",
+                },
+            )
+            return
+
+        if (session_id := self._session_from_request(handler)) is None:
+            handler.send_error(404, "request does not belong to a simulation session")
+            return
+        handler.send_response(302)
+        handler.send_header("Location", f"{SessionPrefix}{session_id}{handler.path}")
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+
+    def _session_from_request(self, handler: _SimulationHandler) -> str | None:
+        referer_path = urlsplit(handler.headers.get("Referer", "")).path
+        if referer_path.startswith(SessionPrefix):
+            session_id = referer_path[len(SessionPrefix) :].partition("/")[0]
+            if session_id in self.sessions:
+                return session_id
+        cookie = SimpleCookie(handler.headers.get("Cookie", ""))
+        if (morsel := cookie.get(SessionCookie)) and morsel.value in self.sessions:
+            return morsel.value
+        return None
 
 
 def parse_path_and_query(path: str) -> tuple[str, dict[str, list[str]]]:
@@ -1,52 +1,37 @@
 import os
 
-from .base import (
-    AssetDir,
-    BaseHandler,
-    ServerSimulation,
-    UnsubStatus,
-    parse_path_and_query,
-)
+from .base import AssetDir, AssetSimulation, UnsubStatus, asset_path
 
 
-class FandangoSimulation(ServerSimulation):
+class FandangoSimulation(AssetSimulation):
     def __init__(self):
+        super().__init__()
         self._status: UnsubStatus = "failure"
 
     def start(self) -> str:
+        return self.start_server()
+
+    def resolve(self, path: str, query: dict[str, list[str]]) -> str:
         asset_root = os.path.abspath(AssetDir)
-        parent = self
-
-        class CustomHandler(BaseHandler):
-            def translate_path(self, path: str) -> str:
-                path, query = parse_path_and_query(path)
-
-                if path == "/":
-                    return os.path.join(asset_root, "fandango.html")
-
-                if path == "/update_preferences":
-                    parent._status = (
-                        "success"
-                        if all(query.get(f"sub{i}") is None for i in (1, 2, 3))
-                        else "failure"
-                    )
-                    return os.path.join(asset_root, "updated.html")
-                elif path == "/unsubscribe_all":
-                    parent._status = "success"
-                    return os.path.join(asset_root, "updated.html")
-                elif path == "/homepage":
-                    parent._status = "failure"
-                    return os.path.join(asset_root, "404.html")
-
-                rel_path = path.lstrip("/")
-                safe_path = os.path.normpath(os.path.join(asset_root, rel_path))
-
-                if not safe_path.startswith(asset_root + os.sep):
-                    return os.path.join(asset_root, "404.html")
-
-                return safe_path
-
-        return self.start_server(CustomHandler)
+
+        if path == "/":
+            return os.path.join(asset_root, "fandango.html")
+
+        if path == "/update_preferences":
+            self._status = (
+                "success"
+                if all(query.get(f"sub{i}") is None for i in (1, 2, 3))
+                else "failure"
+            )
+            return os.path.join(asset_root, "updated.html")
+        elif path == "/unsubscribe_all":
+            self._status = "success"
+            return os.path.join(asset_root, "updated.html")
+        elif path == "/homepage":
+            self._status = "failure"
+            return os.path.join(asset_root, "404.html")
+
+        return asset_path(asset_root, path)
 
     def finish(self) -> UnsubStatus:
         self.stop_server()
@@ -0,0 +1,242 @@
+"""
+Procedurally generated unsubscribe flows. Each seed deterministically picks a
+combination of features (a landing page, links opening in a new tab, lists of
+subscription checkboxes, email entry, confirmation modals and pages, and large
+amounts of unrelated DOM), and the server checks the final submission.
+"""
+
+import html
+import random
+from dataclasses import dataclass
+
+from .base import ServerSimulation, UnsubStatus
+
+NumGenerated = 200
+GeneratedPrefix = "generated_"
+
+_BRANDS = ["Acme", "Northwind", "Contoso", "Globex", "Initech", "Umbrella", "Hooli"]
+_TOPICS = [
+    "Weekly deals",
+    "New arrivals",
+    "Product updates",
+    "Events near you",
+    "Partner offers",
+    "Surveys",
+    "Tips and tutorials",
+    "Recommendations",
+    "Back in stock alerts",
+    "Price drops",
+    "Newsletter",
+    "Birthday rewards",
+]
+_MANAGE_TEXT = ["Manage email preferences", "Update your preferences", "Email settings"]
+_SUBMIT_TEXT = ["Unsubscribe", "Save preferences", "Update", "Submit"]
+_STAY_TEXT = ["Keep me subscribed", "Never mind", "Back to shop"]
+
+_STYLE = (
+    "body{font-family:Arial,sans-serif;margin:0;background:#f9f9f9}"
+    "main{max-width:640px;margin:40px auto;background:#fff;padding:32px}"
+    "label{display:block;margin:6px 0}"
+    "#modal{display:none;position:fixed;inset:0;background:rgba(0,0,0,.5)}"
+    "#modal>div{background:#fff;max-width:360px;margin:20vh auto;padding:24px}"
+    ".filler{font-size:12px;color:#999}"
+)
+
+
+def generated_name(seed: int) -> str:
+    return f"{GeneratedPrefix}{seed}"
+
+
+@dataclass
+class GeneratedFlow:
+    brand: str
+    landing_page: bool
+    new_tab: bool
+    topics: list[str]
+    unsubscribe_all: bool
+    email_entry: bool
+    confirm_modal: bool
+    confirm_page: bool
+    filler_elements: int
+    manage_text: str
+    submit_text: str
+    stay_text: str
+
+    @classmethod
+    def from_seed(cls, seed: int) -> "GeneratedFlow":
+        rng = random.Random(seed)
+        landing_page = rng.random() < 0.5
+        num_topics = rng.choice([0, 0, 1, 3, 5, 8, 12])
+        return cls(
+            brand=rng.choice(_BRANDS),
+            landing_page=landing_page,
+            new_tab=landing_page and rng.random() < 0.5,
+            topics=rng.sample(_TOPICS, num_topics),
+            unsubscribe_all=num_topics > 0 and rng.random() < 0.5,
+            email_entry=rng.random() < 0.4,
+            confirm_modal=rng.random() < 0.3,
+            confirm_page=rng.random() < 0.3,
+            filler_elements=rng.choice([0, 0, 100, 1000, 5000]),
+            manage_text=rng.choice(_MANAGE_TEXT),
+            submit_text=rng.choice(_SUBMIT_TEXT),
+            stay_text=rng.choice(_STAY_TEXT),
+        )
+
+
+class GeneratedSimulation(ServerSimulation):
+    def __init__(self, seed: int):
+        super().__init__()
+        self.seed = seed
+        self.flow = GeneratedFlow.from_seed(seed)
+        self._status: UnsubStatus = "failure"
+        self._pending = False
+
+    def start(self) -> str:
+        return self.start_server()
+
+    def serve(self, path: str, query: dict[str, list[str]]) -> tuple[int, str, bytes]:
+        flow = self.flow
+        if path == "/":
+            body = self._landing() if flow.landing_page else self._preferences()
+        elif path == "/preferences" and flow.landing_page:
+            body = self._preferences()
+        elif path == "/submit":
+            ok = self._submission_ok(query)
+            if flow.confirm_page and ok:
+                self._pending = True
+                body = self._confirm()
+            else:
+                self._status = "success" if ok else "failure"
+                body = self._done(ok)
+        elif path == "/confirm" and self._pending:
+            self._status = "success"
+            body = self._done(True)
+        elif path == "/stay":
+            self._status = "failure"
+            self._pending = False
+            body = self._page("Thanks for staying", "<h1>You're still subscribed.</h1>")
+        else:
+            return 404, "text/html", self._page("Not found", "<h1>Not found</h1>")
+        return 200, "text/html", body
+
+    def finish(self) -> UnsubStatus:
+        self.stop_server()
+        return self._status
+
+    def solution(self) -> list[str]:
+        """
+        Known-good code blocks, one per agent turn, for the scripted model.
+        """
+        flow = self.flow
+        steps = []
+        if flow.landing_page:
+            steps.append("document.getElementById('manage').click();")
+        lines = []
+        if flow.email_entry:
+            lines.append("document.getElementById('email').value = 'user@example.com';")
+        if flow.unsubscribe_all:
+            lines.append("document.getElementById('unsubscribe_all').checked = true;")
+        elif flow.topics:
+            lines.append(
+                "document.querySelectorAll('input[name=\"topic\"]')"
+                ".forEach((c) => { c.checked = false; });"
+            )
+        lines.append("document.getElementById('submit').click();")
+        if flow.confirm_modal:
+            lines.append("document.getElementById('confirm_yes').click();")
+        steps.append("\n".join(lines))
+        if flow.confirm_page:
+            steps.append("document.getElementById('confirm').click();")
+        steps.append("success();")
+        return steps
+
+    def _submission_ok(self, query: dict[str, list[str]]) -> bool:
+        flow = self.flow
+        if flow.email_entry and "@" not in query.get("email", [""])[0]:
+            return False
+        if query.get("unsubscribe_all") == ["on"]:
+            return True
+        return not query.get("topic")
+
+    def _page(self, title: str, content: str) -> bytes:
+        filler = "".join(
+            f'<div class="filler"><a href="/stay?f={i}">{self.flow.brand} item {i}</a>'
+            f"<span> &middot; promo {i}</span></div>"
+            for i in range(self.flow.filler_elements)
+        )
+        return (
+            "<!DOCTYPE html><html><head><meta charset='UTF-8'>"
+            f"<title>{html.escape(title)}</title><style>{_STYLE}</style></head>"
+            f"<body><main>{content}</main>{filler}</body></html>"
+        ).encode()
+
+    def _landing(self) -> bytes:
+        flow = self.flow
+        target = ' target="_blank"' if flow.new_tab else ""
+        return self._page(
+            f"{flow.brand} email",
+            f"<h1>{flow.brand} email</h1>"
+            "<p>Thanks for being a subscriber. You can change which emails you "
+            "receive at any time.</p>"
+            f'<p><a id="manage" href="/preferences"{target}>{flow.manage_text}</a></p>'
+            f'<p><a href="/stay">{flow.stay_text}</a></p>',
+        )
+
+    def _preferences(self) -> bytes:
+        flow = self.flow
+        fields = []
+        if flow.email_entry:
+            fields.append(
+                '<label>Email address <input type="email" id="email" name="email" '
+                'required></label>'
+            )
+        if flow.topics:
+            fields.append("<p>You are subscribed to:</p>")
+            for i, topic in enumerate(flow.topics):
+                fields.append(
+                    f'<label><input type="checkbox" name="topic" value="{i}" checked> '
+                    f"{html.escape(topic)}</label>"
+                )
+            if flow.unsubscribe_all:
+                fields.append(
+                    '<label><input type="checkbox" id="unsubscribe_all" '
+                    'name="unsubscribe_all"> Unsubscribe from all emails</label>'
+                )
+        else:
+            fields.append(f"<p>Unsubscribe from all {flow.brand} emails?</p>")
+
+        if flow.confirm_modal:
+            submit = (
+                f'<button type="button" id="submit" onclick="document.getElementById('
+                f"'modal').style.display='block'\">{flow.submit_text}</button>"
+                '<div id="modal"><div><p>Are you sure?</p>'
+                '<button type="button" id="confirm_yes" '
+                "onclick=\"document.getElementById('prefs').submit()\">Yes</button> "
+                '<button type="button" onclick="document.getElementById('
+                "'modal').style.display='none'\">Cancel</button></div></div>"
+            )
+        else:
+            submit = f'<button type="submit" id="submit">{flow.submit_text}</button>'
+        return self._page(
+            f"{flow.brand} preferences",
+            f"<h1>{flow.brand} email preferences</h1>"
+            f'<form id="prefs" method="get" action="/submit">{"".join(fields)}'
+            f"{submit}</form>"
+            f'<p><a href="/stay">{flow.stay_text}</a></p>',
+        )
+
+    def _confirm(self) -> bytes:
+        return self._page(
+            "Confirm",
+            "<h1>One more step</h1><p>Please confirm that you want to unsubscribe.</p>"
+            '<button id="confirm" onclick="location.href=\'/confirm\'">'
+            "Confirm</button> "
+            f'<a href="/stay">{self.flow.stay_text}</a>',
+        )
+
+    def _done(self, ok: bool) -> bytes:
+        if ok:
+            message = "You have successfully been unsubscribed."
+        else:
+            message = "Your preferences have been updated."
+        return self._page("Updated", f"<h1>{message}</h1>")
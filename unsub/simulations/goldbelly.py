@@ -1,52 +1,35 @@
 import os
 
-from .base import (
-    AssetDir,
-    BaseHandler,
-    ServerSimulation,
-    UnsubStatus,
-    parse_path_and_query,
-)
+from .base import AssetDir, AssetSimulation, UnsubStatus, asset_path
 
 
-class GoldbellySimulation(ServerSimulation):
+class GoldbellySimulation(AssetSimulation):
     def __init__(self):
+        super().__init__()
         self._status: UnsubStatus = "failure"
 
     def start(self) -> str:
-        asset_root = os.path.abspath(AssetDir)
-        parent = self
-
-        class CustomHandler(BaseHandler):
-            def translate_path(self, path: str) -> str:
-                path, query = parse_path_and_query(path)
-
-                if path == "/":
-                    return os.path.join(asset_root, "goldbelly", "index.html")
+        return self.start_server()
 
-                if path == "/email_preferences":
-                    parent._status = (
-                        "success"
-                        if query["user[unsubscribed]"] == ["true"]
-                        else "failure"
-                    )
-                    return os.path.join(asset_root, "updated.html")
-
-                if path == "/homepage":
-                    parent._status = "failure"
-                    return os.path.join(asset_root, "goldbelly", "homepage.html")
+    def resolve(self, path: str, query: dict[str, list[str]]) -> str:
+        asset_root = os.path.abspath(AssetDir)
 
-                rel_path = path.lstrip("/")
-                safe_path = os.path.normpath(
-                    os.path.join(asset_root, "goldbelly", rel_path)
-                )
+        if path == "/":
+            return os.path.join(asset_root, "goldbelly", "index.html")
 
-                if not safe_path.startswith(asset_root + os.sep):
-                    return os.path.join(asset_root, "404.html")
+        if path == "/email_preferences":
+            self._status = (
+                "success"
+                if query.get("user[unsubscribed]") == ["true"]
+                else "failure"
+            )
+            return os.path.join(asset_root, "updated.html")
 
-                return safe_path
+        if path == "/homepage":
+            self._status = "failure"
+            return os.path.join(asset_root, "goldbelly", "homepage.html")
 
-        return self.start_server(CustomHandler)
+        return asset_path(os.path.join(asset_root, "goldbelly"), path)
 
     def finish(self) -> UnsubStatus:
         self.stop_server()
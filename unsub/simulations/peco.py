@@ -1,49 +1,34 @@
 import os
 
-from .base import (
-    AssetDir,
-    BaseHandler,
-    ServerSimulation,
-    UnsubStatus,
-    parse_path_and_query,
-)
+from .base import AssetDir, AssetSimulation, UnsubStatus, asset_path
 
 
-class PecoSimulation(ServerSimulation):
+class PecoSimulation(AssetSimulation):
     def __init__(self):
+        super().__init__()
         self._status: UnsubStatus = "failure"
 
     def start(self) -> str:
-        asset_root = os.path.abspath(AssetDir)
-        parent = self
-
-        class CustomHandler(BaseHandler):
-            def translate_path(self, path: str) -> str:
-                path, query = parse_path_and_query(path)
-
-                if path == "/":
-                    return os.path.join(asset_root, "peco", "index.html")
-
-                if path == "/update_preferences":
-                    parent._status = (
-                        "success"
-                        if all(
-                            query.get(str(i), [""]) == [""]
-                            for i in (19, 22, 18, 9, 10, 14, 23, 25, 17, 26)
-                        )
-                        else "failure"
-                    )
-                    return os.path.join(asset_root, "updated.html")
+        return self.start_server()
 
-                rel_path = path.lstrip("/")
-                safe_path = os.path.normpath(os.path.join(asset_root, "peco", rel_path))
-
-                if not safe_path.startswith(asset_root + os.sep):
-                    return os.path.join(asset_root, "404.html")
-
-                return safe_path
+    def resolve(self, path: str, query: dict[str, list[str]]) -> str:
+        asset_root = os.path.abspath(AssetDir)
 
-        return self.start_server(CustomHandler)
+        if path == "/":
+            return os.path.join(asset_root, "peco", "index.html")
+
+        if path == "/update_preferences":
+            self._status = (
+                "success"
+                if all(
+                    query.get(str(i), [""]) == [""]
+                    for i in (19, 22, 18, 9, 10, 14, 23, 25, 17, 26)
+                )
+                else "failure"
+            )
+            return os.path.join(asset_root, "updated.html")
+
+        return asset_path(os.path.join(asset_root, "peco"), path)
 
     def finish(self) -> UnsubStatus:
         self.stop_server()
@@ -0,0 +1,50 @@
+"""
+Known-good code blocks for each simulation, one per agent turn. These let
+benchmarks drive the real harness with a scripted model.
+"""
+
+from .generated import GeneratedSimulation, NumGenerated, generated_name
+
+Solutions: dict[str, list[str]] = {
+    "simple_1": ["success();"],
+    "click_to_unsub": [
+        "document.querySelector('button.unsubscribe').click();",
+        "success();",
+    ],
+    "enter_email": [
+        "document.getElementById('email').value = 'annabelle.lee@gmail.com';\n"
+        "document.querySelectorAll('input[name=\"subscriptions\"]')"
+        ".forEach((c) => { c.checked = false; });",
+        "document.querySelector('#unsubscribeForm button[type=\"submit\"]').click();",
+        "success();",
+    ],
+    "bryant_park": [
+        "document.querySelector('input[type=\"submit\"]').click();",
+        "success();",
+    ],
+    "goldbelly": [
+        "document.querySelectorAll('form[action=\"/email_preferences\"]')[1].submit();",
+        "success();",
+    ],
+    "honeywell": [
+        "document.getElementById('unsuball').checked = true;\n"
+        "document.getElementById('submit').click();",
+        "success();",
+    ],
+    "peco": [
+        "document.querySelectorAll('input[type=\"checkbox\"]')"
+        ".forEach((c) => { c.checked = false; });",
+        "document.forms.SubscribeForm.submit();",
+        "success();",
+    ],
+    "fandango": [
+        "document.querySelector('a[href=\"/unsubscribe_all\"]').click();",
+        "success();",
+    ],
+}
+Solutions.update(
+    {
+        generated_name(seed): GeneratedSimulation(seed).solution()
+        for seed in range(NumGenerated)
+    }
+)
@@ -1,36 +1,23 @@
 import os
 
-from .base import AssetDir, BaseHandler, ServerSimulation, UnsubStatus
+from .base import AssetDir, AssetSimulation, UnsubStatus, asset_path
 
 
-class StaticSimulation(ServerSimulation):
+class StaticSimulation(AssetSimulation):
     def __init__(self, index_page: str):
         super().__init__()
         self.index_page = index_page
 
     def start(self) -> str:
-        index_page = self.index_page
-        asset_root = os.path.abspath(AssetDir)
-
-        class CustomHandler(BaseHandler):
-            def translate_path(self, path: str) -> str:
-                # Remove query/fragment
-                path = path.split("?", 1)[0].split("#", 1)[0]
-
-                if path == "/":
-                    return os.path.join(asset_root, index_page)
+        return self.start_server()
 
-                # Normalize and sandbox
-                rel_path = path.lstrip("/")
-                safe_path = os.path.normpath(os.path.join(asset_root, rel_path))
-
-                # Ensure final path stays inside asset_root
-                if not safe_path.startswith(asset_root + "/"):
-                    return os.path.join(asset_root, "404.html")
+    def resolve(self, path: str, query: dict[str, list[str]]) -> str:
+        asset_root = os.path.abspath(AssetDir)
 
-                return safe_path
+        if path == "/":
+            return os.path.join(asset_root, self.index_page)
 
-        return self.start_server(CustomHandler)
+        return asset_path(asset_root, path)
 
     def finish(self) -> UnsubStatus:
         self.stop_server()
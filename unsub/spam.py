@@ -1,31 +1,43 @@
 from openai import OpenAI
 
-from .api_util import BadResponseFormat, completion
+from .api_util import BadResponseFormat, LowConfidence, routed_completion
 from .gmail import Email
 
+SpamRubric = (
+    "Based on information about an email, predict if it's promotional (spam) or not. "
+    "Emails about orders that were successfully delivered, or personal emails, are not spam. "
+    "On the other hand, emails about sales, promotions, or newsletters or random news "
+    "updates from brands are spam."
+)
+
 
 def is_spam(
     client: OpenAI,
     email: Email,
 ) -> bool:
     instructions = (
-        "Based on information about an email, predict if it's promotional (spam) or not. "
-        "Emails about orders that were successfully delivered, or personal emails, are not spam. "
-        "On the other hand, emails about sales, promotions, or newsletters or random news "
-        "updates from brands are spam. "
-        "You may think about the message, but end your response with a new line that says either "
-        "SPAM or NOT SPAM. If you are unsure, err on the side of caution and say NOT SPAM."
+        SpamRubric + " You may think about the message, but end your response with "
+        "a new line that says either SPAM, NOT SPAM, or UNSURE if you can't tell."
     )
     email_desc = (
         f"Sender: {email.sender}\nSubject: {email.subject}\nSnippet: {email.snippet}"
     )
-    response = completion(client, instructions=instructions, input=email_desc)
+    return routed_completion(
+        client, "spam", instructions=instructions, input=email_desc, parse=_parse_spam
+    )
+
 
-    last_line = response.strip().splitlines()[-1]
+def _parse_spam(response: str) -> bool:
+    if not (lines := response.strip().splitlines()):
+        raise BadResponseFormat("empty response")
+    last_line = lines[-1]
     match last_line:
         case "SPAM":
             return True
         case "NOT SPAM":
             return False
+        case "UNSURE":
+            # Err on the side of caution if even the strongest model is unsure.
+            raise LowConfidence("model is unsure", fallback=False)
         case _:
             raise BadResponseFormat(f"unexpected response: {last_line}")
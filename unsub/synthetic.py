@@ -0,0 +1,182 @@
+"""
+Generate realistic marketing emails for testing and benchmarking link
+extraction at scale.
+"""
+
+import base64
+import json
+import os
+import random
+from dataclasses import asdict, dataclass
+from typing import Literal
+
+from .email_store import email_record
+from .gmail import Email
+from .link import Link
+
+Placement = Literal["footer", "context", "image", "none"]
+
+# (link text, sentence around a "click here" link) per language.
+UnsubscribeWording: dict[str, tuple[str, str]] = {
+    "en": ("Unsubscribe", "To stop receiving these emails, unsubscribe {link}."),
+    "es": ("Darse de baja", "Si no desea recibir más correos, puede darse de baja {link}."),
+    "fr": ("Se désabonner", "Pour ne plus recevoir nos emails, désabonnez-vous {link}."),
+    "de": ("Abmelden", "Wenn Sie keine E-Mails mehr erhalten möchten, abmelden {link}."),
+    "it": ("Disiscriviti", "Per non ricevere più queste email, disiscriviti {link}."),
+    "pt": ("Descadastrar", "Para não receber mais emails, descadastrar {link}."),
+    "nl": ("Uitschrijven", "Wil je deze e-mails niet meer ontvangen? Uitschrijven {link}."),
+}
+
+_HERE = {
+    "en": "here",
+    "es": "aquí",
+    "fr": "ici",
+    "de": "hier",
+    "it": "qui",
+    "pt": "aqui",
+    "nl": "hier",
+}
+
+_NAV_LINKS = ["Shop", "New Arrivals", "Sale", "Men", "Women", "Kids", "Home", "Gifts"]
+_FOOTER_LINKS = ["Privacy Policy", "Terms of Use", "Contact Us", "Help", "Store Locator"]
+_PRODUCTS = ["Sneakers", "Backpack", "Jacket", "Coffee Maker", "Headphones", "Lamp"]
+_VENDORS = ["acme", "northwind", "contoso", "globex", "initech", "umbrella", "hooli"]
+
+
+@dataclass
+class SyntheticEmail:
+    email: Email
+    unsub_link: Link | None
+    language: str
+    placement: Placement
+
+
+def _tracking_url(rng: random.Random, vendor: str, path: str) -> str:
+    token = "".join(rng.choices("abcdefghijklmnopqrstuvwxyz0123456789", k=40))
+    return f"https://click.e.{vendor}.com/{path}?qs={token}"
+
+
+def _nest(html: str, depth: int) -> str:
+    for _ in range(depth):
+        html = (
+            '<table role="presentation" width="100%" cellpadding="0" cellspacing="0">'
+            f"<tr><td align=\"center\">{html}</td></tr></table>"
+        )
+    return html
+
+
+def generate_email(
+    rng: random.Random,
+    num_products: int | None = None,
+    nesting: int | None = None,
+    language: str | None = None,
+    placement: Placement | None = None,
+) -> SyntheticEmail:
+    vendor = rng.choice(_VENDORS)
+    num_products = num_products if num_products is not None else rng.randint(1, 40)
+    nesting = nesting if nesting is not None else rng.randint(1, 6)
+    language = language or rng.choice(list(UnsubscribeWording))
+    placement = placement or rng.choice(["footer", "footer", "context", "image", "none"])
+
+    nav = " | ".join(
+        f'<a href="{_tracking_url(rng, vendor, "nav")}" style="color:#333">{name}</a>'
+        for name in rng.sample(_NAV_LINKS, rng.randint(3, len(_NAV_LINKS)))
+    )
+    products = []
+    for i in range(num_products):
+        name = rng.choice(_PRODUCTS)
+        url = _tracking_url(rng, vendor, f"product/{i}")
+        products.append(
+            _nest(
+                f'<a href="{url}"><img src="https://img.{vendor}.com/{i}.jpg" '
+                f'width="280" alt="{name}"></a><br>'
+                f'<span style="font-size:18px">{name}</span><br>'
+                f"<span>${rng.randint(5, 500)}.99</span><br>"
+                f'<a href="{url}" style="background:#000;color:#fff;padding:8px">'
+                "Shop Now</a>",
+                rng.randint(0, 2),
+            )
+        )
+
+    unsub_link = None
+    unsub_html = ""
+    if placement != "none":
+        href = _tracking_url(rng, vendor, "unsub")
+        link_text, sentence = UnsubscribeWording[language]
+        if placement == "footer":
+            unsub_link = Link(href=href, text=link_text)
+            unsub_html = f'<a href="{href}" style="color:#999">{link_text}</a>'
+        elif placement == "context":
+            here = _HERE[language]
+            unsub_link = Link(href=href, text=here)
+            unsub_html = sentence.format(link=f'<a href="{href}">{here}</a>')
+        else:
+            # Only an image, so the link has no text for Email.links() to see.
+            unsub_link = Link(href=href, text="")
+            unsub_html = (
+                f'<a href="{href}"><img src="https://img.{vendor}.com/unsub.png" '
+                f'alt="{link_text}"></a>'
+            )
+    footer_links = [
+        f'<a href="{_tracking_url(rng, vendor, "footer")}">{name}</a>'
+        for name in rng.sample(_FOOTER_LINKS, rng.randint(2, len(_FOOTER_LINKS)))
+    ]
+    insert_at = rng.randint(0, len(footer_links))
+    footer_links.insert(insert_at, unsub_html)
+    footer = (
+        '<p style="font-size:11px;color:#999">'
+        f"{vendor.title()} Inc., 123 Main St, Springfield<br>"
+        + " &middot; ".join(x for x in footer_links if x)
+        + "</p>"
+    )
+
+    html = (
+        "<html><head><style>"
+        + "".join(f".c{i}{{padding:{i}px}}" for i in range(rng.randint(10, 200)))
+        + "</style></head><body>"
+        + _nest(
+            f"<div>{nav}</div>" + "".join(products) + footer,
+            nesting,
+        )
+        + "</body></html>"
+    )
+
+    email_id = "".join(rng.choices("0123456789abcdef", k=16))
+    email = Email(
+        id=email_id,
+        sender=f"{vendor.title()} <news@e.{vendor}.com>",
+        subject=f"{rng.randint(10, 70)}% off {rng.choice(_PRODUCTS)} this week only",
+        snippet="Shop our latest deals before they're gone.",
+        raw_body=base64.urlsafe_b64encode(html.encode()).decode("ascii"),
+    )
+    return SyntheticEmail(
+        email=email, unsub_link=unsub_link, language=language, placement=placement
+    )
+
+
+def write_corpus(output_dir: str, count: int, seed: int = 0) -> list[str]:
+    """
+    Write synthetic emails in the layout and JSON shape of list_unsub_links,
+    with the expected answer stored under "synthetic".
+    """
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        sample = generate_email(rng)
+        email = sample.email
+        out_path = os.path.join(output_dir, email.id[-2:], email.id + ".json")
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, "w") as f:
+            json.dump(
+                dict(
+                    email=email_record(email, output_dir),
+                    spam=True,
+                    unsub_link=asdict(sample.unsub_link) if sample.unsub_link else None,
+                    synthetic=dict(
+                        language=sample.language, placement=sample.placement
+                    ),
+                ),
+                f,
+            )
+        paths.append(out_path)
+    return paths
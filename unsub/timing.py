@@ -0,0 +1,34 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# Stages recorded for each turn of unsubscribe_on_website().
+Stages = (
+    "page_load",
+    "screenshot",
+    "image_diff",
+    "digest",
+    "page_summary",
+    "html_summary",
+    "completion",
+    "script",
+    "wait",
+)
+
+
+class StageTimer:
+    """
+    Accumulate wall-clock durations (in seconds) of named stages.
+    """
+
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.durations[name] = self.durations.get(name, 0.0) + elapsed
@@ -0,0 +1,128 @@
+"""
+Streaming traces of agent runs, written as one JSON record per line while the
+run happens, instead of one JSON log at the end.
+
+A trace has a "start" record with the run's metadata, a "message" record per
+chat message, a "turn" record with each turn's stage timings, and an "end"
+record with the status and anything else the run reports. load_log() turns a
+trace (even an unfinished one) back into the same dict as a JSON log.
+"""
+
+import json
+import os
+import time
+from typing import Any, Iterable, Literal
+
+from .api_util import ChatMessage
+
+FsyncPolicy = Literal["never", "turn", "end"]
+FsyncPolicies: tuple[FsyncPolicy, ...] = ("never", "turn", "end")
+
+TraceSuffix = ".jsonl"
+
+StreamedKeys = ("conversation", "timings")
+
+
+class TraceWriter:
+    """
+    Append records to a trace file, flushing after every record.
+
+    With the "turn" fsync policy, the file is also synced to disk at the end
+    of every turn (and at the end of the run), so a crash loses at most the
+    current turn. With "end", it's only synced once the run ends.
+    """
+
+    def __init__(self, path: str, fsync: FsyncPolicy = "turn", **metadata: Any):
+        self.path = path
+        self.fsync = fsync
+        self._file = open(path, "w")
+        self._num_messages = 0
+        self._write(dict(type="start", start_time=time.time(), **metadata))
+
+    def message(self, message: ChatMessage):
+        self._write(dict(type="message", index=self._num_messages, message=message))
+        self._num_messages += 1
+
+    def turn(self, turn: int, timings: dict[str, float]):
+        self._write(dict(type="turn", turn=turn, timings=timings))
+        if self.fsync == "turn":
+            os.fsync(self._file.fileno())
+
+    def end(self, **result: Any):
+        """
+        Record the outcome of the run and close the trace. The conversation and
+        timings, if passed, are left out, since they were already streamed.
+        """
+        result = {k: v for k, v in result.items() if k not in StreamedKeys}
+        self._write(dict(type="end", end_time=time.time(), **result))
+        if self.fsync != "never":
+            os.fsync(self._file.fileno())
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def _write(self, record: dict[str, Any]):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def __enter__(self) -> "TraceWriter":
+        return self
+
+    def __exit__(self, *_):
+        if not self._file.closed:
+            self.close()
+
+
+def load_trace(path: str) -> dict[str, Any]:
+    """
+    Rebuild a JSON log from a trace. If the run hasn't ended (or crashed), the
+    log has whatever was written so far, with status "in_progress" and
+    "partial" set to True. A truncated last line is ignored.
+    """
+    with open(path, "r") as f:
+        return parse_trace(f)
+
+
+def parse_trace(lines: Iterable[str]) -> dict[str, Any]:
+    log: dict[str, Any] = {}
+    conversation: list[ChatMessage] = []
+    timings: list[dict[str, float]] = []
+    ended = False
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            break
+        kind = record.pop("type", None)
+        if kind == "start":
+            log.update(record)
+        elif kind == "message":
+            conversation.append(record["message"])
+        elif kind == "turn":
+            timings.append(record["timings"])
+        elif kind == "end":
+            ended = True
+            log.update(record)
+    log.setdefault("conversation", conversation)
+    log.setdefault("timings", timings)
+    if not ended:
+        log["status"] = "in_progress"
+        log["partial"] = True
+    return log
+
+
+def load_log(path: str) -> dict[str, Any]:
+    """
+    Load a JSON log or a trace.
+    """
+    if path.endswith(TraceSuffix):
+        return load_trace(path)
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def is_log_file(name: str) -> bool:
+    return (name.endswith(".json") or name.endswith(TraceSuffix)) and not (
+        name.endswith(".recording.json")
+    )
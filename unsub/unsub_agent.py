@@ -10,14 +10,31 @@ from PIL import Image, ImageChops
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.webdriver import WebDriver
 
-from .api_util import ChatMessage, ChatMessageContentImage, completion
-
-
-def create_driver(headless: bool = False) -> WebDriver:
+from .api_util import ChatMessage, ChatMessageContentImage, completion, route
+from .metrics import counter, histogram
+from .timing import StageTimer
+from .trace import TraceWriter
+
+WaitStrategy = Literal["fixed", "ready"]
+
+AgentRuns = counter("unsub_agent_runs", "Finished agent runs, by status.")
+AgentTurns = histogram(
+    "unsub_agent_turns",
+    "Turns per finished agent run.",
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20),
+)
+AgentStageSeconds = histogram(
+    "unsub_agent_stage_seconds", "Time spent in each stage of an agent turn."
+)
+
+
+def create_driver(
+    headless: bool = False, window_size: tuple[int, int] = (1000, 1000)
+) -> WebDriver:
     options = Options()
     if headless:
         options.add_argument("--headless=new")
-    options.add_argument("--window-size=1000,1000")
+    options.add_argument(f"--window-size={window_size[0]},{window_size[1]}")
     return WebDriver(options=options)
 
 
@@ -31,13 +48,58 @@ def unsubscribe_on_website(
     wait_between_turns: float = 2.0,
     verbose: bool = False,
     max_code_length_to_summarize: int = 32768 * 8,
+    timings: list[dict[str, float]] | None = None,
+    model: str | None = None,
+    wait_strategy: WaitStrategy = "fixed",
+    use_digest: bool = False,
+    trace: TraceWriter | None = None,
 ) -> tuple[Literal["success", "failure", "timeout"], list[ChatMessage]]:
-    driver.get(url)
+    """
+    Run the agent loop on a page until it reports a status or runs out of
+    steps.
+
+    With the "fixed" wait strategy, every turn sleeps for wait_between_turns
+    after running code. With "ready", the turn ends as soon as the page has
+    settled, waiting at most wait_between_turns.
+
+    The model defaults to the "agent_turn" route (see unsub.api_util).
+
+    With use_digest, every turn includes a list of the page's visible
+    interactive elements (see page_digest()) instead of summarizing the HTML on
+    the first turn, and no screenshot is taken while the digest, the page
+    text and the scroll position stay the same.
+
+    If timings is passed, one dict per turn is appended to it, mapping each
+    stage (see unsub.timing.Stages) to the seconds spent in it.
+
+    If trace is passed, every message and each turn's timings are written to it
+    as they happen. The caller records the end of the run.
+    """
+    model = model or route("agent_turn")[0]
+    timer = StageTimer()
+    with timer.stage("page_load"):
+        driver.get(url)
 
     conversation: list[ChatMessage] = []
     previous_output = None
 
+    def add_message(message: ChatMessage):
+        conversation.append(message)
+        if trace is not None:
+            trace.message(message)
+
+    def end_turn(turn: int):
+        for stage, seconds in timer.durations.items():
+            AgentStageSeconds.observe(seconds, stage=stage)
+        if trace is not None:
+            trace.turn(turn, timer.durations)
+
+    def end_run(status: str, turns: int):
+        AgentRuns.inc(status=status)
+        AgentTurns.observe(turns)
+
     previous_image: Image.Image | None = None
+    previous_digest: tuple[str, str] | None = None
 
     instructions = textwrap.dedent(
         f"""\
@@ -57,29 +119,53 @@ def unsubscribe_on_website(
         * The user's email address is: {user_email}
         """
     )
+    if use_digest:
+        instructions += (
+            "* Each message also lists the visible interactive elements on the page, "
+            "with handles like [3]. The provided el() function returns the element "
+            "with a handle, e.g. el(3).click(). Handles stay the same until the page "
+            "reloads.\n"
+        )
 
     for turn in range(max_steps):
-        # Get raw PNG bytes
-        png_bytes = driver.get_screenshot_as_png()
-
-        # Make PIL Image
-        image = Image.open(BytesIO(png_bytes))
-
-        # Compare with previous screenshot
-        if previous_image is not None:
-            diff = ImageChops.difference(image, previous_image)
-            identical_to_prev = not diff.getbbox()  # None if no difference
-        else:
-            identical_to_prev = False
-
-        previous_image = image
-
-        b64_data = b64encode(png_bytes).decode("ascii")
-        data_url = f"data:image/png;base64,{b64_data}"
-        image_content: ChatMessageContentImage | None = {
-            "type": "input_image",
-            "image_url": data_url,
-        }
+        if turn:
+            end_turn(turn - 1)
+            timer = StageTimer()
+        if timings is not None:
+            timings.append(timer.durations)
+
+        digest = None
+        identical_to_prev = False
+        if use_digest:
+            with timer.stage("digest"):
+                digest, page_state = page_digest(driver)
+            identical_to_prev = previous_digest == (digest, page_state)
+            previous_digest = (digest, page_state)
+
+        image_content: ChatMessageContentImage | None = None
+        if not identical_to_prev:
+            with timer.stage("screenshot"):
+                # Get raw PNG bytes
+                png_bytes = driver.get_screenshot_as_png()
+
+            with timer.stage("image_diff"):
+                # Make PIL Image
+                image = Image.open(BytesIO(png_bytes))
+
+                # Compare with previous screenshot
+                if previous_image is not None:
+                    diff = ImageChops.difference(image, previous_image)
+                    identical_to_prev = not diff.getbbox()  # None if no difference
+
+                previous_image = image
+
+            with timer.stage("screenshot"):
+                b64_data = b64encode(png_bytes).decode("ascii")
+                data_url = f"data:image/png;base64,{b64_data}"
+            image_content = {
+                "type": "input_image",
+                "image_url": data_url,
+            }
 
         msg = ""
         if previous_output:
@@ -97,30 +183,37 @@ def unsubscribe_on_website(
                 print("[NO PREVIOUS OUTPUT]")
             msg += "There was no print() output from previous code.\n\n"
 
-        page_summary = driver.execute_script(
-            """
-            const tags = ["button", "input", "a", "form"];
-            const counts = tags.map(tag => {
-                const count = document.querySelectorAll(tag).length;
-                return `${count} <${tag}>`;
-            });
-            const elementSummary = "There are " + counts.join(", ");
-            
-            const totalHeight = document.documentElement.scrollHeight;
-            const viewportHeight = window.innerHeight;
-            const percent = (viewportHeight / totalHeight) * 100;
-            const heightSummary = `${percent.toFixed(2)}% of the height of the page is visible.`;
-
-            return heightSummary + '\\n' + elementSummary;
-            """
-        )
+        with timer.stage("page_summary"):
+            page_summary = driver.execute_script(
+                """
+                const tags = ["button", "input", "a", "form"];
+                const counts = tags.map(tag => {
+                    const count = document.querySelectorAll(tag).length;
+                    return `${count} <${tag}>`;
+                });
+                const elementSummary = "There are " + counts.join(", ");
+
+                const totalHeight = document.documentElement.scrollHeight;
+                const viewportHeight = window.innerHeight;
+                const percent = (viewportHeight / totalHeight) * 100;
+                const heightSummary = `${percent.toFixed(2)}% of the height of the page is visible.`;
+
+                return heightSummary + '\\n' + elementSummary;
+                """
+            )
 
         msg += page_summary + "\n"
 
-        if turn == 0:
-            code = driver.execute_script("return document.body.innerHTML")
-            if len(code) < max_code_length_to_summarize:
-                summary = describe_website_from_code(client, code)
+        if digest is not None:
+            msg += "Visible interactive elements:\n" + digest + "\n\n"
+
+        if turn == 0 and not use_digest:
+            with timer.stage("html_summary"):
+                code = driver.execute_script("return document.body.innerHTML")
+                summary = None
+                if len(code) < max_code_length_to_summarize:
+                    summary = describe_website_from_code(client, code)
+            if summary is not None:
                 if verbose:
                     print("[SUMMARY]")
                     print(summary)
@@ -131,15 +224,16 @@ def unsubscribe_on_website(
 
         if identical_to_prev:
             msg += "The screenshot has not changed from the previous message."
-            conversation.append(
+            add_message(
                 {
                     "role": "user",
                     "content": msg.strip(),
                 }
             )
         else:
+            assert image_content is not None
             msg += "Below is a screenshot of a webpage from the email Unsubscribe link."
-            conversation.append(
+            add_message(
                 {
                     "role": "user",
                     "content": [
@@ -149,120 +243,342 @@ def unsubscribe_on_website(
                 }
             )
 
-        response = completion(
-            client,
-            instructions=instructions,
-            input=conversation,
-        )
-        conversation.append(
+        with timer.stage("completion"):
+            response = completion(
+                client,
+                instructions=instructions,
+                input=conversation,
+                model=model,
+                call_site="agent_turn",
+            )
+        add_message(
             {
                 "role": "assistant",
                 "content": [{"type": "output_text", "text": response}],
             }
         )
 
-        matches = re.findall(r"```(?:[a-zA-Z]*)\n(.*?)```", response, re.DOTALL)
+        matches = extract_code_blocks(response)
         if len(matches) != 1:
             previous_output = "ERROR: expected exactly one codeblock in your response"
             continue
 
-        # Rerun this every loop iteration in case the page changed
-        # or reloaded.
-        driver.execute_script(
-            """
-            window.logMessages = '';
-            window.print = (x) => {
-                window.logMessages += x.toString() + '\\n';
-            }
-            window.unspamStatus = null;
-            window.failure = () => {
-                window.unspamStatus = 'failure';
-            }
-            window.success = () => {
-                window.unspamStatus = 'success';
-            }
-            window.scrollDown = () => { window.scrollBy(0, 500); }
-            window.clickText = (targetText) => {
-                const all = document.querySelectorAll("*");
-                let matches = [];
-
-                for (const el of all) {
-                    // Get candidate label: textContent for most elements, value for inputs/buttons
-                    let label = "";
-                    if (el.tagName === "INPUT" || el.tagName === "BUTTON") {
-                        if (el.value) label = el.value;
-                    }
-                    if (!label && el.textContent) {
-                        label = el.textContent;
-                    }
-
-                    if (label && label.includes(targetText)) {
-                        // Prioritize leaf nodes, but also allow input elements (which are leaves anyway)
-                        if (el.children.length === 0 || el.tagName === "INPUT" || el.tagName === "BUTTON") {
-                            matches.push(el);
-                        }
-                    }
-                }
-
-                // Fallback: if no leaf/input/button matches found, allow any match
-                if (matches.length === 0) {
-                    for (const el of all) {
-                        let label = el.value || el.textContent;
-                        if (label && label.includes(targetText)) {
-                            matches.push(el);
-                        }
-                    }
-                }
-
-                let found = false;
-                for (const el of matches) {
-                    const style = window.getComputedStyle(el);
-                    if (style.visibility !== "hidden" && style.display !== "none") {
-                        el.click();
-                        found = true;
-                    }
-                }
-
-                return found;
-            }
-            """
-        )
-
         if verbose:
             print("[RESPONSE]")
             print(response)
             print("-" * 50)
 
-        code_to_run = matches[0].strip()
-        try:
-            driver.execute_script(code_to_run)
-        except KeyboardInterrupt:
-            raise
-        except Exception as e:
-            previous_output = f"ERROR while executing script: {e}"
-            continue
+        with timer.stage("script"):
+            # Rerun this every loop iteration in case the page changed
+            # or reloaded.
+            install_helpers(driver)
 
-        previous_output = driver.execute_script("return window.logMessages")
-        status = driver.execute_script("return window.unspamStatus")
+            code_to_run = matches[0].strip()
+            try:
+                driver.execute_script(code_to_run)
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                previous_output = f"ERROR while executing script: {e}"
+                continue
+
+            previous_output = driver.execute_script("return window.logMessages")
+            status = driver.execute_script("return window.unspamStatus")
 
         if verbose:
             print("[STATUS]:", status)
 
         if status:
+            end_turn(turn)
+            end_run(status, turn + 1)
             return status, conversation
 
         if verbose:
             print("-" * 50)
-        time.sleep(wait_between_turns)
+        with timer.stage("wait"):
+            wait_for_page(driver, wait_strategy, wait_between_turns)
 
-        # If a new window/tab was opened, we want to show it to the agent.
-        driver.switch_to.window(driver.window_handles[-1])
+        with timer.stage("page_load"):
+            # If a new window/tab was opened, we want to show it to the agent.
+            driver.switch_to.window(driver.window_handles[-1])
 
+    if max_steps:
+        end_turn(max_steps - 1)
+    end_run("timeout", max_steps)
     return "timeout", conversation
 
 
+def wait_for_page(driver: WebDriver, strategy: WaitStrategy, max_wait: float):
+    if strategy == "fixed":
+        time.sleep(max_wait)
+        return
+    # Give navigations and click handlers a moment to start before polling,
+    # so we don't see the old page as "ready".
+    min_wait = min(0.25, max_wait)
+    time.sleep(min_wait)
+    deadline = time.time() + max_wait - min_wait
+    while time.time() < deadline:
+        try:
+            ready = driver.execute_script(
+                "return document.readyState === 'complete' "
+                "&& performance.getEntriesByType('resource')"
+                ".every((r) => r.responseEnd > 0)"
+            )
+        except KeyboardInterrupt:
+            raise
+        except Exception:
+            # The page may be in the middle of navigating.
+            ready = False
+        if ready:
+            return
+        time.sleep(0.05)
+
+
+def extract_code_blocks(response: str) -> list[str]:
+    return re.findall(r"```(?:[a-zA-Z]*)\n(.*?)```", response, re.DOTALL)
+
+
+DigestMaxElements = 150
+
+
+def install_helpers(driver: WebDriver):
+    """
+    Define print(), success(), failure() and the other helpers that the
+    agent's code can use on the current page.
+    """
+    driver.execute_script(HELPERS_JS, DigestMaxElements)
+
+
+# Assigns handles to the visible interactive elements, in document order, up
+# to a limit. Shared by the digest and by el(), so that replayed code finds
+# the same elements even when no digest was taken.
+TAG_ELEMENTS_JS = """
+if (window.unsubNextHandle === undefined) {
+    window.unsubNextHandle = 1;
+}
+const isShown = (el) => {
+    const style = window.getComputedStyle(el);
+    if (style.display === "none" || style.visibility === "hidden") {
+        return false;
+    }
+    const rect = el.getBoundingClientRect();
+    return rect.width > 0 && rect.height > 0;
+};
+const isCheckable = (el) => el.type === "checkbox" || el.type === "radio";
+const isVisible = (el) => {
+    if (el.type === "hidden") {
+        return false;
+    }
+    // Custom-styled checkboxes are often invisible inputs behind their labels.
+    if (isCheckable(el) && el.labels && [...el.labels].some(isShown)) {
+        return true;
+    }
+    return isShown(el);
+};
+window.unsubTagElements = (maxElements) => {
+    const selector = 'input, select, textarea, button, a[href], [role="button"], ' +
+        '[role="checkbox"], [role="switch"], [role="radio"], [role="link"]';
+    const elements = [];
+    let total = 0;
+    for (const el of document.querySelectorAll(selector)) {
+        if (!isVisible(el)) {
+            continue;
+        }
+        total++;
+        if (elements.length >= maxElements) {
+            continue;
+        }
+        if (!el.dataset.unsubHandle) {
+            el.dataset.unsubHandle = String(window.unsubNextHandle++);
+        }
+        elements.push(el);
+    }
+    return { elements, total };
+};
+"""
+
+HELPERS_JS = TAG_ELEMENTS_JS + """
+const maxElements = arguments[0];
+window.logMessages = '';
+window.print = (x) => {
+    window.logMessages += x.toString() + '\\n';
+}
+window.unspamStatus = null;
+window.failure = () => {
+    window.unspamStatus = 'failure';
+}
+window.success = () => {
+    window.unspamStatus = 'success';
+}
+window.scrollDown = () => { window.scrollBy(0, 500); }
+window.el = (handle) => {
+    const find = () => document.querySelector(`[data-unsub-handle="${handle}"]`);
+    if (!find()) {
+        // The page hasn't been tagged yet, e.g. when replaying a playbook.
+        window.unsubTagElements(maxElements);
+    }
+    return find();
+};
+window.clickText = (targetText) => {
+    const all = document.querySelectorAll("*");
+    let matches = [];
+
+    for (const el of all) {
+        // Get candidate label: textContent for most elements, value for inputs/buttons
+        let label = "";
+        if (el.tagName === "INPUT" || el.tagName === "BUTTON") {
+            if (el.value) label = el.value;
+        }
+        if (!label && el.textContent) {
+            label = el.textContent;
+        }
+
+        if (label && label.includes(targetText)) {
+            // Prioritize leaf nodes, but also allow input elements (which are leaves anyway)
+            if (el.children.length === 0 || el.tagName === "INPUT" || el.tagName === "BUTTON") {
+                matches.push(el);
+            }
+        }
+    }
+
+    // Fallback: if no leaf/input/button matches found, allow any match
+    if (matches.length === 0) {
+        for (const el of all) {
+            let label = el.value || el.textContent;
+            if (label && label.includes(targetText)) {
+                matches.push(el);
+            }
+        }
+    }
+
+    let found = false;
+    for (const el of matches) {
+        const style = window.getComputedStyle(el);
+        if (style.visibility !== "hidden" && style.display !== "none") {
+            el.click();
+            found = true;
+        }
+    }
+
+    return found;
+}
+"""
+
+
+def page_digest(
+    driver: WebDriver, max_elements: int = DigestMaxElements
+) -> tuple[str, str]:
+    """
+    List the visible inputs, checkboxes, selects, buttons and links on the
+    page, one per line, with their labels, state and a handle which the
+    agent's code can pass to el(). Handles are stored on the elements, so they
+    stay the same across turns until the page reloads.
+
+    Returns the digest and a fingerprint of the page's text and scroll
+    position, which together tell whether the page has visibly changed.
+    """
+    result = driver.execute_script(DIGEST_JS, max_elements)
+    return result["digest"], result["state"]
+
+
+DIGEST_JS = TAG_ELEMENTS_JS + """
+const maxElements = arguments[0];
+
+const clip = (s, n) => {
+    s = (s || "").replace(/\\s+/g, " ").trim();
+    return s.length > n ? s.slice(0, n) + "..." : s;
+};
+const quote = (s) => JSON.stringify(s);
+const labelOf = (el) => {
+    const candidates = [];
+    if (el.labels) {
+        for (const label of el.labels) {
+            candidates.push(label.innerText);
+        }
+    }
+    candidates.push(el.getAttribute("aria-label"));
+    if (el.tagName === "INPUT" && ["submit", "button", "reset"].includes(el.type)) {
+        candidates.push(el.value);
+    }
+    if (!["INPUT", "SELECT", "TEXTAREA"].includes(el.tagName)) {
+        candidates.push(el.innerText);
+    }
+    candidates.push(el.placeholder, el.title);
+    const img = el.querySelector && el.querySelector("img[alt]");
+    candidates.push(img && img.alt);
+    return clip(candidates.find((x) => x && x.trim()), 80);
+};
+const kindOf = (el) => {
+    const role = el.getAttribute("role");
+    if (el.tagName === "INPUT") {
+        return el.type === "text" ? "text input" : (el.type || "text") + " input";
+    } else if (el.tagName === "A") {
+        return "link";
+    }
+    return role && role !== el.tagName.toLowerCase() ? role : el.tagName.toLowerCase();
+};
+
+const lines = [];
+const { elements, total } = window.unsubTagElements(maxElements);
+for (const el of elements) {
+    const parts = [`[${el.dataset.unsubHandle}]`, kindOf(el)];
+    const label = labelOf(el);
+    if (label) {
+        parts.push(quote(label));
+    }
+    if (el.id) {
+        parts.push("#" + el.id);
+    } else if (el.name) {
+        parts.push(`name=${quote(el.name)}`);
+    }
+    if (isCheckable(el) || el.getAttribute("aria-checked") !== null) {
+        const checked = isCheckable(el)
+            ? el.checked : el.getAttribute("aria-checked") === "true";
+        parts.push(checked ? "checked" : "unchecked");
+    } else if (el.tagName === "SELECT") {
+        const options = [...el.options].map((o) => quote(clip(o.text, 30)));
+        const selected = el.selectedIndex >= 0 ? el.options[el.selectedIndex].text : "";
+        parts.push(`selected=${quote(clip(selected, 30))}`);
+        parts.push(`options=[${options.slice(0, 8).join(", ")}` +
+            (options.length > 8 ? ", ...]" : "]"));
+    } else if (el.tagName === "TEXTAREA" || (el.tagName === "INPUT" &&
+            !["submit", "button", "reset", "image"].includes(el.type))) {
+        parts.push(`value=${quote(clip(el.value, 40))}`);
+    } else if (el.tagName === "A") {
+        parts.push("-> " + clip(el.getAttribute("href"), 60));
+    }
+    if (el.disabled || el.getAttribute("aria-disabled") === "true") {
+        parts.push("(disabled)");
+    }
+    if (el.getBoundingClientRect().top >= window.innerHeight) {
+        parts.push("(below the fold)");
+    }
+    lines.push(parts.join(" "));
+}
+if (total > lines.length) {
+    lines.push(`... and ${total - lines.length} more`);
+}
+if (!lines.length) {
+    lines.push("(none)");
+}
+
+let hash = 0;
+const text = document.body ? document.body.innerText : "";
+for (let i = 0; i < text.length; i++) {
+    hash = (hash * 31 + text.charCodeAt(i)) | 0;
+}
+return {
+    digest: lines.join("\\n"),
+    state: `${location.href} ${hash} ${window.scrollY}`,
+};
+"""
+
+
 def describe_website_from_code(
-    client: OpenAI, code: str, max_code_len: int = 32768, block_overlap: int = 128
+    client: OpenAI,
+    code: str,
+    max_code_len: int = 32768,
+    block_overlap: int = 128,
 ):
     code_blocks = [code]
     if len(code) > max_code_len:
@@ -283,6 +599,12 @@ def describe_website_from_code(
 
     responses = []
     for block in code_blocks:
-        response = completion(client, instructions=instructions, input=block)
+        response = completion(
+            client,
+            instructions=instructions,
+            input=block,
+            model=route("page_summary")[0],
+            call_site="page_summary",
+        )
         responses.append(response)
     return "\n\n".join(responses)
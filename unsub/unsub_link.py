@@ -1,26 +1,91 @@
-from bs4 import BeautifulSoup
+import json
+
+from bs4 import BeautifulSoup, Tag
 from openai import OpenAI
 
-from .api_util import BadResponseFormat, completion
+from .api_util import BadResponseFormat, routed_completion
 from .gmail import Email
 from .link import Link
+from .page_text import mentions_unsubscribe
+
+LinkTieBreak = (
+    "If more than one looks like an unsubscribe link, "
+    "simply pick one of them arbitrarily."
+)
 
 
 def find_unsubscribe_link(
     client: OpenAI,
     email: Email,
 ) -> Link | None:
-    if not email.raw_body:
-        return None
     if links := email.links():
         if link := _find_unsubscribe_link_from_list(client, links):
             return link
-    return _find_unsubscribe_link_from_code(client, email.body)
+    if not email.raw_body:
+        return None
+    return find_unsubscribe_link_from_code(client, email.body)
+
+
+SnippetInstructions = (
+    "Below are excerpts of an email's source code, separated by lines with "
+    "'...'. Each link has a data-index attribute with an integer value. "
+    "Find the link that looks like an Unsubscribe link, and "
+    'end your response with a line like "Answer: N" where N is the index. '
+    'If none of the links is an unsubscribe link, output "Answer: -1". '
+    "You may think out loud before giving your answer, but give the answer "
+    "on a new line in the above format."
+)
 
+CodeBlockInstructions = (
+    "Each link on this page has a data-index attribute with an integer value. "
+    "Find the link that looks like an Unsubscribe link (this is an email's source code), and "
+    'end your response with a line like "Answer: N" where N is the index. '
+    "There may be no unsubscribe link, and the code may be truncated in such a way that the link "
+    'is missing or hard to determine. In that case, output "Answer: -1". '
+    "You may think out loud before giving your answer, but give the answer on a new line in the above format."
+)
 
-def _find_unsubscribe_link_from_code(
-    client: OpenAI, code: str, max_code_len: int = 8192, block_overlap: int = 128
+
+def find_unsubscribe_link_from_code(
+    client: OpenAI,
+    code: str,
+    max_code_len: int = 8192,
+    block_overlap: int = 128,
+    max_snippets_len: int = 4096,
 ):
+    """
+    Find the unsubscribe link in an email's HTML.
+
+    Usually this is a single call on short excerpts around the links that
+    mention unsubscribing. Only if there are none, or none of them is the
+    unsubscribe link, is the whole page searched, block by block.
+    """
+    links, prompts = code_link_prompts(
+        code, max_code_len, block_overlap, max_snippets_len
+    )
+    for instructions, input in prompts:
+        answer_idx = routed_completion(
+            client,
+            "link_code",
+            instructions=instructions,
+            input=input,
+            parse=lambda response: parse_code_answer(response, links),
+        )
+        if answer_idx >= 0:
+            return links[answer_idx]
+
+
+def code_link_prompts(
+    code: str,
+    max_code_len: int = 8192,
+    block_overlap: int = 128,
+    max_snippets_len: int = 4096,
+) -> tuple[list[Link], list[tuple[str, str]]]:
+    """
+    Prepare the calls of find_unsubscribe_link_from_code(), in the order they
+    are made, as (instructions, input) pairs. Also returns the links, which
+    the answers index into.
+    """
     soup = BeautifulSoup(code, "html.parser")
 
     links: list[Link] = []
@@ -31,6 +96,10 @@ def _find_unsubscribe_link_from_code(
         img["src"] = ""  # type: ignore
     code = str(soup)
 
+    prompts = []
+    if snippets := _unsubscribe_snippets(soup, max_snippets_len):
+        prompts.append((SnippetInstructions, "\n...\n".join(snippets)))
+
     code_blocks = [code]
     if len(code) > max_code_len:
         code_blocks = []
@@ -39,30 +108,78 @@ def _find_unsubscribe_link_from_code(
     code_blocks = sorted(
         code_blocks, key=lambda x: "unsubscribe" in x.lower(), reverse=True
     )
+    prompts.extend((CodeBlockInstructions, block) for block in code_blocks)
+    return links, prompts
+
+
+def parse_code_answer(response: str, links: list[Link]) -> int:
+    """
+    Parse the data-index of the chosen link (or -1) from a response to one of
+    the code_link_prompts().
+    """
+    answer_idx = _parse_answer(response)
+    if answer_idx >= len(links):
+        raise BadResponseFormat(
+            f"answer is out of range: {answer_idx} (only have {len(links)} links)"
+        )
+    return answer_idx
 
-    instructions = (
-        "Each link on this page has a data-index attribute with an integer value. "
-        "Find the link that looks like an Unsubscribe link (this is an email's source code), and "
-        'end your response with a line like "Answer: N" where N is the index. '
-        "There may be no unsubscribe link, and the code may be truncated in such a way that the link "
-        'is missing or hard to determine. In that case, output "Answer: -1". '
-        "You may think out loud before giving your answer, but give the answer on a new line in the above format."
-    )
 
-    for block in code_blocks:
-        response = completion(client, instructions=instructions, input=block)
-        last_line = response.strip().splitlines()[-1]
-        if not last_line.startswith("Answer:"):
-            raise BadResponseFormat("no answer at end of response")
-        answer_idx = int(last_line[len("Answer:") :].strip())
-        if answer_idx < 0:
+_SNIPPET_ATTRS = ("href", "data-index", "alt", "title")
+
+
+def _unsubscribe_snippets(
+    soup: BeautifulSoup,
+    max_len: int,
+    window_chars: int = 400,
+    window_links: int = 8,
+) -> list[str]:
+    """
+    Serialize whole elements around each link whose text, URL, image alt text
+    or surrounding text mentions unsubscribing, keeping only the attributes
+    that help to pick a link. Each window is the largest ancestor of the link
+    with at most window_chars of text and window_links links, so tags are
+    never cut in half.
+
+    If the windows don't fit in max_len, later ones are preferred, since
+    unsubscribe links are usually in the footer.
+    """
+    windows: list[Tag] = []
+    for a in soup.find_all("a", href=True):
+        window = a
+        while (
+            isinstance(parent := window.parent, Tag)
+            and parent.name not in ("body", "html", "[document]")
+            and len(parent.get_text(" ", strip=True)) <= window_chars
+            and len(parent.find_all("a", limit=window_links + 1)) <= window_links
+        ):
+            window = parent
+        alts = " ".join(str(img.get("alt", "")) for img in a.find_all("img"))
+        context = f"{window.get_text(' ', strip=True)} {a['href']} {alts}"
+        if not mentions_unsubscribe(context):
             continue
-        elif answer_idx > len(links):
-            raise BadResponseFormat(
-                f"answer is out of range: {answer_idx} (only have {len(links)} links)"
-            )
-        else:
-            return links[answer_idx]
+        # Skip windows that are (inside) ones we already have.
+        if any(window is w or _is_inside(window, w) for w in windows):
+            continue
+        windows = [w for w in windows if not _is_inside(w, window)]
+        windows.append(window)
+
+    snippets = []
+    total_len = 0
+    for window in reversed(windows):
+        for tag in [window, *window.find_all(True)]:
+            tag.attrs = {k: v for k, v in tag.attrs.items() if k in _SNIPPET_ATTRS}
+        snippet = str(window)
+        if total_len + len(snippet) > max_len:
+            continue
+        snippets.append(snippet)
+        total_len += len(snippet)
+    return snippets[::-1]
+
+
+def _is_inside(tag: Tag, ancestor: Tag) -> bool:
+    # Tags compare by value, so check identity explicitly.
+    return any(parent is ancestor for parent in tag.parents)
 
 
 def _find_unsubscribe_link_from_list(
@@ -77,35 +194,123 @@ def _find_unsubscribe_link_from_list(
                 client, links[i : i + max_links_per_call], max_url_len=max_url_len
             ):
                 return link
+        return None
 
     instructions = (
         "Out of these links, choose the one that looks like an unsubscribe link. "
         'End your response with "Answer: N" where N is a link number, or -1 if '
-        "none of the links look like an unsubscribe link. If more than one looks "
-        "like an unsubscribe link, simply pick one of them arbitrarily."
+        "none of the links look like an unsubscribe link. " + LinkTieBreak
+    )
+    link_text = format_links(links, max_url_len)
+
+    def parse(response: str) -> Link | None:
+        answer_idx = _parse_answer(response)
+        if answer_idx < 1:
+            return None
+        elif answer_idx > len(links):
+            raise BadResponseFormat(
+                f"answer is out of range: {answer_idx} (only have {len(links)} links)"
+            )
+        return links[answer_idx - 1]
+
+    return routed_completion(
+        client, "link_list", instructions=instructions, input=link_text, parse=parse
     )
+
+
+LinkListsFormat = {
+    "type": "json_schema",
+    "name": "unsubscribe_links",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "answers": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "email": {"type": "integer"},
+                        "link": {"type": "integer"},
+                    },
+                    "required": ["email", "link"],
+                    "additionalProperties": False,
+                },
+            }
+        },
+        "required": ["answers"],
+        "additionalProperties": False,
+    },
+}
+
+
+def find_unsubscribe_links_from_lists(
+    client: OpenAI,
+    link_lists: list[list[Link]],
+    max_url_len: int = 50,
+) -> list[Link | None]:
+    """
+    Choose an unsubscribe link (or None) for each of several emails' link
+    lists, in a single call.
+    """
+    instructions = (
+        "Below are the links from several emails. For each email, choose the link "
+        "that looks like an unsubscribe link, or -1 if none of its links look like "
+        "an unsubscribe link. " + LinkTieBreak + " Give exactly one answer per "
+        "email, using the email and link numbers from the list."
+    )
+    input = ""
+    for i, links in enumerate(link_lists):
+        input += f"Email {i+1}:\n{format_links(links, max_url_len)}\n"
+
+    def parse(response: str) -> list[Link | None]:
+        try:
+            answers = {
+                int(item["email"]): int(item["link"])
+                for item in json.loads(response)["answers"]
+            }
+        except (ValueError, TypeError, KeyError) as exc:
+            raise BadResponseFormat(f"invalid answers: {response}") from exc
+        results: list[Link | None] = []
+        for i, links in enumerate(link_lists):
+            if (answer_idx := answers.get(i + 1)) is None:
+                raise BadResponseFormat(f"no answer for email {i+1}")
+            if answer_idx > len(links):
+                raise BadResponseFormat(
+                    f"answer for email {i+1} is out of range: {answer_idx} "
+                    f"(only have {len(links)} links)"
+                )
+            results.append(links[answer_idx - 1] if answer_idx >= 1 else None)
+        return results
+
+    return routed_completion(
+        client,
+        "link_list",
+        instructions=instructions,
+        input=input,
+        parse=parse,
+        text_format=LinkListsFormat,
+    )
+
+
+def format_links(links: list[Link], max_url_len: int) -> str:
+    """Number links from 1, truncating long URLs."""
     link_text = ""
     for i, link in enumerate(links):
-        url_text = link.href[:max_url_len]
+        url_text = link.href
         if len(url_text) > max_url_len:
             url_text = url_text[:max_url_len] + "..."
-        link_text += f"{i+1}. {repr(link.text)} {repr(url_text)}"
+        link_text += f"{i+1}. {repr(link.text)} {repr(url_text)}\n"
+    return link_text
 
-    response = completion(client, instructions=instructions, input=link_text)
 
-    last_line = response.strip().splitlines()[-1]
+def _parse_answer(response: str) -> int:
+    if not (lines := response.strip().splitlines()):
+        raise BadResponseFormat("empty response")
+    last_line = lines[-1]
     if not last_line.startswith("Answer:"):
         raise BadResponseFormat("no answer at end of response")
-
     try:
-        answer_idx = int(last_line[len("Answer:") :].strip())
-        if answer_idx < 1:
-            return None
-        elif answer_idx > len(links):
-            raise BadResponseFormat(
-                f"answer is out of range: {answer_idx} (only have {len(links)} links)"
-            )
-        else:
-            return links[answer_idx - 1]
+        return int(last_line[len("Answer:") :].strip())
     except ValueError as exc:
         raise BadResponseFormat("invalid response integer") from exc
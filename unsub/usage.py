@@ -0,0 +1,157 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator
+
+# USD per million tokens: (input, cached input, output).
+ModelPrices: dict[str, tuple[float, float, float]] = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+}
+
+_unpriced_models: set[str] = set()
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, scope: "UsageScope"):
+        super().__init__(
+            f"budget of ${scope.budget:.4f} exceeded for {scope.labels or 'run'} "
+            f"(spent ${scope.usage.cost:.4f})"
+        )
+        self.scope = scope
+
+
+@dataclass
+class Usage:
+    calls: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+
+    def add(self, other: "Usage"):
+        self.calls += other.calls
+        self.input_tokens += other.input_tokens
+        self.cached_tokens += other.cached_tokens
+        self.output_tokens += other.output_tokens
+        self.cost += other.cost
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class UsageScope:
+    labels: dict[str, str]
+    budget: float | None = None
+    usage: Usage = field(default_factory=Usage)
+
+    @property
+    def exceeded(self) -> bool:
+        return self.budget is not None and self.usage.cost >= self.budget
+
+
+_scopes: ContextVar[tuple[UsageScope, ...]] = ContextVar("usage_scopes", default=())
+_lock = threading.Lock()
+
+
+@contextmanager
+def track_usage(budget: float | None = None, **labels: str) -> Iterator[UsageScope]:
+    """
+    Attribute the usage of every completion() inside this block to a scope,
+    such as an email, a domain, or a whole run. Scopes nest, and each call
+    counts towards all enclosing scopes.
+
+    If a budget (in USD) is given, completion() raises BudgetExceeded instead
+    of making new calls once the scope has spent it.
+    """
+    scope = UsageScope(labels=labels, budget=budget)
+    token = _scopes.set(_scopes.get() + (scope,))
+    try:
+        yield scope
+    finally:
+        _scopes.reset(token)
+
+
+@contextmanager
+def resume_usage(scope: UsageScope) -> Iterator[UsageScope]:
+    """
+    Re-enter a scope created by track_usage(), e.g. to finish work on an item
+    after handling others in between.
+    """
+    token = _scopes.set(_scopes.get() + (scope,))
+    try:
+        yield scope
+    finally:
+        _scopes.reset(token)
+
+
+def check_budgets():
+    for scope in _scopes.get():
+        if scope.exceeded:
+            raise BudgetExceeded(scope)
+
+
+def usage_from_response(model: str, response_usage: Any) -> Usage:
+    cached_tokens = 0
+    if details := getattr(response_usage, "input_tokens_details", None):
+        cached_tokens = details.cached_tokens or 0
+    return _usage(
+        model, response_usage.input_tokens, cached_tokens, response_usage.output_tokens
+    )
+
+
+def usage_from_dict(model: str, data: dict[str, Any]) -> Usage:
+    """
+    Like usage_from_response(), for the JSON usage of a raw response body
+    (e.g. from a batch output file).
+    """
+    cached_tokens = (data.get("input_tokens_details") or {}).get("cached_tokens") or 0
+    return _usage(model, data["input_tokens"], cached_tokens, data["output_tokens"])
+
+
+def _usage(
+    model: str, input_tokens: int, cached_tokens: int, output_tokens: int
+) -> Usage:
+    input_price, cached_price, output_price = model_prices(model)
+    cost = (
+        (input_tokens - cached_tokens) * input_price
+        + cached_tokens * cached_price
+        + output_tokens * output_price
+    ) / 1e6
+    return Usage(
+        calls=1,
+        input_tokens=input_tokens,
+        cached_tokens=cached_tokens,
+        output_tokens=output_tokens,
+        cost=cost,
+    )
+
+
+def model_prices(model: str) -> tuple[float, float, float]:
+    """
+    Look up a model's prices. Models without prices cost nothing, so budgets
+    can't limit them; this is reported once per model.
+    """
+    if (prices := ModelPrices.get(model)) is not None:
+        return prices
+    with _lock:
+        if model not in _unpriced_models:
+            _unpriced_models.add(model)
+            print(f"warning: no prices for model {model}, so budgets ignore its calls")
+    return (0.0, 0.0, 0.0)
+
+
+def record_usage(model: str, response_usage: Any):
+    if response_usage is None:
+        # Stand-in clients may not report tokens; still count the call.
+        usage = Usage(calls=1)
+    else:
+        usage = usage_from_response(model, response_usage)
+    with _lock:
+        for scope in _scopes.get():
+            scope.usage.add(usage)
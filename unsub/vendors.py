@@ -0,0 +1,224 @@
+"""
+Group emails by the vendor that sent them, so that each vendor is only
+unsubscribed from once.
+
+Unsubscribe link hostnames are a poor proxy for vendors: tracking hosts like
+click.e.vendor.com differ from the vendor's own domain, the same vendor may
+use several of them, and email service providers host links for many
+unrelated vendors. Instead, emails are linked whenever they share a List-Id,
+a sender domain, or an unsubscribe target domain, and each connected group is
+one vendor. Domains shared by many vendors only link emails through the full
+sender address (for senders) or not at all (for targets).
+
+Since no list of shared domains is complete, a target domain only links
+emails if it is also the sender or List-Id domain of some email. This keeps
+unknown tracking hosts from merging unrelated vendors.
+"""
+
+import json
+from dataclasses import dataclass
+from email.utils import parseaddr
+from typing import Callable, Container, Iterable
+from urllib.parse import urlparse
+
+from .email_store import iter_email_paths
+
+# Hosts of email service providers and newsletter platforms, which send or
+# track mail for many different vendors.
+SharedDomains = (
+    "list-manage.com",
+    "mailchimp.com",
+    "mcsv.net",
+    "mcdlv.net",
+    "sendgrid.net",
+    "sendgrid.com",
+    "klaviyo.com",
+    "klaviyomail.com",
+    "hubspot.com",
+    "hubspotemail.net",
+    "hs-sites.com",
+    "exacttarget.com",
+    "rs6.net",
+    "constantcontact.com",
+    "createsend.com",
+    "cmail19.com",
+    "cmail20.com",
+    "mailgun.org",
+    "amazonses.com",
+    "sparkpostmail.com",
+    "substack.com",
+    "beehiiv.com",
+    "convertkit.com",
+    "ck.page",
+    "mailerlite.com",
+    "gmail.com",
+    "googlemail.com",
+    "outlook.com",
+    "yahoo.com",
+)
+
+# Second-level labels under which registrable domains have three labels,
+# e.g. vendor.co.uk.
+_SECOND_LEVEL = ("co", "com", "net", "org", "ac", "gov", "edu")
+
+
+@dataclass
+class VendorEmail:
+    path: str
+    url: str
+    sender: str
+    list_id: str = ""
+    date: int = 0
+
+
+@dataclass
+class Vendor:
+    key: str
+    emails: list[VendorEmail]
+
+    @property
+    def freshest(self) -> VendorEmail:
+        return max(self.emails, key=lambda e: (e.date, e.path))
+
+
+def base_domain(host: str) -> str:
+    """
+    Approximate the registrable domain of a hostname, e.g. vendor.com for
+    click.e.vendor.com.
+    """
+    labels = host.lower().strip(".").split(".")
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def url_domain(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+
+def sender_address(sender: str) -> str:
+    return parseaddr(sender)[1].lower()
+
+
+def list_id_key(list_id: str) -> str:
+    """
+    Extract the identifier from a List-Id header like "News <news.vendor.com>".
+    """
+    if "<" in list_id and ">" in list_id:
+        list_id = list_id[list_id.rindex("<") + 1 : list_id.rindex(">")]
+    return list_id.strip().lower()
+
+
+def is_shared(domain: str) -> bool:
+    return base_domain(domain) in SharedDomains
+
+
+def vendor_domains(email: VendorEmail) -> set[str]:
+    """
+    Get the domains that an email is sent from, according to its sender and
+    List-Id, excluding shared domains.
+    """
+    domains = set()
+    address = sender_address(email.sender)
+    if "@" in address:
+        domains.add(base_domain(address.rsplit("@", 1)[1]))
+    if "." in (list_id := list_id_key(email.list_id)):
+        domains.add(base_domain(list_id))
+    return {domain for domain in domains if not is_shared(domain)}
+
+
+def vendor_keys(
+    email: VendorEmail,
+    resolve: Callable[[str], str] | None = None,
+    known_domains: Container[str] | None = None,
+) -> list[str]:
+    """
+    Get the keys which link an email to others from the same vendor. The
+    first key is the preferred name of the vendor.
+
+    If resolve is given, it maps the unsubscribe URL to the URL it ends up at
+    (e.g. after redirects), and the domain of that target is used. The target
+    domain is only a key if it is in known_domains, which defaults to the
+    email's own vendor_domains().
+    """
+    if known_domains is None:
+        known_domains = vendor_domains(email)
+    keys = []
+    address = sender_address(email.sender)
+    if "@" in address:
+        domain = address.rsplit("@", 1)[1]
+        keys.append(address if is_shared(domain) else base_domain(domain))
+    if list_id := list_id_key(email.list_id):
+        keys.append("list:" + list_id)
+    target = url_domain(resolve(email.url) if resolve else email.url)
+    if target and not is_shared(target) and base_domain(target) in known_domains:
+        keys.append(base_domain(target))
+    return keys
+
+
+def group_vendors(
+    emails: Iterable[VendorEmail], resolve: Callable[[str], str] | None = None
+) -> list[Vendor]:
+    """
+    Cluster emails into vendors, in order of each vendor's first email.
+    """
+    parent: dict[str, str] = {}
+
+    def find(key: str) -> str:
+        parent.setdefault(key, key)
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    emails = list(emails)
+    known_domains = set().union(*(vendor_domains(email) for email in emails))
+
+    email_keys: list[tuple[VendorEmail, list[str]]] = []
+    for email in emails:
+        keys = vendor_keys(email, resolve, known_domains) or [url_domain(email.url)]
+        for key in keys[1:]:
+            parent[find(key)] = find(keys[0])
+        email_keys.append((email, keys))
+
+    groups: dict[str, list[tuple[VendorEmail, list[str]]]] = {}
+    for email, keys in email_keys:
+        groups.setdefault(find(keys[0]), []).append((email, keys))
+
+    vendors = []
+    for members in groups.values():
+        # Name the vendor after its most common sender domain. Names that look
+        # like domains are preferred, since they also name log files.
+        counts: dict[str, int] = {}
+        for _, keys in members:
+            counts[keys[0]] = counts.get(keys[0], 0) + 1
+        key = min(
+            counts, key=lambda k: (k.startswith("list:"), "@" in k, -counts[k], k)
+        )
+        vendors.append(Vendor(key=key, emails=[email for email, _ in members]))
+    return vendors
+
+
+def load_vendor_emails(email_dir: str) -> list[VendorEmail]:
+    """
+    Load every email with an unsubscribe link from a list_unsub_links output
+    directory.
+    """
+    results = []
+    for path in iter_email_paths(email_dir):
+        with open(path, "r") as f:
+            data = json.load(f)
+        url = (data.get("unsub_link") or {}).get("href")
+        if not url or not url_domain(url):
+            continue
+        record = data.get("email", {})
+        results.append(
+            VendorEmail(
+                path=path,
+                url=url,
+                sender=record.get("sender", ""),
+                list_id=record.get("list_id", ""),
+                date=record.get("date", 0),
+            )
+        )
+    return results